@@ -0,0 +1,85 @@
+# Loaded by ansible-playbook from ANSIBLE_CALLBACK_PLUGINS, not imported by the app.
+from __future__ import annotations
+
+import json
+import os
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    name: json_events
+    type: aggregate
+    short_description: One JSON line per task result on a side-channel file descriptor
+    description:
+      - Writes play, task result and final stats events as JSON lines to the
+        inherited file descriptor named by ANSIBLE_UI_EVENT_FD, leaving stdout
+        to the regular human-readable callback.
+    requirements:
+      - ANSIBLE_UI_EVENT_FD set to a writable file descriptor passed to ansible-playbook
+'''
+
+EVENT_FD_ENV = 'ANSIBLE_UI_EVENT_FD'
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'json_events'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super().__init__()
+        fd = os.environ.get(EVENT_FD_ENV)
+        # Line buffered: the reader sees each event as soon as it is written
+        self._channel = os.fdopen(int(fd), 'w', buffering=1, encoding='utf-8') if fd else None
+        self._play = None
+
+    def _emit(self, event):
+        if self._channel is None:
+            return
+        try:
+            self._channel.write(json.dumps(event, default=str) + '\n')
+        except (OSError, ValueError):
+            # Reader went away; the run itself carries on
+            self._channel = None
+
+    def _emit_result(self, status, result, **extra):
+        event = {
+            'event': 'result',
+            'status': status,
+            'host': result._host.get_name(),
+            'task': result._task.get_name(),
+            'play': self._play,
+            'changed': bool(result._result.get('changed', False)),
+        }
+        if status in ('failed', 'unreachable'):
+            event['msg'] = result._result.get('msg', '')
+        if 'rc' in result._result:
+            event['rc'] = result._result['rc']
+        event.update(extra)
+        self._emit(event)
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name()
+        self._emit({'event': 'play', 'play': self._play})
+
+    def v2_runner_on_ok(self, result):
+        self._emit_result('ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._emit_result('failed', result, ignore_errors=ignore_errors)
+
+    def v2_runner_on_unreachable(self, result):
+        self._emit_result('unreachable', result)
+
+    def v2_runner_on_skipped(self, result):
+        self._emit_result('skipped', result)
+
+    def v2_playbook_on_stats(self, stats):
+        self._emit({
+            'event': 'stats',
+            'hosts': {host: stats.summarize(host) for host in sorted(stats.processed)},
+        })
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
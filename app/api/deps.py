@@ -1,6 +1,9 @@
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status, Request, Response, Query
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional
+from typing import Optional, List, Dict, Any
+import base64
+import binascii
+import json
 from app.services.auth import auth_service
 from app.core.database import get_db, Database
 from app.core.config import settings
@@ -52,4 +55,44 @@ def get_sftp_service(db: Database = Depends(get_db)) -> SFTPService:
     return SFTPService(db)
 
 def get_tencent_service() -> TencentCloudService:
-    return TencentCloudService()
\ No newline at end of file
+    return TencentCloudService()
+
+class PageParams:
+    """Keyset pagination parameters shared by the list endpoints.
+
+    Clients pass before_id/after_id directly, or echo back the opaque cursor
+    returned in the X-Next-Cursor header of the previous page. The cursor
+    carries the sort key (time, id) of the last row rather than just its id,
+    so it stays valid after retention deleted that row.
+    """
+    def __init__(
+        self,
+        limit: int = Query(100, gt=0),
+        before_id: Optional[int] = Query(None, description="Return rows older than this id"),
+        after_id: Optional[int] = Query(None, description="Return rows newer than this id"),
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    ):
+        self.limit = limit
+        self.before_id: Optional[KeysetAnchor] = before_id
+        self.after_id: Optional[KeysetAnchor] = after_id
+        if cursor:
+            try:
+                direction, sort_time, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+                anchor = (str(sort_time), int(row_id))
+                if direction == 'a':
+                    self.after_id, self.before_id = anchor, None
+                elif direction == 'b':
+                    self.before_id, self.after_id = anchor, None
+                else:
+                    raise ValueError(direction)
+            except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def set_next_cursor(self, response: Response, rows: List[Dict[str, Any]], time_column: str) -> None:
+        """Advertise the cursor of the following page when this one is full; rows sort on (time_column, id)"""
+        if not rows or len(rows) < self.limit:
+            return
+        # Rows are newest-first: keep paging towards newer rows if that is the direction we came from
+        direction, row = ('a', rows[0]) if self.after_id is not None else ('b', rows[-1])
+        token = json.dumps([direction, row[time_column], row['id']])
+        response.headers["X-Next-Cursor"] = base64.urlsafe_b64encode(token.encode()).decode()
@@ -1,21 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Union, Dict, Any
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union, Dict, Any
 import json
-from app.api.deps import get_current_user, get_ansible_service
+from app.api.deps import get_current_user, get_ansible_service, oauth2_scheme, PageParams
 from app.services.ansible import AnsibleService
+from app.services.auth import auth_service
+from app.services.inventory import inventory_cache
+from app.services.run_events import run_registry
+from app.services.scheduler import PRIORITIES, scheduler, workflow_scheduler
 from app.core.database import Database, get_db
 from app.models.schemas import ExecuteRequest
 
 router = APIRouter()
 
-@router.post("/execute")
-def execute_command(
-    req: ExecuteRequest,
-    ansible: AnsibleService = Depends(get_ansible_service),
-    db: Database = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
-    """Execute shell command on hosts"""
+def _command_targets(req: ExecuteRequest, db: Database) -> List[Dict[str, Any]]:
     if req.hosts == 'all':
         target_hosts = db.get_hosts()
     else:
@@ -29,10 +27,101 @@ def execute_command(
 
     if not target_hosts:
         raise HTTPException(status_code=400, detail="No valid target hosts")
+    return target_hosts
 
-    results = ansible.execute_command(req.command, target_hosts)
+@router.post("/execute")
+def execute_command(
+    req: ExecuteRequest,
+    ansible: AnsibleService = Depends(get_ansible_service),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Execute shell command on hosts"""
+    target_hosts = _command_targets(req, db)
+    results = ansible.execute_command(req.command, target_hosts, shard=req.shard, forks=req.forks)
     return results
 
+@router.post("/execute/async")
+def start_command(
+    req: ExecuteRequest,
+    ansible: AnsibleService = Depends(get_ansible_service),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a shell command in the background; stream its results from /runs/{run_id}/events"""
+    target_hosts = _command_targets(req, db)
+    run_id = ansible.execute_command_async(req.command, target_hosts, shard=req.shard, forks=req.forks)
+    return {"run_id": run_id, "token": auth_service.create_run_token(run_id), "hosts": len(target_hosts),
+            "message": "Run started"}
+
+@router.get("/runs/{run_id}/token")
+def get_run_token(
+    run_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Fresh short-lived token for /runs/{run_id}/events"""
+    if run_registry.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+    return {"token": auth_service.create_run_token(run_id)}
+
+def _run_stream_user(
+    run_id: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    bearer: Optional[str] = Depends(oauth2_scheme)
+) -> dict:
+    """EventSource cannot set an Authorization header: accept the run token
+    as ?token=, otherwise the usual Bearer header or login cookie"""
+    if token is not None:
+        if not auth_service.verify_run_token(token, run_id):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        return {"user_id": "admin", "run_id": run_id}
+    return get_current_user(request, bearer)
+
+@router.get("/runs/{run_id}/events")
+async def stream_run_events(
+    run_id: str,
+    last_event_id: Optional[int] = Header(None, ge=0),
+    current_user: dict = Depends(_run_stream_user)
+):
+    """Server-sent events of a run: one `result` event per host as it
+    finishes, then a `done` event with the totals. Reconnecting with
+    Last-Event-ID resumes after that event.
+
+    Authenticates with the run's `token` query parameter (from
+    /execute/async or /runs/{run_id}/token), the login cookie or a Bearer header."""
+    channel = run_registry.get(run_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+
+    async def event_stream():
+        async for seq, event in channel.stream(after=last_event_id or 0):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {seq}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/inventory/cache")
+def get_inventory_cache_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Inventory cache size and hit/miss counters"""
+    return inventory_cache.stats()
+
+@router.get("/scheduler/stats")
+def get_scheduler_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Job scheduler load: running jobs, queue depth per priority and queue wait times.
+    Playbook runs at the top level, the separate workflow pool under `workflows`."""
+    return {**scheduler.stats(), 'workflows': workflow_scheduler.stats()}
+
 @router.get("/hosts/{host_id}/facts")
 def get_host_facts(
     host_id: int,
@@ -67,6 +156,15 @@ def ping_host(
     else:
         return {'status': 'failed', 'message': 'Failed'}
 
+def _forks_param(data: Dict[str, Any]) -> Optional[int]:
+    """Optional per-request forks override of the playbook endpoints"""
+    forks = data.get('forks')
+    if forks is None:
+        return None
+    if isinstance(forks, bool) or not isinstance(forks, int) or forks < 1:
+        raise HTTPException(status_code=400, detail="forks must be a positive integer")
+    return forks
+
 @router.post("/playbook/execute")
 def execute_playbook(
     data: Dict[str, Any],
@@ -78,6 +176,8 @@ def execute_playbook(
     playbook_content = data.get('playbook')
     host_ids = data.get('host_ids', [])
     timeout = data.get('timeout')
+    shard = bool(data.get('shard', False))
+    forks = _forks_param(data)
     
     if not playbook_content:
         raise HTTPException(status_code=400, detail="Playbook content required")
@@ -88,23 +188,24 @@ def execute_playbook(
         target_hosts = [h for h in target_hosts if h]
         
     try:
-        result = ansible.execute_custom_playbook(playbook_content, target_hosts, timeout=timeout)
+        result = ansible.execute_custom_playbook(playbook_content, target_hosts, timeout=timeout, shard=shard,
+                                                 forks=forks)
         
         # Log results
         if target_hosts:
+            failed = set(result['summary']['failed'])
+            unreachable = set(result['summary']['unreachable'])
+            # The same logs are attached to every host, serialize them once
+            output = json.dumps({'playbook_logs': result['logs']})
+            entries = []
             for host in target_hosts:
                 host_status = 'success'
-                if host['address'] in result['summary']['failed']:
+                if host['address'] in failed:
                     host_status = 'failed'
-                elif host['address'] in result['summary']['unreachable']:
+                elif host['address'] in unreachable:
                     host_status = 'unreachable'
-                
-                db.log_command(
-                    host['id'],
-                    'Custom Playbook Execution',
-                    json.dumps({'playbook_logs': result['logs']}),
-                    host_status
-                )
+                entries.append((host['id'], 'Custom Playbook Execution', output, host_status))
+            db.log_commands(entries)
         else:
             db.log_command(
                 None,
@@ -129,9 +230,13 @@ def start_playbook_task(
     host_ids = data.get('host_ids', [])
     group_name = data.get('group_name') # Support group selection
     timeout = data.get('timeout')
+    priority = data.get('priority', 'normal')
+    forks = _forks_param(data)
     
     if not playbook_content:
         raise HTTPException(status_code=400, detail="Playbook content required")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
         
     target_hosts = []
     target_host_ids = []
@@ -157,25 +262,28 @@ def start_playbook_task(
     task_id = db.add_task({
         'type': 'playbook',
         'name': data.get('name', 'Playbook Execution'),
-        'status': 'pending',
+        'status': 'queued',
         'target_hosts': json.dumps(target_host_ids),
-        'params': json.dumps({'playbook': playbook_content, 'timeout': timeout}),
-        'logs': json.dumps([])
+        'params': json.dumps({'playbook': playbook_content, 'timeout': timeout, 'priority': priority,
+                              'forks': forks})
     })
     
-    # Start execution
-    ansible.execute_playbook_async(task_id, playbook_content, target_hosts, timeout=timeout)
+    # Runs when the scheduler has a free slot
+    ansible.execute_playbook_async(task_id, playbook_content, target_hosts, timeout=timeout, priority=priority,
+                                   forks=forks)
     
-    return {"task_id": task_id, "message": "Task started"}
+    return {"task_id": task_id, "status": "queued", "message": "Task queued"}
 
 @router.get("/tasks")
 def get_tasks(
-    limit: int = 100,
+    response: Response,
+    page: PageParams = Depends(),
     db: Database = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get recent tasks"""
-    tasks = db.get_tasks(limit)
+    tasks = db.get_tasks(page.limit, before_id=page.before_id, after_id=page.after_id)
+    page.set_next_cursor(response, tasks, 'created_at')
     # Parse JSON fields
     for task in tasks:
         if task.get('target_hosts'):
@@ -212,10 +320,63 @@ def get_task(
             task['result'] = json.loads(task['result'])
         except:
             pass
-    if task.get('logs'):
-        try:
-            task['logs'] = json.loads(task['logs'])
-        except:
-            pass
+    task['logs'] = _task_log_lines(db, task)
             
     return task
+
+def _legacy_log_lines(logs: str) -> List[str]:
+    """Lines of the JSON blob older tasks kept their output in"""
+    try:
+        return json.loads(logs)
+    except:
+        return [logs]
+
+def _task_log_lines(db: Database, task: Dict[str, Any]) -> List[str]:
+    """Task output as a list of lines; older tasks kept it as a JSON blob on the row"""
+    if task.get('logs'):
+        return _legacy_log_lines(task['logs'])
+    return [row['line'] for row in db.get_task_log_lines(task['id'])]
+
+@router.post("/tasks/{task_id}/cancel")
+def cancel_task(
+    task_id: int,
+    ansible: AnsibleService = Depends(get_ansible_service),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Cancel a queued or running task, killing its whole process tree"""
+    status = db.get_task_status(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    result = ansible.cancel_task(task_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"Task already {db.get_task_status(task_id)}")
+    return {"task_id": task_id, "status": result}
+
+@router.get("/tasks/{task_id}/logs")
+def get_task_logs(
+    task_id: int,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(1000, gt=0),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get task output lines after `after_seq`, for polling a running task"""
+    status = db.get_task_status(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    lines = db.get_task_log_lines(task_id, after_seq, limit)
+    if not lines:
+        # Only tasks without any task_log_lines row have legacy output
+        legacy_logs = db.get_task_legacy_logs(task_id)
+        if legacy_logs:
+            legacy = _legacy_log_lines(legacy_logs)[after_seq:after_seq + limit]
+            lines = [{'seq': after_seq + i, 'line': line} for i, line in enumerate(legacy, 1)]
+
+    return {
+        "task_id": task_id,
+        "status": status,
+        "lines": lines,
+        "next_seq": lines[-1]['seq'] if lines else after_seq
+    }
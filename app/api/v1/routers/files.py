@@ -49,12 +49,12 @@ def api_upload(
             
             # Calculate host_ids list for response
             host_ids = [str(h) for h in target_host_ids]
-            all_hosts = db.get_hosts()
+            all_hosts = db.list_hosts()
             host_map = {str(h['id']): h for h in all_hosts}
             
         else:
             result = ansible.copy_file_to_all(file_path, remote_file_path)
-            all_hosts = db.get_hosts()
+            all_hosts = db.list_hosts()
             host_map = {str(h['id']): h for h in all_hosts}
             host_ids = list(host_map.keys())
 
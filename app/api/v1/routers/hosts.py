@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from app.core.database import Database, get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+import sqlite3
+import tempfile
+from app.core.database import AsyncDatabase, Database, get_async_db, get_db
+from app.services.host_import import import_hosts_stream
 from app.models.schemas import HostCreate, HostUpdate, HostResponse
 from app.api.deps import get_current_user
 
@@ -13,7 +17,8 @@ def get_hosts(
     current_user: dict = Depends(get_current_user)
 ):
     """Get all hosts"""
-    hosts = db.get_hosts(group_name=group_name)
+    # Credential-free projection: the response masks passwords anyway
+    hosts = db.list_hosts(group_name=group_name)
     # Transformation handled by Pydantic model
     return hosts
 
@@ -35,6 +40,7 @@ def get_host(
     host = db.get_host(host_id)
     if not host:
         raise HTTPException(status_code=404, detail="Host not found")
+    host['groups'] = db.get_host_groups(host_id)
     return host
 
 import base64
@@ -78,7 +84,10 @@ def add_host(
     if host_data.password:
         host_data.password = try_decode_base64(host_data.password)
 
-    host_id = db.add_host(host_data.dict())
+    try:
+        host_id = db.add_host(host_data.dict())
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Host {host_data.address}:{host_data.port} already exists")
     return {"message": "Host added successfully", "host_id": host_id}
 
 @router.post("/batch")
@@ -88,16 +97,10 @@ def add_hosts_batch(
     current_user: dict = Depends(get_current_user)
 ):
     """Batch add hosts"""
-    # Fetch existing hosts to check for duplicates
-    existing_hosts = db.get_hosts()
-    existing_ips = {h['address'] for h in existing_hosts}
-
+    # Hosts already registered at the same address and port are skipped by
+    # the unique index on insert
     new_hosts_data = []
     for host in hosts_data:
-        # Deduplicate based on IP
-        if host.address in existing_ips:
-            continue
-
         if host.auth_method == 'password' and not host.password:
             raise HTTPException(status_code=400, detail=f"Password required for host {host.address}")
         
@@ -107,12 +110,46 @@ def add_hosts_batch(
         
         new_hosts_data.append(host)
 
-    if not new_hosts_data:
+    count = db.add_hosts_batch([h.dict() for h in new_hosts_data]) if new_hosts_data else 0
+    if not count:
         return {"message": "No new hosts to add (all duplicates)", "count": 0}
-            
-    count = db.add_hosts_batch([h.dict() for h in new_hosts_data])
     return {"message": f"Successfully added {count} hosts", "count": count}
 
+@router.post("/import")
+async def import_hosts(
+    request: Request,
+    format: Optional[Literal['csv', 'jsonl']] = Query(None, description="Defaults from Content-Type (text/csv, else JSONL)"),
+    password_encoding: Literal['plain', 'base64'] = Query('plain'),
+    db: AsyncDatabase = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream-import hosts from CSV (with a header row) or JSON Lines.
+
+    The upload is spooled to a temporary file (a StreamingResponse can't read
+    the request body while it is sending), then parsed incrementally and
+    inserted in chunks. The response is NDJSON with one progress object per
+    chunk and a final summary.
+    """
+    if format is None:
+        format = 'csv' if 'csv' in request.headers.get('content-type', '') else 'jsonl'
+
+    upload = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+
+    async def progress():
+        try:
+            async for line in import_hosts_stream(upload, format, db, password_encoding):
+                yield line
+        finally:
+            upload.close()
+
+    return StreamingResponse(
+        progress(),
+        media_type="application/x-ndjson"
+    )
+
 from app.services.ansible import AnsibleService, get_ansible_service
 
 @router.post("/check-status")
@@ -190,7 +227,10 @@ def update_host(
     # db.get_host returns dict with keys matching columns.
     # db.update_host expects dict with keys: comment, address, username, port, password, auth_method
     
-    db.update_host(host_id, full_update_data)
+    try:
+        db.update_host(host_id, full_update_data)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Host {full_update_data['address']}:{full_update_data['port']} already exists")
     return {"message": "Host updated successfully"}
 
 @router.delete("/{host_id}")
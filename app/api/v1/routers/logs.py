@@ -1,38 +1,99 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional, Literal
+import sqlite3
+from app.core.config import settings
 from app.core.database import Database, get_db
 from app.models.schemas import AccessLog, CommandLog
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, PageParams
+from app.services.access_log import access_log_writer
 
 router = APIRouter()
 
 @router.get("/logs", response_model=List[CommandLog])
 def get_logs(
-    limit: int = Query(100, gt=0),
+    response: Response,
+    page: PageParams = Depends(),
     db: Database = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get command logs"""
-    logs = db.get_command_logs(limit)
+    logs = db.get_command_logs(page.limit, before_id=page.before_id, after_id=page.after_id)
+    page.set_next_cursor(response, logs, 'executed_at')
     return logs
 
+@router.get("/logs/search")
+def search_logs(
+    q: str = Query(..., min_length=1, description="Search terms; every term must match"),
+    raw: bool = Query(False, description="Treat q as FTS5 query syntax (OR, NOT, prefix*, NEAR)"),
+    host_id: Optional[int] = Query(None),
+    since: Optional[str] = Query(None, description="Lower time bound, e.g. 2024-01-01 00:00:00"),
+    until: Optional[str] = Query(None, description="Upper time bound (exclusive)"),
+    limit: int = Query(50, gt=0, le=500),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Full-text search over command history and task output"""
+    # Quote each term so punctuation in IPs, paths and error text is matched literally
+    match = q if raw else " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+    try:
+        return db.search_logs(match, host_id=host_id, since=since, until=until, limit=limit)
+    except sqlite3.OperationalError as e:
+        # Raw FTS5 syntax fails in many ways ("fts5: syntax error", "no such column: foo" for foo:bar)
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+
+@router.get("/logs/{log_id}", response_model=CommandLog)
+def get_log(
+    log_id: int,
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get one command log with its full output"""
+    log = db.get_command_log(log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+    return log
+
 @router.get("/access-logs", response_model=List[AccessLog])
 def get_access_logs(
-    limit: int = Query(100, gt=0),
+    response: Response,
+    page: PageParams = Depends(),
     ip: str = Query(None, description="Filter by IP address"),
     path: str = Query(None, description="Filter by path"),
     db: Database = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Get access logs"""
-    logs = db.get_access_logs(limit=limit, ip=ip, path=path)
+    logs = db.get_access_logs(limit=page.limit, ip=ip, path=path, before_id=page.before_id, after_id=page.after_id)
+    page.set_next_cursor(response, logs, 'access_time')
     return logs
 
+@router.get("/access-logs/writer-stats")
+def get_access_log_writer_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Buffered/written/dropped counters of the background access log writer"""
+    return access_log_writer.stats()
+
+@router.get("/access-logs/rollups")
+def get_access_log_rollups(
+    since: Optional[str] = Query(None, description="Lower time bound, e.g. 2024-01-01 00:00"),
+    until: Optional[str] = Query(None, description="Upper time bound (exclusive)"),
+    path: Optional[str] = Query(None, description="Route template, e.g. /api/hosts/{host_id}"),
+    granularity: Literal['minute', 'hour', 'day'] = Query('minute'),
+    db: Database = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Request counts and latency percentiles per time bucket, route and status class"""
+    return db.get_access_log_rollups(since=since, until=until, path=path, granularity=granularity)
+
 @router.post("/access-logs/cleanup")
 def cleanup_logs(
     db: Database = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Cleanup old access logs"""
-    db.cleanup_old_logs()
-    return {"message": "Cleaned up logs older than 7 days"}
+    deleted = db.cleanup_old_logs()
+    return {
+        "message": f"Cleaned up logs older than {settings.ACCESS_LOG_RETENTION_DAYS} days",
+        "deleted": deleted
+    }
@@ -33,7 +33,7 @@ def sync_instances_task(instance_passwords: Dict[str, str], region: str):
     """Background task to sync new instances to local DB"""
     instance_ids = list(instance_passwords.keys())
     logger.info(f"Starting background sync for instances: {instance_ids}")
-    db = Database()
+    db = get_db()
     service = TencentCloudService()
     
     remaining_ids = set(instance_ids)
@@ -67,8 +67,7 @@ def sync_instances_task(instance_passwords: Dict[str, str], region: str):
                     
                     if not password:
                         # Try to find in existing hosts
-                        existing_hosts = db.get_hosts()
-                        existing_host = next((h for h in existing_hosts if h['address'] == ip), None)
+                        existing_host = db.get_host_by_address(ip)
                         if existing_host and existing_host.get('password'):
                             password = existing_host['password']
                             logger.info(f"Using existing password for host {ip}")
@@ -111,8 +110,7 @@ def sync_instances_task(instance_passwords: Dict[str, str], region: str):
 
                     # Add to DB immediately
                     # Check duplicates
-                    existing_hosts = db.get_hosts()
-                    existing_host = next((h for h in existing_hosts if h['address'] == ip), None)
+                    existing_host = db.get_host_by_address(ip)
                     
                     if existing_host:
                             db.update_host(existing_host['id'], host_data)
@@ -157,8 +155,7 @@ def sync_instances_task(instance_passwords: Dict[str, str], region: str):
                     }
                     
                     # Check duplicates
-                    existing_hosts = db.get_hosts()
-                    existing_host = next((h for h in existing_hosts if h['address'] == ip), None)
+                    existing_host = db.get_host_by_address(ip)
                     
                     if existing_host:
                          # Optional: Don't overwrite if it exists? Or overwrite?
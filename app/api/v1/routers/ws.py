@@ -1,4 +1,5 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 import json
 import time
 import paramiko
@@ -6,7 +7,7 @@ import threading
 import logging
 import hmac
 import hashlib
-from app.core.database import get_db, Database
+from app.core.database import get_async_db, AsyncDatabase
 from app.core.config import settings
 
 from app.utils.crypto import CryptoUtils
@@ -20,7 +21,7 @@ async def terminal_websocket(
     websocket: WebSocket,
     host_id: int,
     token: str = Query(None),
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_async_db)
 ):
     await websocket.accept()
     
@@ -90,7 +91,7 @@ async def terminal_websocket(
     # Search for `hmac.new` in `app.py`.
     pass
     
-    host = db.get_host(host_id)
+    host = await db.get_host(host_id)
     if not host:
         await websocket.send_json({"error": "Host not found"})
         await websocket.close()
@@ -124,9 +125,10 @@ async def terminal_websocket(
         # If look_for_keys=True (default), paramiko might try keys first and fail or prompt?
         # We set look_for_keys=False above to rely on password if auth_method is password.
         
-        ssh.connect(**connect_args)
+        # Connecting can take up to the 10s timeout; don't stall other sessions meanwhile
+        await run_in_threadpool(ssh.connect, **connect_args)
         
-        channel = ssh.invoke_shell(term='xterm-256color', width=100, height=30)
+        channel = await run_in_threadpool(ssh.invoke_shell, term='xterm-256color', width=100, height=30)
         
         # Background thread to read from SSH and send to WS
         async def send_data():
@@ -17,13 +17,53 @@ class Settings(BaseSettings):
     
     # Database
     DB_PATH: str = "db/ansible.db"
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_CACHE_SIZE_KB: int = 16384
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Threads serving AsyncDatabase calls from async routes
+    DB_EXECUTOR_WORKERS: int = 4
     
     # File Uploads
     UPLOAD_FOLDER: str = "/tmp/ansible_uploads"
     
     # Logs
     LOG_DIR: str = "logs"
+    ACCESS_LOG_BATCH_SIZE: int = 200
+    ACCESS_LOG_FLUSH_INTERVAL_MS: int = 1000
+    ACCESS_LOG_BUFFER_SIZE: int = 10000
+    ACCESS_LOG_RETENTION_DAYS: int = 7
+    ACCESS_LOG_ROLLUP_RETENTION_DAYS: int = 90
+    ACCESS_LOG_RETENTION_INTERVAL_S: int = 3600
+    ACCESS_LOG_DELETE_CHUNK: int = 2000
     
+    # Hosts
+    HOST_IMPORT_CHUNK_SIZE: int = 1000
+    # Distinct target host sets whose inventories are kept between runs
+    INVENTORY_CACHE_ENTRIES: int = 32
+
+    # Tasks
+    TASK_LOG_FLUSH_LINES: int = 200
+    TASK_LOG_FLUSH_INTERVAL_MS: int = 1000
+    # Playbook runs at once (tasks and workflow playbooks); later submissions queue
+    SCHEDULER_MAX_CONCURRENT: int = 4
+    # Workflows running at once, on their own workers; they mostly wait on cloud APIs and SSH
+    WORKFLOW_MAX_CONCURRENT: int = 8
+    # Seconds between SIGTERM and SIGKILL when a playbook run is cancelled or times out
+    TASK_KILL_GRACE_S: int = 5
+    # How long a finished run's live events stay available for streaming
+    RUN_EVENTS_TTL_S: int = 600
+    # Lifetime of the ?token= credential for /runs/{run_id}/events; reconnects past it fetch a new one
+    RUN_TOKEN_TTL_S: int = 300
+    # Larger target sets are split into batches of this many hosts, each run in its own worker process
+    SHARD_SIZE: int = 500
+    # Worker processes for sharded runs (0 = one per CPU core)
+    SHARD_WORKERS: int = 0
+    # Adaptive forks per run: at most FORKS_PER_CORE per CPU core, one per
+    # FORKS_MEMORY_MB of available memory, never more than FORKS_MAX
+    FORKS_PER_CORE: int = 25
+    FORKS_MEMORY_MB: int = 50
+    FORKS_MAX: int = 500
+
     # Tencent Cloud
     TENCENT_REGION: str = os.getenv("TENCENT_REGION", "ap-guangzhou")
 
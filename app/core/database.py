@@ -1,208 +1,830 @@
 import sqlite3
 import os
+import threading
+import hashlib
+import json
+import zlib
+import bisect
+import asyncio
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from contextlib import contextmanager
-from typing import List, Optional, Dict, Any, Generator
+from typing import List, Optional, Dict, Any, Generator, Tuple, Callable, Union
 from app.core.config import settings
 from app.utils.crypto import CryptoUtils
 
-class Database:
-    def __init__(self, db_path: str = settings.DB_PATH):
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """Per-thread reusable SQLite connections for a single database file.
+
+    Each thread keeps one open connection configured for WAL mode, so request
+    handlers and background task threads read concurrently with a writer
+    instead of serializing on the file lock, and nobody pays connect/close
+    on every query.
+    """
+
+    def __init__(self, db_path: str):
         self.db_path = db_path
-        self.crypto = CryptoUtils()
-        self.init_database()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread ident -> (owning thread, connection), used to close connections on shutdown
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
 
-    def init_database(self):
-        """Initialize database tables"""
-        with self.get_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS hosts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    comment TEXT NOT NULL,
-                    address TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    port INTEGER NOT NULL,
-                    password TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    auth_method TEXT NOT NULL DEFAULT 'password',
-                    status TEXT DEFAULT NULL,
-                    group_name TEXT DEFAULT 'all'
-                )
-            """)
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread is disabled only so close_all() can close connections
+        # owned by other threads; each connection is otherwise used by its owner only.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=settings.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{int(settings.DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Used by the command_log_text view that backs full-text search
+        conn.create_function("blob_text", 2, _decompress_blob, deterministic=True)
+        return conn
+
+    def _prune(self) -> None:
+        """Close connections left behind by threads that have exited"""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[ident]
+                conn.close()
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._prune()
+                self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Yield this thread's connection; the outermost block commits or rolls back.
+
+        Nested blocks on the same thread share the enclosing transaction.
+        """
+        conn = self.acquire()
+        self._local.depth += 1
+        try:
+            yield conn
+            if self._local.depth == 1:
+                conn.commit()
+        except Exception as e:
+            if self._local.depth == 1:
+                conn.rollback()
+            raise e
+        finally:
+            self._local.depth -= 1
+
+    def close_all(self) -> None:
+        with self._lock:
+            for thread, conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Return the shared connection pool for a database file"""
+    key = db_path if db_path == ':memory:' else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[key] = pool
+        return pool
+
+def close_pools() -> None:
+    """Close every pooled connection (called on application shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+
+# Multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING (add_hosts_batch) needs 3.35
+SQLITE_MIN_VERSION = (3, 35, 0)
+
+def _sql_max_variables() -> int:
+    """Bound parameters per statement: 32766 by default since SQLite 3.32, lower
+    if the linked library was built with a smaller SQLITE_MAX_VARIABLE_NUMBER"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        return min(conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER), 32766)
+    finally:
+        conn.close()
+
+# IN (...) lists and multi-row VALUES are split to stay within the limit;
+# an IN chunk leaves one parameter for the rest of the statement
+_SQL_MAX_VARIABLES = _sql_max_variables()
+_SQL_IN_CHUNK = _SQL_MAX_VARIABLES - 1
+
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+# --- Schema Migrations ---
+# Each migration runs once, in its own transaction, and bumps PRAGMA user_version.
+# Append new migrations to MIGRATIONS; never edit or reorder released ones.
+
+def _migration_initial_schema(conn: sqlite3.Connection) -> None:
+    """Base tables, plus upgrades for databases created before versioning"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS hosts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            comment TEXT NOT NULL,
+            address TEXT NOT NULL,
+            username TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            password TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            auth_method TEXT NOT NULL DEFAULT 'password',
+            status TEXT DEFAULT NULL,
+            group_name TEXT DEFAULT 'all'
+        )
+    """)
+    
+    # Databases created before these columns existed
+    if not _column_exists(conn, 'hosts', 'status'):
+        conn.execute("ALTER TABLE hosts ADD COLUMN status TEXT DEFAULT NULL")
+    if not _column_exists(conn, 'hosts', 'group_name'):
+        conn.execute("ALTER TABLE hosts ADD COLUMN group_name TEXT DEFAULT 'all'")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS command_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            host_id INTEGER,
+            command TEXT NOT NULL,
+            output TEXT,
+            status TEXT NOT NULL,
+            executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (host_id) REFERENCES hosts (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip_address TEXT NOT NULL,
+            path TEXT NOT NULL,
+            status TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            access_time TIMESTAMP DEFAULT (datetime('now', '+8 hours'))
+        )
+    """)
+
+    # New: Ansible Templates Table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ansible_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # New: Workflow Templates Table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS workflow_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            content TEXT NOT NULL,
+            version TEXT DEFAULT '1.0',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # New: Cloud Credentials Table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cloud_credentials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            access_key TEXT NOT NULL,
+            secret_key TEXT NOT NULL,
+            is_default BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Migration: Split templates into ansible_templates and workflow_templates
+    try:
+        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='templates'")
+        if cursor.fetchone():
+            # Check if data exists in templates to migrate
+            count = conn.execute("SELECT count(*) FROM templates").fetchone()[0]
+            if count > 0:
+                print("Migrating templates...")
+                # Migrate Workflow Templates
+                conn.execute("""
+                    INSERT INTO workflow_templates (name, description, content, version, created_at, updated_at)
+                    SELECT name, description, content, version, created_at, updated_at
+                    FROM templates WHERE type = 'workflow'
+                """)
+                
+                # Migrate Ansible Templates
+                conn.execute("""
+                    INSERT INTO ansible_templates (name, description, content, created_at, updated_at)
+                    SELECT name, description, content, created_at, updated_at
+                    FROM templates WHERE type = 'ansible' OR type IS NULL
+                """)
             
-            # Check if status column exists (for migration)
-            try:
-                conn.execute("SELECT status FROM hosts LIMIT 1")
-            except sqlite3.OperationalError:
-                conn.execute("ALTER TABLE hosts ADD COLUMN status TEXT DEFAULT NULL")
+            # Drop old table (rename for safety? No, user wants separation)
+            conn.execute("DROP TABLE templates")
+            print("Migrated templates to ansible_templates and workflow_templates")
+    except Exception as e:
+        print(f"Migration warning: {e}")
 
-            # Check if group_name column exists (for migration)
-            try:
-                conn.execute("SELECT group_name FROM hosts LIMIT 1")
-            except sqlite3.OperationalError:
-                conn.execute("ALTER TABLE hosts ADD COLUMN group_name TEXT DEFAULT 'all'")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tencent_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            secret_id TEXT NOT NULL,
+            secret_key TEXT NOT NULL,
+            region TEXT DEFAULT 'ap-guangzhou',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS command_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    host_id INTEGER,
-                    command TEXT NOT NULL,
-                    output TEXT,
-                    status TEXT NOT NULL,
-                    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (host_id) REFERENCES hosts (id)
-                )
-            """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            target_hosts TEXT,
+            params TEXT,
+            result TEXT,
+            logs TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    """)
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS access_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ip_address TEXT NOT NULL,
-                    path TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    status_code INTEGER NOT NULL,
-                    access_time TIMESTAMP DEFAULT (datetime('now', '+8 hours'))
-                )
-            """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS workflows (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            current_stage TEXT,
+            context TEXT,
+            logs TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
 
-            # New: Ansible Templates Table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS ansible_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS workflow_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workflow_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (workflow_id) REFERENCES workflows (id)
+        )
+    """)
+    
+    if not _column_exists(conn, 'workflow_logs', 'detail'):
+        conn.execute("ALTER TABLE workflow_logs ADD COLUMN detail TEXT")
 
-            # New: Workflow Templates Table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS workflow_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    content TEXT NOT NULL,
-                    version TEXT DEFAULT '1.0',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+def _migration_foreign_key_indexes(conn: sqlite3.Connection) -> None:
+    """Index the child side of foreign keys"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_command_logs_host_id ON command_logs (host_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_logs_workflow_id ON workflow_logs (workflow_id)")
 
-            # New: Cloud Credentials Table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS cloud_credentials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    provider TEXT NOT NULL,
-                    access_key TEXT NOT NULL,
-                    secret_key TEXT NOT NULL,
-                    is_default BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+def _merge_duplicate_hosts(conn: sqlite3.Connection) -> None:
+    """Fold hosts sharing an (address, port) into the newest row (highest id).
 
-            # Migration: Split templates into ansible_templates and workflow_templates
-            try:
-                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='templates'")
-                if cursor.fetchone():
-                    # Check if data exists in templates to migrate
-                    count = conn.execute("SELECT count(*) FROM templates").fetchone()[0]
-                    if count > 0:
-                        print("Migrating templates...")
-                        # Migrate Workflow Templates
-                        conn.execute("""
-                            INSERT INTO workflow_templates (name, description, content, version, created_at, updated_at)
-                            SELECT name, description, content, version, created_at, updated_at
-                            FROM templates WHERE type = 'workflow'
-                        """)
-                        
-                        # Migrate Ansible Templates
-                        conn.execute("""
-                            INSERT INTO ansible_templates (name, description, content, created_at, updated_at)
-                            SELECT name, description, content, created_at, updated_at
-                            FROM templates WHERE type = 'ansible' OR type IS NULL
-                        """)
-                    
-                    # Drop old table (rename for safety? No, user wants separation)
-                    conn.execute("DROP TABLE templates")
-                    print("Migrated templates to ansible_templates and workflow_templates")
-            except Exception as e:
-                print(f"Migration warning: {e}")
+    Rows of every table with a foreign key to hosts are re-pointed to the
+    kept host, and each merge is logged with the ids it removed.
+    """
+    duplicates = conn.execute("""
+        SELECT address, port, MAX(id), group_concat(id) FROM hosts
+        GROUP BY address, port HAVING COUNT(*) > 1
+    """).fetchall()
+    if not duplicates:
+        return
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS tencent_config (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    secret_id TEXT NOT NULL,
-                    secret_key TEXT NOT NULL,
-                    region TEXT DEFAULT 'ap-guangzhou',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    references = [
+        (table, fk[3])
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        for fk in conn.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+        if fk[2] == 'hosts'
+    ]
+    for address, port, keep_id, ids in duplicates:
+        merged = sorted(int(host_id) for host_id in ids.split(',') if int(host_id) != keep_id)
+        moved = 0
+        for i in range(0, len(merged), _SQL_IN_CHUNK):
+            chunk = merged[i:i + _SQL_IN_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            for table, column in references:
+                moved += conn.execute(
+                    f"UPDATE {table} SET {column} = ? WHERE {column} IN ({placeholders})", [keep_id] + chunk
+                ).rowcount
+            conn.execute(f"DELETE FROM hosts WHERE id IN ({placeholders})", chunk)
+        logger.warning(
+            f"Merged duplicate hosts at {address}:{port} into id {keep_id}: "
+            f"removed ids {merged}, re-pointed {moved} referencing rows"
+        )
+    logger.warning(f"Merged {len(duplicates)} duplicated (address, port) host entries before adding the unique index")
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    target_hosts TEXT,
-                    params TEXT,
-                    result TEXT,
-                    logs TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP
-                )
-            """)
+def _migration_query_indexes(conn: sqlite3.Connection) -> None:
+    """Indexes for the list/sort/filter paths and a unique (address, port) per host"""
+    _merge_duplicate_hosts(conn)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_hosts_address_port ON hosts (address, port)")
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS workflows (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    status TEXT NOT NULL DEFAULT 'pending',
-                    current_stage TEXT,
-                    context TEXT,
-                    logs TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    # (host_id, executed_at) supersedes the single-column host_id index
+    conn.execute("DROP INDEX IF EXISTS idx_command_logs_host_id")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_command_logs_host_executed ON command_logs (host_id, executed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_command_logs_executed_at ON command_logs (executed_at)")
+
+    # Covers the LIKE filters so non-matching rows are rejected without a table lookup
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_time_ip_path ON access_logs (access_time, ip_address, path)")
+
+    conn.execute("DROP INDEX IF EXISTS idx_workflow_logs_workflow_id")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_logs_workflow_time ON workflow_logs (workflow_id, timestamp)")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workflows_created_at ON workflows (created_at)")
+
+def _migration_task_log_lines(conn: sqlite3.Connection) -> None:
+    """Append-only task output, one row per line"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_log_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            line TEXT NOT NULL,
+            UNIQUE (task_id, seq),
+            FOREIGN KEY (task_id) REFERENCES tasks (id)
+        )
+    """)
+
+# Large, repetitive text columns stored once in `blobs` and referenced by
+# hash from a sibling `<column>_hash` column
+BLOB_COLUMNS = {
+    'command_logs': ('output',),
+    'tasks': ('params', 'logs'),
+    'workflow_logs': ('detail',),
+}
+# Shorter values stay inline; a 64-char hash would not save anything
+BLOB_INLINE_MAX = 128
+_BLOB_CHUNK = 500
+
+def _blob_refs(conn: sqlite3.Connection, texts: List[Optional[str]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Store each distinct long text once; returns an (inline_value, hash) pair per input"""
+    refs = []
+    new_blobs = {}
+    for text in texts:
+        if text is None or len(text) < BLOB_INLINE_MAX:
+            refs.append((text, None))
+            continue
+        data = text.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        if key not in new_blobs:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                new_blobs[key] = ('zlib', len(data), compressed)
+            else:
+                new_blobs[key] = ('raw', len(data), data)
+        refs.append((None, key))
+    if new_blobs:
+        conn.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+            [(key, codec, size, data) for key, (codec, size, data) in new_blobs.items()]
+        )
+    return refs
+
+def _decompress_blob(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    if codec == 'zlib':
+        data = zlib.decompress(data)
+    return bytes(data).decode('utf-8')
+
+def _load_blobs(conn: sqlite3.Connection, hashes) -> Dict[str, str]:
+    """Fetch and decompress the given blobs, each distinct hash once"""
+    hashes = list(set(hashes))
+    texts = {}
+    for i in range(0, len(hashes), _BLOB_CHUNK):
+        chunk = hashes[i:i + _BLOB_CHUNK]
+        cursor = conn.execute(
+            f"SELECT hash, codec, data FROM blobs WHERE hash IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        for key, codec, data in cursor:
+            texts[key] = _decompress_blob(codec, data)
+    return texts
+
+def _resolve_blob_columns(conn: sqlite3.Connection, rows: List[Dict[str, Any]], columns) -> List[Dict[str, Any]]:
+    """Replace `<column>_hash` references in rows with the stored text, one blob query per page"""
+    wanted = [row[f"{column}_hash"] for row in rows for column in columns if row.get(f"{column}_hash")]
+    texts = _load_blobs(conn, wanted) if wanted else {}
+    for row in rows:
+        for column in columns:
+            key = row.pop(f"{column}_hash", None)
+            if key:
+                row[column] = texts.get(key)
+    return rows
+
+def _migration_blob_store(conn: sqlite3.Connection) -> None:
+    """Content-addressed, compressed storage for the BLOB_COLUMNS, backfilled from existing rows"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT NOT NULL UNIQUE,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    for table, columns in BLOB_COLUMNS.items():
+        for column in columns:
+            if not _column_exists(conn, table, f"{column}_hash"):
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}_hash TEXT")
+
+            last_id = 0
+            while True:
+                rows = conn.execute(f"""
+                    SELECT id, {column} FROM {table}
+                    WHERE id > ? AND length({column}) >= ?
+                    ORDER BY id LIMIT 1000
+                """, (last_id, BLOB_INLINE_MAX)).fetchall()
+                if not rows:
+                    break
+                refs = _blob_refs(conn, [row[1] for row in rows])
+                conn.executemany(
+                    f"UPDATE {table} SET {column} = NULL, {column}_hash = ? WHERE id = ?",
+                    [(key, row[0]) for row, (_, key) in zip(rows, refs)]
                 )
-            """)
+                last_id = rows[-1][0]
+
+def _migration_log_search(conn: sqlite3.Connection) -> None:
+    """FTS5 indexes over command history and task output lines.
+
+    command_log_fts is an external-content index over a view that inflates
+    blob-stored output, so the text itself is not stored twice; Database
+    keeps it in step with command_logs. task_log_fts is kept in step by a
+    trigger since task_log_lines holds plain text.
+    """
+    conn.execute("""
+        CREATE VIEW IF NOT EXISTS command_log_text AS
+        SELECT cl.id, cl.command, COALESCE(cl.output, blob_text(b.codec, b.data)) AS output
+        FROM command_logs cl
+        LEFT JOIN blobs b ON b.hash = cl.output_hash
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS command_log_fts USING fts5(
+            command, output, content='command_log_text', content_rowid='id'
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS task_log_fts USING fts5(
+            line, content='task_log_lines', content_rowid='id'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS task_log_lines_fts_insert AFTER INSERT ON task_log_lines BEGIN
+            INSERT INTO task_log_fts (rowid, line) VALUES (new.id, new.line);
+        END
+    """)
+    conn.execute("INSERT INTO command_log_fts (command_log_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO task_log_fts (task_log_fts) VALUES ('rebuild')")
+
+# Upper bounds (ms) of the access log latency histogram buckets; the last
+# bucket (le_inf) catches everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LATENCY_BUCKET_COLUMNS = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+
+def _histogram_quantile(histogram: List[int], total: int, q: float, observed_max: float) -> Optional[float]:
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + (None,), histogram):
+        cumulative += count
+        if cumulative >= rank:
+            return observed_max if bound is None else min(float(bound), observed_max)
+    return observed_max
+
+def _migration_access_log_rollups(conn: sqlite3.Connection) -> None:
+    """Request latency on access_logs and per-minute rollups maintained on insert"""
+    if not _column_exists(conn, 'access_logs', 'latency_ms'):
+        conn.execute("ALTER TABLE access_logs ADD COLUMN latency_ms REAL")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS access_log_rollups (
+            minute TEXT NOT NULL,
+            path TEXT NOT NULL,
+            status_class TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            latency_count INTEGER NOT NULL DEFAULT 0,
+            latency_sum REAL NOT NULL DEFAULT 0,
+            latency_max REAL NOT NULL DEFAULT 0,
+            {', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in LATENCY_BUCKET_COLUMNS)},
+            PRIMARY KEY (minute, path, status_class)
+        )
+    """)
+    # Existing rows have no latency; they only contribute counts
+    conn.execute("""
+        INSERT INTO access_log_rollups (minute, path, status_class, count)
+        SELECT substr(access_time, 1, 16), path, (status_code / 100) || 'xx', COUNT(*)
+        FROM access_logs
+        GROUP BY 1, 2, 3
+    """)
+
+# Nested groups are written as a path, e.g. "prod:web" is a child of "prod"
+GROUP_SEPARATOR = ':'
 
+def _ensure_groups(conn: sqlite3.Connection, names) -> Dict[str, int]:
+    """Return {name: id} for the given group paths, creating missing groups, their parents and closure rows"""
+    wanted = {name for name in names if name}
+    paths = set()
+    for name in wanted:
+        parts = name.split(GROUP_SEPARATOR)
+        paths.update(GROUP_SEPARATOR.join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    ids: Dict[str, int] = {}
+    path_list = list(paths)
+    for i in range(0, len(path_list), _SQL_IN_CHUNK):
+        chunk = path_list[i:i + _SQL_IN_CHUNK]
+        cursor = conn.execute(f"SELECT id, name FROM groups WHERE name IN ({', '.join('?' * len(chunk))})", chunk)
+        ids.update((row[1], row[0]) for row in cursor)
+
+    # Parents sort before their children, so each parent exists when a child is added
+    for path in sorted(paths - ids.keys(), key=lambda p: p.count(GROUP_SEPARATOR)):
+        parent = path.rsplit(GROUP_SEPARATOR, 1)[0] if GROUP_SEPARATOR in path else None
+        parent_id = ids.get(parent) if parent else None
+        group_id = conn.execute("INSERT INTO groups (name, parent_id) VALUES (?, ?)", (path, parent_id)).lastrowid
+        conn.execute("INSERT INTO group_closure (ancestor_id, descendant_id, depth) VALUES (?, ?, 0)", (group_id, group_id))
+        if parent_id is not None:
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS workflow_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    workflow_id INTEGER NOT NULL,
-                    stage TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    message TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (workflow_id) REFERENCES workflows (id)
-                )
+                INSERT INTO group_closure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, ?, depth + 1 FROM group_closure WHERE descendant_id = ?
+            """, (group_id, parent_id))
+        ids[path] = group_id
+    return {name: ids[name] for name in wanted}
+
+def _add_host_groups(conn: sqlite3.Connection, memberships: List[Tuple[int, List[str]]]) -> None:
+    """Add (host_id, [group names]) memberships"""
+    group_ids = _ensure_groups(conn, {name for _, names in memberships for name in names})
+    conn.executemany(
+        "INSERT OR IGNORE INTO host_groups (group_id, host_id) VALUES (?, ?)",
+        [(group_ids[name], host_id) for host_id, names in memberships for name in names if name]
+    )
+
+def _host_group_names(host_data: Dict[str, Any]) -> List[str]:
+    """All groups of a host: `groups` when given, else its single group_name"""
+    return list(host_data.get('groups') or [host_data.get('group_name') or 'all'])
+
+def _migration_host_groups(conn: sqlite3.Connection) -> None:
+    """Many-to-many host/group membership with nested groups via a closure table"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            parent_id INTEGER,
+            FOREIGN KEY (parent_id) REFERENCES groups (id)
+        )
+    """)
+    # One row per (ancestor, descendant) pair including each group with itself
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS group_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_group_closure_descendant ON group_closure (descendant_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS host_groups (
+            group_id INTEGER NOT NULL,
+            host_id INTEGER NOT NULL,
+            PRIMARY KEY (group_id, host_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_host_groups_host ON host_groups (host_id, group_id)")
+
+    rows = conn.execute("SELECT id, group_name FROM hosts WHERE group_name IS NOT NULL AND group_name != ''").fetchall()
+    _add_host_groups(conn, [(row[0], [row[1]]) for row in rows])
+
+def _migration_host_revision(conn: sqlite3.Connection) -> None:
+    """Per-host edit counter, so caches derived from host rows can tell a row changed"""
+    if not _column_exists(conn, 'hosts', 'revision'):
+        conn.execute("ALTER TABLE hosts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+def _migration_blob_hash_indexes(conn: sqlite3.Connection) -> None:
+    """Index the blob references, so pruning a blob checks each referencing table with one probe"""
+    for table, columns in BLOB_COLUMNS.items():
+        for column in columns:
+            # Short values stay inline with a NULL hash; only blob references are indexed
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{table}_{column}_hash ON {table} ({column}_hash)
+                WHERE {column}_hash IS NOT NULL
             """)
-            
-            # Check if detail column exists (for migration)
+
+def _migration_access_log_page_index(conn: sqlite3.Connection) -> None:
+    """Put id right after access_time in the covering access log index.
+
+    Pages sort on (access_time, id); with ip_address and path in between the
+    id order within one second needed a temp b-tree.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_access_logs_time_ip_path")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_time_id_ip_path ON access_logs (access_time, id, ip_address, path)")
+
+MIGRATIONS = [
+    _migration_initial_schema,
+    _migration_foreign_key_indexes,
+    _migration_query_indexes,
+    _migration_task_log_lines,
+    _migration_blob_store,
+    _migration_log_search,
+    _migration_access_log_rollups,
+    _migration_host_groups,
+    _migration_host_revision,
+    _migration_blob_hash_indexes,
+    _migration_access_log_page_index,
+]
+
+class HostRecord(dict):
+    """Host row whose password is decrypted on first access.
+
+    The stored ciphertext is kept under 'encrypted_password'; 'password' is
+    only materialized (decrypted) when something reads it, so code paths that
+    never touch credentials never pay for AES-GCM.
+    """
+
+    def __init__(self, row: sqlite3.Row, crypto: CryptoUtils):
+        super().__init__(row)
+        dict.__setitem__(self, 'encrypted_password', dict.pop(self, 'password', None))
+        self._crypto = crypto
+
+    def _resolve(self) -> None:
+        if dict.__contains__(self, 'password'):
+            return
+        encrypted = dict.get(self, 'encrypted_password')
+        password = None
+        if dict.get(self, 'auth_method') == 'password' and encrypted:
+            password = self._crypto.decrypt(encrypted)
+        dict.__setitem__(self, 'password', password)
+
+    def __getitem__(self, key):
+        if key == 'password':
+            self._resolve()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key == 'password':
+            self._resolve()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return key == 'password' or dict.__contains__(self, key)
+
+    # Bulk access (iteration, dict(record), json.dumps, copies) sees the decrypted value
+    def __iter__(self):
+        self._resolve()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._resolve()
+        return dict.keys(self)
+
+    def items(self):
+        self._resolve()
+        return dict.items(self)
+
+    def values(self):
+        self._resolve()
+        return dict.values(self)
+
+    def copy(self) -> Dict[str, Any]:
+        self._resolve()
+        return dict(dict.items(self))
+
+def decrypt_host_passwords(hosts: List[Dict[str, Any]]) -> None:
+    """Decrypt the still-encrypted passwords of HostRecords in one decrypt_many batch"""
+    pending = [host for host in hosts if isinstance(host, HostRecord) and not dict.__contains__(host, 'password')
+               and host['auth_method'] == 'password' and host['encrypted_password']]
+    if not pending:
+        return
+    passwords = CryptoUtils().decrypt_many([host['encrypted_password'] for host in pending])
+    for host, password in zip(pending, passwords):
+        dict.__setitem__(host, 'password', password)
+
+# Bumped after every write to the hosts table (see Database.hosts_generation)
+_hosts_generation = itertools.count(1)
+
+# Host columns that never include credentials, for listing and dedup paths
+HOST_PUBLIC_COLUMNS = "id, comment, address, username, port, auth_method, status, group_name, created_at"
+
+# Task columns for list pages: everything but the blob-stored playbook and output
+TASK_LIST_COLUMNS = "id, type, name, status, target_hosts, result, created_at, updated_at, completed_at"
+
+# Ids of hosts in a group or any of its descendants: one index probe on
+# groups.name, a range scan of its closure rows, then host_groups by group
+GROUP_MEMBERS_QUERY = """
+    SELECT hg.host_id FROM groups g
+    JOIN group_closure c ON c.ancestor_id = g.id
+    JOIN host_groups hg ON hg.group_id = c.descendant_id
+    WHERE g.name = ?
+"""
+
+# A page anchor: a row id, or the (time, id) sort key of a row. Cursors
+# carry the sort key, so paging goes on after retention deleted the anchor row.
+KeysetAnchor = Union[int, Tuple[str, int]]
+
+def _keyset_condition(alias: str, table: str, time_column: str,
+                      before_id: Optional[KeysetAnchor] = None,
+                      after_id: Optional[KeysetAnchor] = None) -> Tuple[Optional[str], List[Any], str]:
+    """Keyset condition on (time_column, id) relative to an anchor.
+
+    Returns the WHERE condition (or None), its params and the scan direction.
+    Pages walk the (time_column) index, whose entries end with the rowid, so
+    every page is a range scan regardless of how deep it is. A bare id is
+    looked up; a (time, id) anchor is compared directly.
+    """
+    for anchor, operator, direction in ((after_id, '>', 'ASC'), (before_id, '<', 'DESC')):
+        if anchor is None:
+            continue
+        if isinstance(anchor, tuple):
+            return f"({alias}.{time_column}, {alias}.id) {operator} (?, ?)", list(anchor), direction
+        return (f"({alias}.{time_column}, {alias}.id) {operator} (SELECT {time_column}, id FROM {table} WHERE id = ?)",
+                [anchor], direction)
+    return None, [], "DESC"
+
+class Database:
+    # Process-wide count of host writes; in-memory caches built from host rows
+    # (the inventory cache) drop their entries when it moves
+    hosts_generation = 0
+
+    def __init__(self, db_path: str = settings.DB_PATH):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.crypto = CryptoUtils()
+        self.init_database()
+
+    def init_database(self):
+        """Bring the schema up to date; on an up-to-date database this is a single PRAGMA read"""
+        if sqlite3.sqlite_version_info < SQLITE_MIN_VERSION:
+            raise RuntimeError(
+                f"SQLite {'.'.join(map(str, SQLITE_MIN_VERSION))} or newer is required, found {sqlite3.sqlite_version}"
+            )
+        with self.get_connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+                return
+            self._run_migrations(conn)
+
+    def _run_migrations(self, conn: sqlite3.Connection) -> None:
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            # BEGIN IMMEDIATE takes the write lock before re-reading the version,
+            # so concurrent processes never apply the same migration twice.
+            conn.execute("BEGIN IMMEDIATE")
             try:
-                conn.execute("SELECT detail FROM workflow_logs LIMIT 1")
-            except sqlite3.OperationalError:
-                conn.execute("ALTER TABLE workflow_logs ADD COLUMN detail TEXT")
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    conn.rollback()
+                    continue
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
 
     @contextmanager
     def get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        """Context manager for database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
+        """Context manager for a pooled database connection"""
+        with self.pool.connection() as conn:
             yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+
+    @staticmethod
+    def _hosts_changed() -> None:
+        Database.hosts_generation = next(_hosts_generation)
 
     def add_host(self, host_data: Dict[str, Any]) -> int:
         with self.get_connection() as conn:
@@ -224,71 +846,136 @@ class Database:
                 auth_method,
                 host_data.get('group_name', 'all')
             ))
-            return cursor.lastrowid
+            _add_host_groups(conn, [(cursor.lastrowid, _host_group_names(host_data))])
+            host_id = cursor.lastrowid
+        self._hosts_changed()
+        return host_id
 
     def add_hosts_batch(self, hosts_data: List[Dict[str, Any]]) -> int:
+        passwords = self.crypto.encrypt_many([
+            host.get('password') if host.get('auth_method', 'password') == 'password' else None
+            for host in hosts_data
+        ])
+        processed_hosts = []
+        groups_by_key = {}
+        for host, encrypted_password in zip(hosts_data, passwords):
+            processed_hosts.append((
+                host['comment'],
+                host['address'],
+                host['username'],
+                host['port'],
+                encrypted_password,
+                host.get('auth_method', 'password'),
+                host.get('group_name', 'all')
+            ))
+            groups_by_key.setdefault((host['address'], host['port']), _host_group_names(host))
+
+        inserted = 0
         with self.get_connection() as conn:
-            processed_hosts = []
-            for host in hosts_data:
-                encrypted_password = None
-                auth_method = host.get('auth_method', 'password')
-                
-                if auth_method == 'password' and host.get('password'):
-                    encrypted_password = self.crypto.encrypt(host['password'])
-                
-                processed_hosts.append((
-                    host['comment'],
-                    host['address'],
-                    host['username'],
-                    host['port'],
-                    encrypted_password,
-                    auth_method,
-                    host.get('group_name', 'all')
-                ))
-                
-            cursor = conn.executemany("""
-                INSERT INTO hosts (comment, address, username, port, password, auth_method, group_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, processed_hosts)
-            return cursor.rowcount
+            # Multi-row INSERT ... RETURNING reports exactly which hosts were new;
+            # hosts already registered at the same address and port are skipped
+            rows_per_insert = _SQL_MAX_VARIABLES // len(processed_hosts[0]) if processed_hosts else 1
+            for i in range(0, len(processed_hosts), rows_per_insert):
+                chunk = processed_hosts[i:i + rows_per_insert]
+                cursor = conn.execute(f"""
+                    INSERT INTO hosts (comment, address, username, port, password, auth_method, group_name)
+                    VALUES {', '.join(['(?, ?, ?, ?, ?, ?, ?)'] * len(chunk))}
+                    ON CONFLICT (address, port) DO NOTHING
+                    RETURNING id, address, port
+                """, [value for row in chunk for value in row])
+                new_hosts = cursor.fetchall()
+                _add_host_groups(conn, [(row[0], groups_by_key[(row[1], row[2])]) for row in new_hosts])
+                inserted += len(new_hosts)
+        if inserted:
+            self._hosts_changed()
+        return inserted
+
+    def get_hosts(self, group_name: Optional[str] = None, decrypt: bool = False) -> List[HostRecord]:
+        """Full host records.
 
-    def get_hosts(self, group_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        Passwords are decrypted lazily on first access, or all at once in a
+        single batch when decrypt=True (for callers that need every credential
+        up front). The inventory cache keeps the ciphertext and decrypts it
+        in one batch per run.
+        """
         with self.get_connection() as conn:
             query = "SELECT * FROM hosts"
             params = []
             if group_name:
-                query += " WHERE group_name = ?"
+                query += f" WHERE id IN ({GROUP_MEMBERS_QUERY})"
                 params.append(group_name)
             query += " ORDER BY created_at DESC"
             
             cursor = conn.execute(query, params)
-            hosts = [dict(row) for row in cursor.fetchall()]
-            
-            for host in hosts:
-                host['encrypted_password'] = host['password']
-                if host['auth_method'] == 'password' and host['password']:
-                    host['password'] = self.crypto.decrypt(host['password'])
-                else:
-                    host['password'] = None
+            hosts = [HostRecord(row, self.crypto) for row in cursor.fetchall()]
+
+        if decrypt:
+            decrypt_host_passwords(hosts)
+        return hosts
+
+    def list_hosts(self, group_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Credential-free host listing (no password column is read or decrypted)"""
+        with self.get_connection() as conn:
+            query = f"""
+                SELECT {HOST_PUBLIC_COLUMNS},
+                       (password IS NOT NULL AND password LIKE 'ENC:%') AS is_password_encrypted,
+                       (SELECT json_group_array(g.name) FROM host_groups hg
+                        JOIN groups g ON g.id = hg.group_id
+                        WHERE hg.host_id = hosts.id) AS groups
+                FROM hosts
+            """
+            params = []
+            if group_name:
+                query += f" WHERE id IN ({GROUP_MEMBERS_QUERY})"
+                params.append(group_name)
+            query += " ORDER BY created_at DESC"
+
+            cursor = conn.execute(query, params)
+            hosts = []
+            for row in cursor.fetchall():
+                host = dict(row)
+                host['groups'] = sorted(json.loads(host['groups']))
+                hosts.append(host)
             return hosts
 
+    def get_host_by_address(self, address: str) -> Optional[HostRecord]:
+        """Most recently added host at an address (served by the (address, port) index)"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("SELECT * FROM hosts WHERE address = ? ORDER BY created_at DESC LIMIT 1", (address,))
+            row = cursor.fetchone()
+            return HostRecord(row, self.crypto) if row else None
+
     def get_groups(self) -> List[str]:
+        """Names of groups that have hosts, directly or through a child group"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT name FROM groups g
+                WHERE EXISTS (
+                    SELECT 1 FROM group_closure c
+                    JOIN host_groups hg ON hg.group_id = c.descendant_id
+                    WHERE c.ancestor_id = g.id
+                )
+                ORDER BY name
+            """)
+            return [row['name'] for row in cursor.fetchall()]
+
+    def get_host_groups(self, host_id: int) -> List[str]:
         with self.get_connection() as conn:
-            cursor = conn.execute("SELECT DISTINCT group_name FROM hosts ORDER BY group_name")
-            return [row['group_name'] for row in cursor.fetchall() if row['group_name']]
+            return self._host_group_names(conn, host_id)
 
-    def get_host(self, host_id: int) -> Optional[Dict[str, Any]]:
+    def _host_group_names(self, conn: sqlite3.Connection, host_id: int) -> List[str]:
+        cursor = conn.execute("""
+            SELECT g.name FROM host_groups hg JOIN groups g ON g.id = hg.group_id
+            WHERE hg.host_id = ? ORDER BY g.name
+        """, (host_id,))
+        return [row['name'] for row in cursor.fetchall()]
+
+    def get_host(self, host_id: int) -> Optional[HostRecord]:
         with self.get_connection() as conn:
             cursor = conn.execute("SELECT * FROM hosts WHERE id = ?", (host_id,))
             row = cursor.fetchone()
             if row:
-                host = dict(row)
-                host['encrypted_password'] = host['password']
-                if host['auth_method'] == 'password' and host['password']:
-                    host['password'] = self.crypto.decrypt(host['password'])
-                else:
-                    host['password'] = None
-                return host
+                return HostRecord(row, self.crypto)
             return None
 
     def update_host(self, host_id: int, host_data: Dict[str, Any]) -> None:
@@ -303,11 +990,15 @@ class Database:
             # The original Flask app handled this in the route logic. We will handle it in the service.
             # But here we assume `host_data` contains the correct values to write.
             
+            row = conn.execute("SELECT group_name FROM hosts WHERE id = ?", (host_id,)).fetchone()
+            previous_group = row['group_name'] if row else None
+
             # To support partial updates properly, dynamic SQL generation is better, 
             # but adhering to original structure:
             conn.execute("""
                 UPDATE hosts 
-                SET comment = ?, address = ?, username = ?, port = ?, password = ?, auth_method = ?, group_name = ?
+                SET comment = ?, address = ?, username = ?, port = ?, password = ?, auth_method = ?, group_name = ?,
+                    revision = revision + 1
                 WHERE id = ?
             """, (
                 host_data['comment'],
@@ -319,6 +1010,15 @@ class Database:
                 host_data.get('group_name', 'all'),
                 host_id
             ))
+            if host_data.get('groups') is not None:
+                group_names = _host_group_names(host_data)
+            else:
+                # Only the primary group was edited; keep the other memberships
+                group_names = [name for name in self._host_group_names(conn, host_id) if name != previous_group]
+                group_names.append(host_data.get('group_name') or 'all')
+            conn.execute("DELETE FROM host_groups WHERE host_id = ?", (host_id,))
+            _add_host_groups(conn, [(host_id, group_names)])
+        self._hosts_changed()
 
     def update_host_status(self, host_id: int, status: str) -> None:
         with self.get_connection() as conn:
@@ -326,39 +1026,246 @@ class Database:
 
     def delete_host(self, host_id: int) -> None:
         with self.get_connection() as conn:
+            output_hashes = [row[0] for row in conn.execute(
+                "SELECT DISTINCT output_hash FROM command_logs WHERE host_id = ? AND output_hash IS NOT NULL", (host_id,)
+            )]
+            conn.execute("""
+                INSERT INTO command_log_fts (command_log_fts, rowid, command, output)
+                SELECT 'delete', t.id, t.command, t.output
+                FROM command_logs cl JOIN command_log_text t ON t.id = cl.id
+                WHERE cl.host_id = ?
+            """, (host_id,))
             conn.execute("DELETE FROM command_logs WHERE host_id = ?", (host_id,))
+            conn.execute("DELETE FROM host_groups WHERE host_id = ?", (host_id,))
             conn.execute("DELETE FROM hosts WHERE id = ?", (host_id,))
+            self._prune_blobs(conn, output_hashes)
+        self._hosts_changed()
+
+    def _prune_blobs(self, conn: sqlite3.Connection, hashes: List[str]) -> int:
+        """Delete those of the given blobs that no BLOB_COLUMNS row references any more.
+
+        Only blobs the caller just dropped references to are checked, each
+        with one probe of the *_hash index per referencing column.
+        """
+        unreferenced = " AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {table} WHERE {column}_hash = blobs.hash)"
+            for table, columns in BLOB_COLUMNS.items() for column in columns
+        )
+        hashes = list(set(hashes))
+        deleted = 0
+        for i in range(0, len(hashes), _SQL_IN_CHUNK):
+            chunk = hashes[i:i + _SQL_IN_CHUNK]
+            deleted += conn.execute(
+                f"DELETE FROM blobs WHERE hash IN ({', '.join('?' * len(chunk))}) AND {unreferenced}", chunk
+            ).rowcount
+        return deleted
 
     def log_command(self, host_id: int, command: str, output: str, status: str) -> None:
+        self.log_commands([(host_id, command, output, status)])
+
+    def log_commands(self, entries: List[Tuple[Optional[int], str, str, str]]) -> None:
+        """Bulk insert (host_id, command, output, status) rows in one transaction.
+
+        Identical outputs (the same stdout on every host) are stored once.
+        """
+        if not entries:
+            return
         with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO command_logs (host_id, command, output, status)
-                VALUES (?, ?, ?, ?)
-            """, (host_id, command, output, status))
+            refs = _blob_refs(conn, [entry[2] for entry in entries])
+            texts = {output_hash: entry[2] for entry, (_, output_hash) in zip(entries, refs) if output_hash}
+            rows = [
+                (host_id, command, output, output_hash, status)
+                for (host_id, command, _, status), (output, output_hash) in zip(entries, refs)
+            ]
+            # The FTS rows take their rowids from RETURNING; RETURNING order is
+            # unspecified, so each row's text is found by its inline value or hash
+            rows_per_insert = _SQL_MAX_VARIABLES // len(rows[0])
+            for i in range(0, len(rows), rows_per_insert):
+                chunk = rows[i:i + rows_per_insert]
+                inserted = conn.execute(f"""
+                    INSERT INTO command_logs (host_id, command, output, output_hash, status)
+                    VALUES {', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))}
+                    RETURNING id, command, output, output_hash
+                """, [value for row in chunk for value in row]).fetchall()
+                conn.executemany(
+                    "INSERT INTO command_log_fts (rowid, command, output) VALUES (?, ?, ?)",
+                    [(log_id, command, texts[output_hash] if output_hash else output)
+                     for log_id, command, output, output_hash in inserted]
+                )
 
-    def get_command_logs(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_command_logs(self, limit: int = 100, before_id: Optional[KeysetAnchor] = None,
+                         after_id: Optional[KeysetAnchor] = None) -> List[Dict[str, Any]]:
+        """Newest-first page of command logs, optionally older than before_id or newer than after_id.
+
+        Output stored in the blob store is not loaded: such rows have output
+        None and output_truncated set; get_command_log returns the full text.
+        """
+        condition, params, direction = _keyset_condition('cl', 'command_logs', 'executed_at', before_id, after_id)
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT cl.*, h.comment, h.address 
+            cursor = conn.execute(f"""
+                SELECT cl.id, cl.host_id, cl.command, cl.output, cl.status, cl.executed_at,
+                       cl.output_hash IS NOT NULL AS output_truncated, h.comment, h.address
                 FROM command_logs cl
                 LEFT JOIN hosts h ON cl.host_id = h.id
-                ORDER BY cl.executed_at DESC
+                {'WHERE ' + condition if condition else ''}
+                ORDER BY cl.executed_at {direction}, cl.id {direction}
                 LIMIT ?
-            """, (limit,))
-            return [dict(row) for row in cursor.fetchall()]
+            """, params + [limit])
+            rows = [dict(row) for row in cursor.fetchall()]
+            return rows[::-1] if direction == 'ASC' else rows
+
+    def get_command_log(self, log_id: int) -> Optional[Dict[str, Any]]:
+        """One command log with its full output"""
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT cl.*, h.comment, h.address
+                FROM command_logs cl
+                LEFT JOIN hosts h ON cl.host_id = h.id
+                WHERE cl.id = ?
+            """, (log_id,)).fetchone()
+            return _resolve_blob_columns(conn, [dict(row)], BLOB_COLUMNS['command_logs'])[0] if row else None
+
+    def search_logs(self, match: str, host_id: Optional[int] = None, since: Optional[str] = None,
+                    until: Optional[str] = None, limit: int = 50) -> Dict[str, List[Dict[str, Any]]]:
+        """Newest-first full-text matches in command history and task output.
+
+        `match` is an FTS5 query; `since`/`until` bound executed_at (commands)
+        and the task's created_at (task lines). Matched terms are wrapped in
+        <mark> in the returned snippets.
+        """
+        command_filters, command_params = [], [match]
+        task_filters, task_params = [], [match]
+        if host_id is not None:
+            command_filters.append("cl.host_id = ?")
+            command_params.append(host_id)
+            task_filters.append("EXISTS (SELECT 1 FROM json_each(t.target_hosts) WHERE value = ?)")
+            task_params.append(host_id)
+        if since:
+            command_filters.append("cl.executed_at >= ?")
+            command_params.append(since)
+            task_filters.append("t.created_at >= ?")
+            task_params.append(since)
+        if until:
+            command_filters.append("cl.executed_at < ?")
+            command_params.append(until)
+            task_filters.append("t.created_at < ?")
+            task_params.append(until)
+
+        with self.get_connection() as conn:
+            commands = conn.execute(f"""
+                SELECT cl.id, cl.host_id, h.comment, h.address, cl.command, cl.status, cl.executed_at,
+                       snippet(command_log_fts, -1, '<mark>', '</mark>', '...', 16) AS snippet
+                FROM command_log_fts
+                JOIN command_logs cl ON cl.id = command_log_fts.rowid
+                LEFT JOIN hosts h ON h.id = cl.host_id
+                WHERE command_log_fts MATCH ? {''.join(' AND ' + f for f in command_filters)}
+                ORDER BY command_log_fts.rowid DESC
+                LIMIT ?
+            """, command_params + [limit]).fetchall()
+            task_lines = conn.execute(f"""
+                SELECT tl.id, tl.task_id, tl.seq, t.name AS task_name, t.status, t.created_at,
+                       snippet(task_log_fts, 0, '<mark>', '</mark>', '...', 16) AS snippet
+                FROM task_log_fts
+                JOIN task_log_lines tl ON tl.id = task_log_fts.rowid
+                JOIN tasks t ON t.id = tl.task_id
+                WHERE task_log_fts MATCH ? {''.join(' AND ' + f for f in task_filters)}
+                ORDER BY task_log_fts.rowid DESC
+                LIMIT ?
+            """, task_params + [limit]).fetchall()
+            return {
+                'commands': [dict(row) for row in commands],
+                'task_lines': [dict(row) for row in task_lines]
+            }
 
     def add_access_log(self, ip_address: str, path: str, status: str, status_code: int) -> None:
+        access_time = (datetime.now(timezone.utc) + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+        self.add_access_logs([(ip_address, path, status, status_code, access_time, None, None)])
+
+    def add_access_logs(self, rows: List[Tuple[str, str, str, int, str, Optional[float], Optional[str]]]) -> None:
+        """Bulk insert (ip_address, path, status, status_code, access_time, latency_ms, route) rows.
+
+        The per-minute rollups are updated in the same transaction. They are
+        keyed by `route` (the path template, e.g. /api/hosts/{host_id}) when
+        given, so ids in paths don't multiply the rollup rows.
+        """
+        rollups: Dict[Tuple[str, str, str], List[Any]] = {}
+        for ip_address, path, status, status_code, access_time, latency_ms, route in rows:
+            key = (access_time[:16], route or path, f"{status_code // 100}xx")
+            # count, latency_count, latency_sum, latency_max, buckets...
+            rollup = rollups.setdefault(key, [0, 0, 0.0, 0.0] + [0] * len(LATENCY_BUCKET_COLUMNS))
+            rollup[0] += 1
+            if latency_ms is not None:
+                rollup[1] += 1
+                rollup[2] += latency_ms
+                rollup[3] = max(rollup[3], latency_ms)
+                rollup[4 + bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+        columns = ['count', 'latency_count', 'latency_sum'] + LATENCY_BUCKET_COLUMNS
         with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO access_logs (ip_address, path, status, status_code)
-                VALUES (?, ?, ?, ?)
-            """, (ip_address, path, status, status_code))
+            conn.executemany("""
+                INSERT INTO access_logs (ip_address, path, status, status_code, access_time, latency_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [row[:6] for row in rows])
+            conn.executemany(f"""
+                INSERT INTO access_log_rollups
+                    (minute, path, status_class, count, latency_count, latency_sum, latency_max, {', '.join(LATENCY_BUCKET_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?, {', '.join('?' * len(LATENCY_BUCKET_COLUMNS))})
+                ON CONFLICT (minute, path, status_class) DO UPDATE SET
+                    {', '.join(f'{column} = {column} + excluded.{column}' for column in columns)},
+                    latency_max = MAX(latency_max, excluded.latency_max)
+            """, [key + tuple(rollup) for key, rollup in rollups.items()])
+
+    def get_access_log_rollups(self, since: Optional[str] = None, until: Optional[str] = None,
+                               path: Optional[str] = None, granularity: str = 'minute') -> List[Dict[str, Any]]:
+        """Request counts and latency percentiles per time bucket, path and status class.
+
+        Percentiles are estimated from the histogram as the upper bound of the
+        bucket they fall in (capped at the observed max).
+        """
+        width = {'minute': 16, 'hour': 13, 'day': 10}[granularity]
+        conditions, params = [], []
+        if since:
+            conditions.append("minute >= ?")
+            params.append(since[:16])
+        if until:
+            conditions.append("minute < ?")
+            params.append(until[:16])
+        if path:
+            conditions.append("path = ?")
+            params.append(path)
+
+        with self.get_connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT substr(minute, 1, {width}) AS bucket, path, status_class,
+                       SUM(count) AS count, SUM(latency_count) AS latency_count,
+                       SUM(latency_sum) AS latency_sum, MAX(latency_max) AS latency_max,
+                       {', '.join(f'SUM({column}) AS {column}' for column in LATENCY_BUCKET_COLUMNS)}
+                FROM access_log_rollups
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                GROUP BY bucket, path, status_class
+                ORDER BY bucket, path, status_class
+            """, params)
+            rows = []
+            for row in cursor.fetchall():
+                row = dict(row)
+                histogram = [row.pop(column) for column in LATENCY_BUCKET_COLUMNS]
+                latency_count = row.pop('latency_count')
+                latency_sum = row.pop('latency_sum')
+                latency_max = row.pop('latency_max')
+                row['latency_avg_ms'] = round(latency_sum / latency_count, 2) if latency_count else None
+                for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+                    row[f'latency_{name}_ms'] = _histogram_quantile(histogram, latency_count, q, latency_max)
+                row['latency_max_ms'] = latency_max if latency_count else None
+                rows.append(row)
+            return rows
 
-    def get_access_logs(self, limit: int = 100, ip: Optional[str] = None, path: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_access_logs(self, limit: int = 100, ip: Optional[str] = None, path: Optional[str] = None,
+                        before_id: Optional[KeysetAnchor] = None,
+                        after_id: Optional[KeysetAnchor] = None) -> List[Dict[str, Any]]:
         with self.get_connection() as conn:
             query = "SELECT * FROM access_logs"
-            params = []
-            conditions = []
+            condition, params, direction = _keyset_condition('access_logs', 'access_logs', 'access_time', before_id, after_id)
+            conditions = [condition] if condition else []
             
             if ip:
                 conditions.append("ip_address LIKE ?")
@@ -371,18 +1278,43 @@ class Database:
             if conditions:
                 query += " WHERE " + " AND ".join(conditions)
                 
-            query += " ORDER BY access_time DESC LIMIT ?"
+            query += f" ORDER BY access_time {direction}, id {direction} LIMIT ?"
             params.append(limit)
             
             cursor = conn.execute(query, tuple(params))
-            return [dict(row) for row in cursor.fetchall()]
+            rows = [dict(row) for row in cursor.fetchall()]
+            return rows[::-1] if direction == 'ASC' else rows
 
-    def cleanup_old_logs(self) -> None:
-        with self.get_connection() as conn:
-            conn.execute("""
-                DELETE FROM access_logs 
-                WHERE access_time < datetime('now', '+8 hours', '-7 days')
-            """)
+    def cleanup_old_logs(self, days: int = settings.ACCESS_LOG_RETENTION_DAYS,
+                         rollup_days: int = settings.ACCESS_LOG_ROLLUP_RETENTION_DAYS,
+                         chunk_size: int = settings.ACCESS_LOG_DELETE_CHUNK) -> Dict[str, int]:
+        """Delete expired access logs and rollups.
+
+        Rows are deleted oldest-first in chunks, one short transaction per
+        chunk, so the write lock is released between chunks and request
+        logging is never blocked for the whole cleanup.
+        """
+        deleted = {'access_logs': 0, 'access_log_rollups': 0}
+        for table, time_column, key, retention in (
+            ('access_logs', 'access_time', 'id', days),
+            ('access_log_rollups', 'minute', 'rowid', rollup_days),
+        ):
+            # Same clock as the access_time column default (UTC+8)
+            cutoff_expr = f"datetime('now', '+8 hours', '-{int(retention)} days')"
+            while True:
+                with self.get_connection() as conn:
+                    count = conn.execute(f"""
+                        DELETE FROM {table} WHERE {key} IN (
+                            SELECT {key} FROM {table}
+                            WHERE {time_column} < {cutoff_expr}
+                            ORDER BY {time_column}
+                            LIMIT ?
+                        )
+                    """, (chunk_size,)).rowcount
+                deleted[table] += count
+                if count < chunk_size:
+                    break
+        return deleted
 
     # --- Template Methods ---
     def add_template(self, template_data: Dict[str, Any]) -> int:
@@ -508,17 +1440,20 @@ class Database:
     # --- Task Methods ---
     def add_task(self, task_data: Dict[str, Any]) -> int:
         with self.get_connection() as conn:
+            (params, params_hash), (logs, logs_hash) = _blob_refs(conn, [task_data.get('params'), task_data.get('logs')])
             cursor = conn.execute("""
-                INSERT INTO tasks (type, name, status, target_hosts, params, result, logs)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO tasks (type, name, status, target_hosts, params, params_hash, result, logs, logs_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 task_data['type'],
                 task_data['name'],
                 task_data['status'],
                 task_data.get('target_hosts'),
-                task_data.get('params'),
+                params,
+                params_hash,
                 task_data.get('result'),
-                task_data.get('logs')
+                logs,
+                logs_hash
             ))
             return cursor.lastrowid
 
@@ -527,6 +1462,10 @@ class Database:
             fields = []
             values = []
             for key, value in task_data.items():
+                if key in BLOB_COLUMNS['tasks']:
+                    (value, value_hash), = _blob_refs(conn, [value])
+                    fields.append(f"{key}_hash = ?")
+                    values.append(value_hash)
                 fields.append(f"{key} = ?")
                 values.append(value)
             
@@ -544,15 +1483,71 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
             row = cursor.fetchone()
-            return dict(row) if row else None
+            return _resolve_blob_columns(conn, [dict(row)], BLOB_COLUMNS['tasks'])[0] if row else None
 
-    def get_tasks(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_tasks(self, limit: int = 100, before_id: Optional[KeysetAnchor] = None,
+                  after_id: Optional[KeysetAnchor] = None) -> List[Dict[str, Any]]:
+        """Newest-first page of tasks without the playbook (params) and output (logs); see get_task"""
+        condition, params, direction = _keyset_condition('tasks', 'tasks', 'created_at', before_id, after_id)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT {TASK_LIST_COLUMNS} FROM tasks 
+                {'WHERE ' + condition if condition else ''}
+                ORDER BY created_at {direction}, id {direction} 
+                LIMIT ?
+            """, params + [limit])
+            rows = [dict(row) for row in cursor.fetchall()]
+            return rows[::-1] if direction == 'ASC' else rows
+
+    def get_task_status(self, task_id: int) -> Optional[str]:
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            return row['status'] if row else None
+
+    def fail_interrupted_tasks(self) -> int:
+        """Mark tasks a previous process left queued or running as failed.
+
+        The scheduler queue lives in memory, so after a restart nothing would
+        ever pick them up. Returns the number of tasks marked.
+        """
         with self.get_connection() as conn:
             cursor = conn.execute("""
-                SELECT * FROM tasks 
-                ORDER BY created_at DESC 
+                UPDATE tasks
+                SET status = 'failed', result = ?, completed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ('queued', 'pending', 'running')
+            """, (json.dumps({'success': False, 'return_code': -1, 'error': 'Interrupted by server restart'}),))
+            return cursor.rowcount
+
+    def append_task_log_lines(self, task_id: int, first_seq: int, lines: List[str]) -> None:
+        """Append output lines numbered first_seq, first_seq + 1, ..."""
+        if not lines:
+            return
+        with self.get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO task_log_lines (task_id, seq, line) VALUES (?, ?, ?)",
+                [(task_id, first_seq + i, line) for i, line in enumerate(lines)]
+            )
+
+    def get_task_legacy_logs(self, task_id: int) -> Optional[str]:
+        """The tasks.logs JSON of a task from before task_log_lines, None once it has any line rows"""
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT logs, logs_hash FROM tasks
+                WHERE id = ? AND NOT EXISTS (SELECT 1 FROM task_log_lines WHERE task_id = tasks.id)
+            """, (task_id,)).fetchone()
+            if row is None or row['logs_hash'] is None:
+                return row['logs'] if row else None
+            return _load_blobs(conn, [row['logs_hash']]).get(row['logs_hash'])
+
+    def get_task_log_lines(self, task_id: int, after_seq: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Output lines with seq > after_seq, in order (range scan on the (task_id, seq) index)"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT seq, line FROM task_log_lines
+                WHERE task_id = ? AND seq > ?
+                ORDER BY seq
                 LIMIT ?
-            """, (limit,))
+            """, (task_id, after_seq, limit if limit is not None else -1))
             return [dict(row) for row in cursor.fetchall()]
 
     def get_tencent_config(self) -> Optional[Dict[str, Any]]:
@@ -591,14 +1586,18 @@ class Database:
             row = cursor.fetchone()
             return dict(row) if row else None
 
-    def get_workflows(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_workflows(self, limit: int = 100, before_id: Optional[KeysetAnchor] = None,
+                      after_id: Optional[KeysetAnchor] = None) -> List[Dict[str, Any]]:
+        condition, params, direction = _keyset_condition('workflows', 'workflows', 'created_at', before_id, after_id)
         with self.get_connection() as conn:
-            cursor = conn.execute("""
+            cursor = conn.execute(f"""
                 SELECT * FROM workflows 
-                ORDER BY created_at DESC 
+                {'WHERE ' + condition if condition else ''}
+                ORDER BY created_at {direction}, id {direction} 
                 LIMIT ?
-            """, (limit,))
-            return [dict(row) for row in cursor.fetchall()]
+            """, params + [limit])
+            rows = [dict(row) for row in cursor.fetchall()]
+            return rows[::-1] if direction == 'ASC' else rows
 
     def update_workflow(self, workflow_id: int, workflow_data: Dict[str, Any]) -> None:
         with self.get_connection() as conn:
@@ -618,29 +1617,60 @@ class Database:
                 WHERE id = ?
             """, values)
 
+    def fail_interrupted_workflows(self) -> int:
+        """Mark workflows a previous process left pending or running as failed,
+        with a log entry on the stage they stopped at. Returns the number marked."""
+        with self.get_connection() as conn:
+            interrupted = "status IN ('pending', 'running')"
+            conn.execute(f"""
+                INSERT INTO workflow_logs (workflow_id, stage, status, message)
+                SELECT id, COALESCE(current_stage, 'pending'), 'failed', 'Interrupted by server restart'
+                FROM workflows WHERE {interrupted}
+            """)
+            cursor = conn.execute(f"""
+                UPDATE workflows SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE {interrupted}
+            """)
+            return cursor.rowcount
+
     def add_workflow_log(self, log_data: Dict[str, Any]) -> int:
         with self.get_connection() as conn:
+            (detail, detail_hash), = _blob_refs(conn, [log_data.get('detail')])
             cursor = conn.execute("""
-                INSERT INTO workflow_logs (workflow_id, stage, status, message, detail)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO workflow_logs (workflow_id, stage, status, message, detail, detail_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
             """, (
                 log_data['workflow_id'],
                 log_data['stage'],
                 log_data['status'],
                 log_data.get('message'),
-                log_data.get('detail')
+                detail,
+                detail_hash
             ))
             return cursor.lastrowid
 
+    def add_workflow_logs(self, logs: List[Dict[str, Any]]) -> None:
+        """Bulk insert workflow logs; a 'timestamp' key overrides the column default"""
+        if not logs:
+            return
+        with self.get_connection() as conn:
+            refs = _blob_refs(conn, [log.get('detail') for log in logs])
+            conn.executemany("""
+                INSERT INTO workflow_logs (workflow_id, stage, status, message, detail, detail_hash, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """, [
+                (log['workflow_id'], log['stage'], log['status'], log.get('message'), detail, detail_hash, log.get('timestamp'))
+                for log, (detail, detail_hash) in zip(logs, refs)
+            ])
+
     def get_workflow_logs(self, workflow_id: int) -> List[Dict[str, Any]]:
         with self.get_connection() as conn:
             # Only select necessary fields for list view
             cursor = conn.execute("""
                 SELECT id, workflow_id, stage, status, message, timestamp, 
-                       CASE WHEN detail IS NOT NULL AND detail != '' THEN 1 ELSE 0 END as has_detail
+                       CASE WHEN detail_hash IS NOT NULL OR (detail IS NOT NULL AND detail != '') THEN 1 ELSE 0 END as has_detail
                 FROM workflow_logs 
                 WHERE workflow_id = ?
-                ORDER BY timestamp DESC
+                ORDER BY timestamp DESC, id DESC
             """, (workflow_id,))
             return [dict(row) for row in cursor.fetchall()]
 
@@ -648,7 +1678,7 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.execute("SELECT * FROM workflow_logs WHERE id = ?", (log_id,))
             row = cursor.fetchone()
-            return dict(row) if row else None
+            return _resolve_blob_columns(conn, [dict(row)], BLOB_COLUMNS['workflow_logs'])[0] if row else None
 
     # --- Cloud Credential Methods ---
     def add_cloud_credential(self, cred_data: Dict[str, Any]) -> int:
@@ -758,6 +1788,66 @@ class Database:
         with self.get_connection() as conn:
             conn.execute("DELETE FROM cloud_credentials WHERE id = ?", (cred_id,))
 
+_db_instance: Optional[Database] = None
+_db_lock = threading.Lock()
+
 # Dependency
 def get_db() -> Database:
-    return Database()
+    """Return the process-wide Database; the schema is initialized on first use only"""
+    global _db_instance
+    if _db_instance is None:
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = Database()
+    return _db_instance
+
+class AsyncDatabase:
+    """Awaitable view of a Database for `async def` routes.
+
+    Every Database method is exposed as a coroutine that runs the call on a
+    small dedicated thread pool, so SQLite work (including waiting out the
+    busy timeout behind a writer) never blocks the event loop. Each executor
+    thread keeps its own pooled connection.
+    """
+
+    def __init__(self, db: Database, max_workers: int = settings.DB_EXECUTOR_WORKERS):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run any blocking callable that touches the database on the DB executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+_async_db_instance: Optional[AsyncDatabase] = None
+
+def get_async_db() -> AsyncDatabase:
+    """Return the process-wide AsyncDatabase wrapping get_db()"""
+    global _async_db_instance
+    if _async_db_instance is None:
+        db = get_db()
+        with _db_lock:
+            if _async_db_instance is None:
+                _async_db_instance = AsyncDatabase(db)
+    return _async_db_instance
+
+def close_async_db() -> None:
+    global _async_db_instance
+    with _db_lock:
+        if _async_db_instance is not None:
+            _async_db_instance.shutdown()
+            _async_db_instance = None
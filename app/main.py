@@ -3,8 +3,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, FileResponse
 from app.core.config import settings
-from app.core.database import Database
+from app.core.database import get_db, close_pools, close_async_db
 from app.api.v1.routers import auth, hosts, ansible, sftp, logs, ws, files, templates, tencent, workflow, cloud_credentials
+from app.services.access_log import access_log_writer
+from app.services.ansible import ANSIBLE_TEMP_DIR
+from app.services.inventory import inventory_cache
 from app.utils.crypto import derive_key_from_credentials, set_crypto_keys
 import time
 import os
@@ -43,8 +46,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+def _route_template(request: Request):
+    """Matched path template, e.g. /api/hosts/{host_id}, for rolling up access logs.
+
+    Included routers are mounted, so the matched route only knows its path
+    below the router prefix; the prefix is recovered from the request path.
+    """
+    route = request.scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return None
+    try:
+        suffix = path_format.format(**request.scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return None
+    path = request.url.path
+    if not path.endswith(suffix):
+        return None
+    return path[:len(path) - len(suffix)] + path_format
+
 # Access Log Middleware
 @app.middleware("http")
 async def access_log_middleware(request: Request, call_next):
@@ -54,12 +77,9 @@ async def access_log_middleware(request: Request, call_next):
     
     # Log only API requests to DB
     if request.url.path.startswith("/api"):
-        # We need a DB instance. 
-        # Creating a new one per request here is one way, or using dependency injection.
-        # Middleware doesn't support dependency injection easily.
-        # We'll instantiate Database directly as it's lightweight (sqlite connection per call).
+        # Rows are buffered and written in batches by a background thread,
+        # so the request path never touches SQLite.
         try:
-            db = Database()
             # Get real IP
             client_ip = request.client.host
             if "x-forwarded-for" in request.headers:
@@ -68,7 +88,11 @@ async def access_log_middleware(request: Request, call_next):
                 client_ip = request.headers["x-real-ip"]
                 
             status = 'success' if response.status_code < 400 else 'failed'
-            db.add_access_log(client_ip, request.url.path, status, response.status_code)
+            access_log_writer.submit(
+                client_ip, request.url.path, status, response.status_code,
+                latency_ms=process_time * 1000,
+                route=_route_template(request)
+            )
         except Exception as e:
             logger.error(f"Failed to log access: {e}")
             
@@ -89,9 +113,28 @@ app.include_router(cloud_credentials.router, prefix="/api", tags=["cloud-credent
 
 @app.on_event("startup")
 async def startup_event():
+    # Create the schema once for the whole process
+    db = get_db()
+    # The job queues are in memory: work a previous process had queued or running is lost
+    interrupted = db.fail_interrupted_tasks(), db.fail_interrupted_workflows()
+    if any(interrupted):
+        logger.warning(f"Marked {interrupted[0]} task(s) and {interrupted[1]} workflow(s) "
+                       f"interrupted by the last shutdown as failed")
+    access_log_writer.start()
+    # Inventory files of a previous process that did not shut down cleanly hold plaintext credentials
+    if os.path.isdir(ANSIBLE_TEMP_DIR):
+        inventory_cache.remove_stale_files(ANSIBLE_TEMP_DIR)
     logger.info(f"Server started. Access the UI at http://localhost:3000")
     logger.info(f"API documentation available at http://localhost:3000{settings.API_V1_STR}/docs")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    access_log_writer.stop()
+    # Inventory files hold decrypted credentials
+    inventory_cache.clear()
+    close_async_db()
+    close_pools()
+
 # Add the /api/ws-token endpoint (it was defined in ws router but with /ws-token path)
 # We need to ensure it's mounted correctly. 
 # ws.router has @router.get("/ws-token/{host_id}")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, root_validator
 from typing import Optional, List, Any, Union, Dict
 
 # --- Auth Schemas ---
@@ -39,6 +39,16 @@ class HostBase(BaseModel):
     port: int = 22
     auth_method: str = "password"  # 'password' or 'key'
     group_name: Union[str, List[str]] = "all"
+    # Every group the host belongs to; nested groups are written "parent:child"
+    groups: Optional[List[str]] = None
+
+    @root_validator(pre=True)
+    def collect_groups(cls, values):
+        # A list of groups selects them all; group_name keeps a single primary group
+        if isinstance(values.get('group_name'), list) and values.get('groups') is None:
+            values = dict(values)
+            values['groups'] = values['group_name'] or None
+        return values
 
     @validator('group_name', pre=True)
     def parse_group_name(cls, v):
@@ -62,12 +72,15 @@ class HostResponse(HostBase):
     created_at: str
     is_password_encrypted: bool = False
     password: str = "********"  # Masked
+    groups: List[str] = []
     status: Optional[str] = None
 
 # --- Command Execution Schemas ---
 class ExecuteRequest(BaseModel):
     command: str
     hosts: Union[List[int], str]  # List of host IDs or "all"
+    shard: Optional[bool] = None  # None: shard above SHARD_SIZE hosts
+    forks: Optional[int] = Field(None, ge=1)  # None: adaptive
 
 # --- SFTP Schemas ---
 class SFTPMkdirRequest(BaseModel):
@@ -96,6 +109,7 @@ class AccessLog(BaseModel):
     status: str
     status_code: int
     access_time: str
+    latency_ms: Optional[float] = None
 
 class CommandLog(BaseModel):
     id: int
@@ -106,6 +120,8 @@ class CommandLog(BaseModel):
     executed_at: str
     comment: Optional[str] = None
     address: Optional[str] = None
+    # List pages leave long output out (output is None); GET /logs/{id} has it
+    output_truncated: bool = False
 
 # --- Template Schemas ---
 class TemplateBase(BaseModel):
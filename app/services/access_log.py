@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+class AccessLogWriter:
+    """Buffers access log rows in memory and writes them in batches.
+
+    The request path only enqueues a tuple; a background thread drains the
+    queue and inserts with executemany every `batch_size` rows or every
+    `flush_interval_ms`, whichever comes first. When the buffer is full new
+    rows are dropped and counted rather than blocking the event loop. The
+    same thread applies the retention policy every
+    ACCESS_LOG_RETENTION_INTERVAL_S.
+    """
+
+    def __init__(self, batch_size: int = settings.ACCESS_LOG_BATCH_SIZE,
+                 flush_interval_ms: int = settings.ACCESS_LOG_FLUSH_INTERVAL_MS,
+                 max_buffer: int = settings.ACCESS_LOG_BUFFER_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.retention_interval = settings.ACCESS_LOG_RETENTION_INTERVAL_S
+        self._queue: "queue.Queue[Tuple[Any, ...]]" = queue.Queue(maxsize=max_buffer)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="access-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop the writer and flush everything still buffered"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self._flush(self._drain())
+        if self.dropped:
+            logger.warning(f"Access log writer dropped {self.dropped} rows (buffer full)")
+
+    def submit(self, ip_address: str, path: str, status: str, status_code: int,
+               latency_ms: Optional[float] = None, route: Optional[str] = None) -> bool:
+        """Queue one access log row; returns False if it was dropped"""
+        # Same clock as the access_time column default (UTC+8)
+        access_time = (datetime.now(timezone.utc) + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            self._queue.put_nowait((ip_address, path, status, status_code, access_time, latency_ms, route))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+    def _drain(self, limit: Optional[int] = None) -> List[Tuple[Any, ...]]:
+        rows = []
+        while limit is None or len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self) -> None:
+        next_cleanup = time.monotonic() + self.retention_interval
+        while not self._stop.is_set():
+            if time.monotonic() >= next_cleanup:
+                self._cleanup()
+                next_cleanup = time.monotonic() + self.retention_interval
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            self._flush(batch)
+
+    def _cleanup(self) -> None:
+        try:
+            deleted = get_db().cleanup_old_logs()
+            if any(deleted.values()):
+                logger.info(f"Access log retention deleted {deleted}")
+        except Exception as e:
+            logger.error(f"Access log retention failed: {e}")
+
+    def _flush(self, rows: List[Tuple[Any, ...]]) -> None:
+        if not rows:
+            return
+        try:
+            get_db().add_access_logs(rows)
+            self.written += len(rows)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} access log rows: {e}")
+
+access_log_writer = AccessLogWriter()
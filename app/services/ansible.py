@@ -5,19 +5,31 @@ import subprocess
 import threading
 import re
 import shutil
+import signal
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from app.utils.crypto import CryptoUtils
 from app.core.database import Database
+from app.core.config import settings
+from app.services.inventory import build_inventory, inventory_cache
+from app.services.playbook_events import PlaybookEvents
+from app.services.run_events import RunChannel, run_registry
+from app.services.scheduler import scheduler
 import logging
 import sys
 from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Playbooks and their inventory files are written here
+ANSIBLE_TEMP_DIR = os.path.join(os.getcwd(), 'ansible_temp')
+
 # Try to import Ansible modules
 try:
     import ansible.constants as C
     from ansible.parsing.dataloader import DataLoader
-    from ansible.inventory.manager import InventoryManager
     from ansible.vars.manager import VariableManager
     from ansible.playbook.play import Play
     from ansible.executor.task_queue_manager import TaskQueueManager
@@ -38,182 +50,482 @@ except ImportError:
 
 if ANSIBLE_AVAILABLE:
     class ResultCallback(CallbackBase):
-        """Custom callback to handle task results"""
-        def __init__(self):
+        """Custom callback to handle task results.
+
+        `on_result(status, host, result)` is also called for each result as it
+        arrives, with status 'success', 'failed' or 'unreachable' and the
+        module's result dict.
+        """
+        def __init__(self, on_result=None):
             super().__init__()
             self.host_ok = {}
             self.host_unreachable = {}
             self.host_failed = {}
+            self.on_result = on_result
+
+        def _notify(self, status, result):
+            if self.on_result:
+                try:
+                    self.on_result(status, result._host.get_name(), result._result)
+                except Exception as e:
+                    logger.error(f"Result handler failed: {e}")
 
         def v2_runner_on_ok(self, result):
             self.host_ok[result._host.get_name()] = result
+            self._notify('success', result)
 
         def v2_runner_on_failed(self, result, ignore_errors=False):
             self.host_failed[result._host.get_name()] = result
+            self._notify('failed', result)
 
         def v2_runner_on_unreachable(self, result):
             self.host_unreachable[result._host.get_name()] = result
+            self._notify('unreachable', result)
 else:
     class ResultCallback:
         pass
 
+class TaskLogBuffer:
+    """Appends a task's output to task_log_lines in batches.
+
+    Lines are flushed every `flush_lines` lines, and a small background
+    thread flushes every `flush_interval_ms` so a quiet task still shows its
+    last line while it waits.
+    """
+
+    def __init__(self, db: Database, task_id: int,
+                 flush_lines: int = settings.TASK_LOG_FLUSH_LINES,
+                 flush_interval_ms: int = settings.TASK_LOG_FLUSH_INTERVAL_MS):
+        self.db = db
+        self.task_id = task_id
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval_ms / 1000
+        self.next_seq = 1
+        self._pending = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"task-{self.task_id}-logs", daemon=True)
+        self._thread.start()
+
+    def append(self, line: str) -> None:
+        with self._lock:
+            self._pending.append(line)
+            full = len(self._pending) >= self.flush_lines
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if not lines:
+                return
+            first_seq = self.next_seq
+            self.next_seq += len(lines)
+            # Written under the lock so batches land in seq order
+            try:
+                self.db.append_task_log_lines(self.task_id, first_seq, lines)
+            except Exception as e:
+                logger.error(f"Failed to write {len(lines)} log lines for task {self.task_id}: {e}")
+
+    def close(self) -> None:
+        """Stop the interval flusher and write whatever is left; safe to call twice"""
+        self._closed.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+# Fixed for the process. Forks are not here: they are chosen per run
+# (adaptive_forks) and passed to the TaskQueueManager or ansible-playbook -f.
+ANSIBLE_CLIARGS = dict(
+    connection='smart',
+    module_path=None,
+    become=None,
+    become_method=None,
+    become_user=None,
+    check=False,
+    diff=False,
+    verbosity=0
+)
+
+if ANSIBLE_AVAILABLE:
+    context.CLIARGS = ImmutableDict(ANSIBLE_CLIARGS)
+
+def _available_memory_mb() -> Optional[int]:
+    """MemAvailable from /proc/meminfo; None where it cannot be read"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def adaptive_forks(targets: Optional[int], requested: Optional[int] = None, workers: int = 1) -> int:
+    """Forks for one run of `targets` hosts (None = unknown).
+
+    A requested value is only clamped to 1..FORKS_MAX. Otherwise forks
+    follow the target count, bounded by FORKS_PER_CORE per CPU core, by
+    FORKS_MEMORY_MB per fork of the memory available right now (so runs
+    started while others are busy get less) and by FORKS_MAX. `workers`
+    shares the core and memory budget between the processes of a
+    sharded run.
+    """
+    if requested:
+        return max(1, min(int(requested), settings.FORKS_MAX))
+    limits = [settings.FORKS_MAX, (os.cpu_count() or 1) * settings.FORKS_PER_CORE // workers]
+    if targets is not None:
+        limits.append(targets)
+    memory_mb = _available_memory_mb()
+    if memory_mb is not None:
+        limits.append(memory_mb // settings.FORKS_MEMORY_MB // workers)
+    return max(1, min(limits))
+
+def _run_plays(groups, plays, on_result=None, forks=None):
+    """Run play dicts in this process against an inventory built from `groups`.
+
+    Returns {'success'|'failed'|'unreachable': {host: result dict}}, the last
+    result of each host.
+    """
+    loader = DataLoader()
+    inventory = build_inventory(groups, loader)
+    variable_manager = VariableManager(loader=loader, inventory=inventory)
+    results_callback = ResultCallback(on_result)
+
+    tqm = None
+    try:
+        tqm = TaskQueueManager(
+            inventory=inventory,
+            variable_manager=variable_manager,
+            loader=loader,
+            passwords=dict(),
+            stdout_callback=results_callback,
+            forks=forks
+        )
+        for play_source in plays:
+            play = Play().load(play_source, variable_manager=variable_manager, loader=loader)
+            tqm.run(play)
+    finally:
+        if tqm is not None:
+            tqm.cleanup()
+
+    return {
+        'success': {host: result._result for host, result in results_callback.host_ok.items()},
+        'failed': {host: result._result for host, result in results_callback.host_failed.items()},
+        'unreachable': {host: result._result for host, result in results_callback.host_unreachable.items()}
+    }
+
+def _run_plays_shard(groups, plays, forks):
+    """Worker process entry point for one shard"""
+    return _run_plays(groups, plays, forks=forks)
+
+def _shard_worker_count(shards: int) -> int:
+    return max(1, min(shards, settings.SHARD_WORKERS or os.cpu_count() or 1))
+
+def _shard_groups(groups, size):
+    """Split inventory groups into shards of at most `size` distinct hosts.
+
+    A host listed in several groups stays in one shard (with all its groups),
+    so it is never run twice.
+    """
+    shards = []
+    host_shard = {}
+    for group, group_hosts in groups.items():
+        for address, variables in group_hosts.items():
+            if address not in host_shard:
+                if not shards or shards[-1][1] >= size:
+                    shards.append([{}, 0])
+                host_shard[address] = len(shards) - 1
+                shards[-1][1] += 1
+            shards[host_shard[address]][0].setdefault(group, {})[address] = variables
+    return [shard for shard, _ in shards]
+
+def _shard_hosts(target_hosts, size):
+    """Split host rows into shards of at most `size` distinct addresses (duplicates stay together)"""
+    by_address = {}
+    for host in target_hosts:
+        by_address.setdefault(host['address'], []).append(host)
+    addresses = list(by_address)
+    return [
+        [host for address in addresses[i:i + size] for host in by_address[address]]
+        for i in range(0, len(addresses), size)
+    ]
+
+class PlaybookProcess:
+    """An ansible-playbook child that can be stopped as a whole process tree.
+
+    On POSIX the child leads its own session (start_new_session), so
+    stopping it signals the process group: ansible-playbook, its forked
+    workers and their ssh/sshpass children alike. stop() sends SIGTERM and
+    escalates to SIGKILL after `grace` seconds; wait() on a stopped run
+    returns only once the whole group is gone, not just its leader, so a
+    member ignoring SIGTERM still gets the SIGKILL. A `timeout` is a wall-clock
+    deadline enforced by a timer, so it fires even while the caller is
+    blocked reading output.
+
+    On Windows (WSL) there is no process group to signal; only the direct
+    child is killed.
+    """
+
+    def __init__(self, cmd, timeout=None, grace: float = settings.TASK_KILL_GRACE_S, **popen_kwargs):
+        self.grace = grace
+        self.stop_reason = None
+        self._lock = threading.Lock()
+        self._timers = []
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=False,
+            start_new_session=os.name == 'posix',
+            **popen_kwargs
+        )
+        if timeout:
+            self._start_timer(timeout, self.stop, 'timeout')
+
+    def _start_timer(self, delay, fn, *args):
+        timer = threading.Timer(delay, fn, args)
+        timer.daemon = True
+        timer.start()
+        self._timers.append(timer)
+
+    def _signal(self, sig) -> None:
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, sig)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def stop(self, reason: str) -> bool:
+        """Terminate the run ('timeout' or 'cancelled'); False if it already ended or is stopping"""
+        with self._lock:
+            if self.stop_reason or self.process.poll() is not None:
+                return False
+            self.stop_reason = reason
+            self._signal(signal.SIGTERM)
+            self._start_timer(self.grace, self._signal, signal.SIGKILL)
+            return True
+
+    def _group_alive(self) -> bool:
+        try:
+            os.killpg(self.process.pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def wait(self) -> int:
+        returncode = self.process.wait()
+        if self.stop_reason and os.name == 'posix':
+            # Keep the SIGKILL escalation armed until the last group member exits
+            deadline = time.monotonic() + self.grace + 5
+            while self._group_alive():
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Process group {self.process.pid} still alive after SIGKILL")
+                    break
+                time.sleep(0.1)
+        for timer in self._timers:
+            timer.cancel()
+        return returncode
+
+class TaskCancelled(Exception):
+    pass
+
+# Running playbook tasks by task id, and cancellations requested for tasks
+# whose process has not started yet
+_running_tasks = {}
+_cancel_requested = set()
+_running_lock = threading.Lock()
+
 class AnsibleService:
     def __init__(self, db: Database):
         self.db = db
         self.crypto = CryptoUtils()
         
-        if ANSIBLE_AVAILABLE:
-            # Initialize context.CLIARGS only once effectively, though it's global
-            # We set it here to ensure it's set when service is used
-            context.CLIARGS = ImmutableDict(
-                connection='smart',
-                module_path=None,
-                forks=50,
-                become=None,
-                become_method=None,
-                become_user=None,
-                check=False,
-                diff=False,
-                verbosity=0
-            )
-        else:
+        if not ANSIBLE_AVAILABLE:
             logger.warning("AnsibleService initialized but Ansible is not available.")
         
-        self.TEMP_DIR = os.path.join(os.getcwd(), 'ansible_temp')
+        self.TEMP_DIR = ANSIBLE_TEMP_DIR
         if not os.path.exists(self.TEMP_DIR):
             os.makedirs(self.TEMP_DIR)
 
-    def generate_inventory(self, hosts):
-        """Generate temporary inventory file"""
-        groups = {}
-        
-        # Group hosts
-        for host in hosts:
-            group = host.get('group_name', 'managed_hosts')
-            if group not in groups:
-                groups[group] = []
-            groups[group].append(host)
-            
-        inventory_content = []
-        
-        for group_name, group_hosts in groups.items():
-            inventory_content.append(f"[{group_name}]")
-            for host in group_hosts:
-                line = f"{host['address']} ansible_user={host['username']} ansible_port={host['port']} "
-                
-                if host['auth_method'] == 'key':
-                    # Use private key
-                    line += "ansible_ssh_private_key_file=/root/.ssh/id_ed25519 "
-                elif host['auth_method'] == 'password':
-                    # Use password
-                    password = host.get('password')
-                    # Note: The password here should be decrypted because get_hosts() decrypts it.
-                    if password:
-                        line += f"ansible_ssh_pass={password} "
-
-                line += "ansible_ssh_common_args='-o StrictHostKeyChecking=no -o ControlMaster=auto -o ControlPersist=60s'"
-                inventory_content.append(line)
-            inventory_content.append("")
-
-        # Create temp file
-        fd, inventory_path = tempfile.mkstemp(prefix='ansible_inventory_', dir=self.TEMP_DIR)
-        with os.fdopen(fd, 'w') as f:
-            f.write('\n'.join(inventory_content))
-            
-        return inventory_path
+    @staticmethod
+    def _command_result(status, result):
+        """The per-host fields of an ad-hoc command result"""
+        if status == 'success':
+            return {
+                'stdout': result.get('stdout', ''),
+                'stderr': result.get('stderr', ''),
+                'rc': result.get('rc', 0)
+            }
+        if status == 'failed':
+            return {
+                'msg': result.get('msg', ''),
+                'rc': result.get('rc', 1)
+            }
+        return {
+            'msg': result.get('msg', '')
+        }
+
+    @staticmethod
+    def _use_shards(host_count: int, shard: Optional[bool]) -> bool:
+        """shard=None shards automatically above SHARD_SIZE hosts when there is more than one core"""
+        if shard is not None:
+            return shard
+        return host_count > settings.SHARD_SIZE and _shard_worker_count(host_count) > 1
 
-    def execute_command(self, command, target_hosts=None):
-        """Execute Ansible command"""
+    def _run_plays(self, target_hosts, plays, on_result=None, shard: Optional[bool] = None, on_shard=None,
+                   forks: Optional[int] = None):
+        """Run play dicts against target_hosts, in this process or sharded across worker processes.
+
+        Sharded runs split the hosts into batches of SHARD_SIZE, run each
+        batch in its own process (one TaskQueueManager with its own forks)
+        and merge the results. on_result then fires per host as each shard
+        finishes rather than per task, and on_shard(progress) once per shard.
+        `forks` overrides adaptive_forks, per shard for sharded runs.
+        """
+        groups = inventory_cache.groups(target_hosts)
+        host_count = len({address for group_hosts in groups.values() for address in group_hosts})
+        if not self._use_shards(host_count, shard):
+            return _run_plays(groups, plays, on_result, forks=adaptive_forks(host_count, forks))
+
+        shards = _shard_groups(groups, settings.SHARD_SIZE)
+        workers = _shard_worker_count(len(shards))
+        shard_forks = adaptive_forks(min(host_count, settings.SHARD_SIZE), forks, workers=workers)
+        logger.info(f"Running {host_count} hosts in {len(shards)} shards on {workers} worker processes, "
+                    f"{shard_forks} forks each")
+
+        results = {'success': {}, 'failed': {}, 'unreachable': {}}
+        completed = 0
+        # spawn: forking a process that runs threads (uvicorn, the scheduler) is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_run_plays_shard, shard_groups, plays, shard_forks): index
+                       for index, shard_groups in enumerate(shards, 1)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    shard_results = future.result()
+                except Exception as e:
+                    logger.error(f"Shard {index}/{len(shards)} failed: {e}")
+                    shard_results = {'success': {}, 'failed': {}, 'unreachable': {}}
+                    for group_hosts in shards[index - 1].values():
+                        for address in group_hosts:
+                            shard_results['failed'][address] = {'msg': f"Shard {index} failed: {e}"}
+
+                completed += 1
+                for status, host_results in shard_results.items():
+                    results[status].update(host_results)
+                    if on_result:
+                        for host, result in host_results.items():
+                            on_result(status, host, result)
+
+                progress = {
+                    'shard': index,
+                    'shards': len(shards),
+                    'completed': completed,
+                    'hosts': len({address for group_hosts in shards[index - 1].values() for address in group_hosts}),
+                    'counts': {status: len(host_results) for status, host_results in shard_results.items()}
+                }
+                logger.info(f"Shard {index}/{len(shards)} done ({completed}/{len(shards)}): {progress['counts']}")
+                if on_shard:
+                    on_shard(progress)
+        return results
+
+    def execute_command(self, command, target_hosts=None, channel: Optional[RunChannel] = None,
+                        shard: Optional[bool] = None, forks: Optional[int] = None):
+        """Execute Ansible command
+
+        With a `channel`, each host's result is also published to it as soon
+        as the host finishes (as each shard finishes, for sharded runs, with a
+        'shard' progress event per shard).
+        """
         if not ANSIBLE_AVAILABLE:
             raise Exception("Ansible is not available on this system.")
 
         if target_hosts is None:
             target_hosts = self.db.get_hosts()
 
-        inventory_path = self.generate_inventory(target_hosts)
-        
-        try:
-            loader = DataLoader()
-            inventory = InventoryManager(loader=loader, sources=inventory_path)
-            variable_manager = VariableManager(loader=loader, inventory=inventory)
-            
-            play_source = dict(
-                name="Ansible Ad-Hoc",
-                hosts='all',
-                gather_facts='no',
-                tasks=[dict(action=dict(module='shell', args=command))]
-            )
+        play_source = dict(
+            name="Ansible Ad-Hoc",
+            hosts='all',
+            gather_facts='no',
+            tasks=[dict(action=dict(module='shell', args=command))]
+        )
 
-            play = Play().load(play_source, variable_manager=variable_manager, loader=loader)
-            results_callback = ResultCallback()
+        on_result = on_shard = None
+        if channel is not None:
+            def on_result(status, host, result):
+                channel.publish({
+                    'event': 'result',
+                    'host': host,
+                    'status': status,
+                    'result': self._command_result(status, result)
+                })
 
-            tqm = None
-            try:
-                tqm = TaskQueueManager(
-                    inventory=inventory,
-                    variable_manager=variable_manager,
-                    loader=loader,
-                    passwords=dict(),
-                    stdout_callback=results_callback
-                )
-                tqm.run(play)
-            finally:
-                if tqm is not None:
-                    tqm.cleanup()
+            def on_shard(progress):
+                channel.publish(dict(progress, event='shard'))
 
-            results = {
-                'success': {},
-                'failed': {},
-                'unreachable': {}
-            }
+        raw = self._run_plays(target_hosts, [play_source], on_result, shard=shard, on_shard=on_shard, forks=forks)
+        results = {
+            status: {host: self._command_result(status, result) for host, result in host_results.items()}
+            for status, host_results in raw.items()
+        }
 
-            for host, result in results_callback.host_ok.items():
-                results['success'][host] = {
-                    'stdout': result._result.get('stdout', ''),
-                    'stderr': result._result.get('stderr', ''),
-                    'rc': result._result.get('rc', 0)
-                }
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(
-                        host_id,
-                        command,
-                        json.dumps(results['success'][host]),
-                        'success'
-                    )
-
-            for host, result in results_callback.host_failed.items():
-                results['failed'][host] = {
-                    'msg': result._result.get('msg', ''),
-                    'rc': result._result.get('rc', 1)
-                }
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(
-                        host_id,
-                        command,
-                        json.dumps(results['failed'][host]),
-                        'failed'
-                    )
-
-            for host, result in results_callback.host_unreachable.items():
-                results['unreachable'][host] = {
-                    'msg': result._result.get('msg', '')
-                }
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(
-                        host_id,
-                        command,
-                        json.dumps(results['unreachable'][host]),
-                        'unreachable'
-                    )
+        self._log_results(command, results, target_hosts)
+        return results
 
-            return results
+    def execute_command_async(self, command, target_hosts, shard: Optional[bool] = None,
+                              forks: Optional[int] = None) -> str:
+        """Queue an ad-hoc command on the job scheduler; returns the run id to stream events from"""
+        channel = run_registry.create()
 
-        finally:
-            if os.path.exists(inventory_path):
-                os.remove(inventory_path)
+        def run():
+            try:
+                results = self.execute_command(command, target_hosts, channel=channel, shard=shard, forks=forks)
+                # Per-host results were already streamed and are persisted in
+                # command_logs; the final event carries the counts
+                channel.close({
+                    'event': 'done',
+                    'status': 'completed',
+                    'summary': {status: len(hosts) for status, hosts in results.items()}
+                })
+            except Exception as e:
+                logger.error(f"Run {channel.run_id} failed: {e}")
+                channel.close({'event': 'done', 'status': 'failed', 'error': str(e)})
+
+        # Shares the playbook slots, so a burst of runs queues instead of starting a thread each
+        scheduler.submit(run, kind='command', key=f"run:{channel.run_id}")
+        return channel.run_id
+
+    @staticmethod
+    def _host_id_map(target_hosts):
+        """Map address -> host id, first host wins when addresses repeat"""
+        host_ids = {}
+        for host in target_hosts:
+            host_ids.setdefault(host['address'], host['id'])
+        return host_ids
+
+    def _log_results(self, command, results, target_hosts):
+        """Persist the per-host results of one run in a single transaction"""
+        host_ids = self._host_id_map(target_hosts)
+        entries = []
+        for status in ('success', 'failed', 'unreachable'):
+            for address, host_result in results[status].items():
+                host_id = host_ids.get(address)
+                if host_id:
+                    entries.append((host_id, command, json.dumps(host_result), status))
+        self.db.log_commands(entries)
 
     def check_host_connectivity(self, target_hosts=None):
         """Check connectivity for hosts using ansible ping"""
@@ -246,7 +558,7 @@ class AnsibleService:
             
         return status_map
 
-    def execute_ping(self, target_hosts=None):
+    def execute_ping(self, target_hosts=None, shard: Optional[bool] = None):
         """Execute Ansible ping module"""
         if not ANSIBLE_AVAILABLE:
             raise Exception("Ansible is not available on this system.")
@@ -254,66 +566,17 @@ class AnsibleService:
         if target_hosts is None:
             target_hosts = self.db.get_hosts()
 
-        inventory_path = self.generate_inventory(target_hosts)
-        
-        try:
-            loader = DataLoader()
-            inventory = InventoryManager(loader=loader, sources=inventory_path)
-            variable_manager = VariableManager(loader=loader, inventory=inventory)
-            
-            play_source = dict(
-                name="Ansible Ping",
-                hosts='all',
-                gather_facts='no',
-                tasks=[dict(action=dict(module='ping'))]
-            )
-
-            play = Play().load(play_source, variable_manager=variable_manager, loader=loader)
-            results_callback = ResultCallback()
-
-            tqm = None
-            try:
-                tqm = TaskQueueManager(
-                    inventory=inventory,
-                    variable_manager=variable_manager,
-                    loader=loader,
-                    passwords=dict(),
-                    stdout_callback=results_callback
-                )
-                tqm.run(play)
-            finally:
-                if tqm is not None:
-                    tqm.cleanup()
-
-            results = {
-                'success': {},
-                'failed': {},
-                'unreachable': {}
-            }
-
-            for host, result in results_callback.host_ok.items():
-                results['success'][host] = result._result
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(host_id, 'ping', json.dumps(result._result), 'success')
-
-            for host, result in results_callback.host_failed.items():
-                results['failed'][host] = result._result
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(host_id, 'ping', json.dumps(result._result), 'failed')
-
-            for host, result in results_callback.host_unreachable.items():
-                results['unreachable'][host] = result._result
-                host_id = next((h['id'] for h in target_hosts if h['address'] == host), None)
-                if host_id:
-                    self.db.log_command(host_id, 'ping', json.dumps(result._result), 'unreachable')
+        play_source = dict(
+            name="Ansible Ping",
+            hosts='all',
+            gather_facts='no',
+            tasks=[dict(action=dict(module='ping'))]
+        )
 
-            return results
+        results = self._run_plays(target_hosts, [play_source], shard=shard)
 
-        finally:
-            if os.path.exists(inventory_path):
-                os.remove(inventory_path)
+        self._log_results('ping', results, target_hosts)
+        return results
 
     def get_host_facts(self, host_id):
         """Get host facts"""
@@ -326,48 +589,18 @@ class AnsibleService:
             return results['success'][host['address']]
         return None
 
-    def run_playbook(self, play, target_hosts=None):
+    def run_playbook(self, play, target_hosts=None, shard: Optional[bool] = None):
         """Run playbook"""
         if not ANSIBLE_AVAILABLE:
             raise Exception("Ansible is not available on this system.")
 
-        if target_hosts:
-            inventory_path = self.generate_inventory(target_hosts)
-        else:
-            inventory_path = self.generate_inventory(self.db.get_hosts())
+        if not target_hosts:
+            target_hosts = self.db.get_hosts()
 
         try:
-            loader = DataLoader()
-            inventory = InventoryManager(loader=loader, sources=inventory_path)
-            variable_manager = VariableManager(loader=loader, inventory=inventory)
-            
-            results_callback = ResultCallback()
-            tqm = None
-            try:
-                tqm = TaskQueueManager(
-                    inventory=inventory,
-                    variable_manager=variable_manager,
-                    loader=loader,
-                    passwords=dict(),
-                    stdout_callback=results_callback
-                )
-                for play_item in play:
-                    play_obj = Play().load(play_item, variable_manager=variable_manager, loader=loader)
-                    tqm.run(play_obj)
-            finally:
-                if tqm is not None:
-                    tqm.cleanup()
-
-            return {
-                'success': results_callback.host_ok,
-                'failed': results_callback.host_failed,
-                'unreachable': results_callback.host_unreachable
-            }
+            return self._run_plays(target_hosts, play, shard=shard)
         except Exception as e:
             raise Exception(f"Run playbook failed: {str(e)}")
-        finally:
-            if os.path.exists(inventory_path):
-                os.remove(inventory_path)
 
     def copy_file_to_hosts(self, src, dest, hosts):
         """Copy file to selected hosts"""
@@ -435,13 +668,18 @@ class AnsibleService:
         
         return self.run_playbook(play, target_hosts=all_hosts)
 
-    def execute_custom_playbook(self, playbook_content, target_hosts=None, timeout=None):
+    def execute_custom_playbook(self, playbook_content, target_hosts=None, timeout=None, shard=False, forks=None):
         """Execute custom playbook
         
         Args:
             playbook_content (str): Playbook content
             target_hosts (list): List of target hosts
             timeout (int, optional): Timeout in seconds
+            shard (bool): Split target_hosts into batches of SHARD_SIZE, one
+                ansible-playbook process each, and merge the results. Off by
+                default: run_once, serial and facts of other hosts only see
+                the hosts of their own batch.
+            forks (int, optional): Overrides adaptive_forks (per shard when sharding)
         """
         if not ANSIBLE_AVAILABLE:
              raise Exception("Ansible is not available on this system.")
@@ -452,16 +690,92 @@ class AnsibleService:
         fd, playbook_path = tempfile.mkstemp(prefix='ansible_playbook_', suffix='.yml', dir=self.TEMP_DIR)
         with os.fdopen(fd, 'w') as f:
             f.write(playbook_content)
-        
+
+        try:
+            if not (shard and target_hosts and len(target_hosts) > settings.SHARD_SIZE):
+                forks = adaptive_forks(len(target_hosts) if target_hosts else None, forks)
+                return self._execute_playbook_file(playbook_path, target_hosts, timeout, forks)
+
+            shards = _shard_hosts(target_hosts, settings.SHARD_SIZE)
+            workers = _shard_worker_count(len(shards))
+            forks = adaptive_forks(settings.SHARD_SIZE, forks, workers=workers)
+            logger.info(f"Running playbook on {len(target_hosts)} hosts in {len(shards)} shards, {workers} at a time")
+
+            shard_results = [None] * len(shards)
+            progress = []
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="playbook-shard") as pool:
+                futures = {pool.submit(self._execute_playbook_file, playbook_path, shard_hosts, timeout, forks): index
+                           for index, shard_hosts in enumerate(shards)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Shard {index + 1}/{len(shards)} failed: {e}")
+                        result = {
+                            'success': False,
+                            'return_code': -1,
+                            'logs': [f"Shard failed: {e}"],
+                            'summary': {'success': [], 'failed': sorted({host['address'] for host in shards[index]}),
+                                        'unreachable': []},
+                            'hosts': {},
+                            'tasks': {}
+                        }
+                    shard_results[index] = result
+                    progress.append({
+                        'shard': index + 1,
+                        'shards': len(shards),
+                        'completed': len(progress) + 1,
+                        'hosts': len(shards[index]),
+                        'return_code': result['return_code'],
+                        'counts': {status: len(hosts) for status, hosts in result['summary'].items()}
+                    })
+                    logger.info(f"Shard {index + 1}/{len(shards)} done ({len(progress)}/{len(shards)}), "
+                                f"rc={result['return_code']}")
+            return self._merge_playbook_results(shard_results, shards, progress)
+        finally:
+            if os.path.exists(playbook_path):
+                os.remove(playbook_path)
+
+    @staticmethod
+    def _merge_playbook_results(shard_results, shards, progress):
+        """One execute_custom_playbook result from per-shard results, logs in shard order"""
+        merged = {
+            'success': all(result['success'] for result in shard_results),
+            'return_code': next((result['return_code'] for result in shard_results if result['return_code']), 0),
+            'logs': [],
+            'summary': {'success': [], 'failed': [], 'unreachable': []},
+            'hosts': {},
+            'tasks': {},
+            'shards': progress
+        }
+        for index, result in enumerate(shard_results):
+            merged['logs'].append(f"=== Shard {index + 1}/{len(shards)}: {len(shards[index])} hosts, "
+                                  f"rc={result['return_code']} ===")
+            merged['logs'].extend(result['logs'])
+            for status, hosts in result['summary'].items():
+                merged['summary'][status].extend(hosts)
+            merged['hosts'].update(result['hosts'])
+            for task, counters in result['tasks'].items():
+                totals = merged['tasks'].setdefault(task, dict.fromkeys(counters, 0))
+                for key, value in counters.items():
+                    totals[key] = totals.get(key, 0) + value
+        return merged
+
+    def _execute_playbook_file(self, playbook_path, target_hosts=None, timeout=None, forks=None):
+        """Run one ansible-playbook process for a playbook already written to disk"""
         inventory_path = None
+        events = None
         try:
             inventory_option = []
             
             if target_hosts:
-                inventory_path = self.generate_inventory(target_hosts)
+                inventory_path = inventory_cache.acquire_file(target_hosts, self.TEMP_DIR)
                 inventory_option = ['-i', inventory_path]
             
             cmd = ['ansible-playbook', playbook_path] + inventory_option + ['-v']
+            if forks:
+                cmd += ['-f', str(forks)]
 
             if sys.platform == 'win32':
                  # Use relative paths for WSL
@@ -484,161 +798,236 @@ class AnsibleService:
                     with log_lock:
                         logs.append(decoded_line)
             
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=False
-            )
+            events = PlaybookEvents()
+            run = PlaybookProcess(cmd, timeout=timeout, **events.popen_kwargs())
+            process = run.process
+            events.start()
             
             output_thread = threading.Thread(target=process_output, args=(process,))
             output_thread.daemon = True
             output_thread.start()
             
-            try:
-                process.wait(timeout=timeout)
-            except subprocess.TimeoutExpired:
-                process.kill()
+            run.wait()
+            if run.stop_reason == 'timeout':
                 with log_lock:
                     logs.append("Execution timed out.")
             
             output_thread.join(timeout=1)
+            events.close()
             
             result = {
                 'success': process.returncode == 0,
                 'return_code': process.returncode,
                 'logs': logs,
-                'summary': self._parse_playbook_result(logs)
+                'summary': events.summary() or self._parse_playbook_result(logs),
+                'hosts': events.hosts,
+                'tasks': events.tasks
             }
             
             return result
         
         finally:
-            if os.path.exists(playbook_path):
-                os.remove(playbook_path)
-            if inventory_path and os.path.exists(inventory_path):
-                os.remove(inventory_path)
+            if events:
+                events.close()
+            if inventory_path:
+                inventory_cache.release_file(inventory_path)
     
-    def execute_playbook_async(self, task_id: int, playbook_content: str, target_hosts=None, timeout=None):
-        """Execute playbook asynchronously"""
+    def execute_playbook_async(self, task_id: int, playbook_content: str, target_hosts=None, timeout=None,
+                               priority: str = 'normal', forks: Optional[int] = None):
+        """Queue a playbook task on the job scheduler; it stays 'queued' until a slot frees up"""
         def run_task():
-            if not ANSIBLE_AVAILABLE:
-                self.db.update_task(task_id, {
-                    'status': 'failed',
-                    'logs': json.dumps(["Error: Ansible is not available on this system."]),
-                    'result': json.dumps({'success': False, 'return_code': -1})
-                })
-                return
+            try:
+                if not ANSIBLE_AVAILABLE:
+                    self.db.append_task_log_lines(task_id, 1, ["Error: Ansible is not available on this system."])
+                    self.db.update_task(task_id, {
+                        'status': 'failed',
+                        'result': json.dumps({'success': False, 'return_code': -1})
+                    })
+                    return
 
-            if not shutil.which('ansible-playbook') and not (sys.platform == 'win32' and shutil.which('wsl')):
-                self.db.update_task(task_id, {
-                    'status': 'failed',
-                    'logs': json.dumps(["Error: Executable 'ansible-playbook' not found. Please ensure Ansible is installed and in your PATH."]),
-                    'result': json.dumps({'success': False, 'return_code': -1})
-                })
-                return
+                if not shutil.which('ansible-playbook') and not (sys.platform == 'win32' and shutil.which('wsl')):
+                    self.db.append_task_log_lines(task_id, 1, ["Error: Executable 'ansible-playbook' not found. Please ensure Ansible is installed and in your PATH."])
+                    self.db.update_task(task_id, {
+                        'status': 'failed',
+                        'result': json.dumps({'success': False, 'return_code': -1})
+                    })
+                    return
 
-            self.db.update_task(task_id, {'status': 'running'})
+                with _running_lock:
+                    cancelled = task_id in _cancel_requested
+                    _cancel_requested.discard(task_id)
+                if cancelled:
+                    # Cancelled between leaving the queue and starting
+                    self.db.update_task(task_id, {
+                        'status': 'cancelled',
+                        'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
+                    return
+                self.db.update_task(task_id, {'status': 'running'})
             
-            fd, playbook_path = tempfile.mkstemp(prefix='ansible_playbook_', suffix='.yml', dir=self.TEMP_DIR)
-            with os.fdopen(fd, 'w') as f:
-                f.write(playbook_content)
+                fd, playbook_path = tempfile.mkstemp(prefix='ansible_playbook_', suffix='.yml', dir=self.TEMP_DIR)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(playbook_content)
             
-            inventory_path = None
-            logs = []
-            try:
-                inventory_option = []
+                inventory_path = None
+                log_buffer = TaskLogBuffer(self.db, task_id)
+                log_buffer.start()
+                events = PlaybookEvents()
+                try:
+                    inventory_option = []
                 
-                if target_hosts:
-                    inventory_path = self.generate_inventory(target_hosts)
-                    inventory_option = ['-i', inventory_path]
+                    if target_hosts:
+                        inventory_path = inventory_cache.acquire_file(target_hosts, self.TEMP_DIR)
+                        inventory_option = ['-i', inventory_path]
                 
-                cmd = ['ansible-playbook', playbook_path] + inventory_option + ['-v']
+                    cmd = ['ansible-playbook', playbook_path] + inventory_option + ['-v']
+                    # Chosen when the task starts, from the memory available then
+                    cmd += ['-f', str(adaptive_forks(len(target_hosts) if target_hosts else None, forks))]
                 
-                if sys.platform == 'win32':
-                     # Use relative paths for WSL
-                    playbook_rel = os.path.relpath(playbook_path).replace('\\', '/')
-                    cmd[1] = playbook_rel
+                    if sys.platform == 'win32':
+                         # Use relative paths for WSL
+                        playbook_rel = os.path.relpath(playbook_path).replace('\\', '/')
+                        cmd[1] = playbook_rel
                     
-                    if inventory_option:
-                        inventory_rel = os.path.relpath(inventory_path).replace('\\', '/')
-                        cmd[3] = inventory_rel
+                        if inventory_option:
+                            inventory_rel = os.path.relpath(inventory_path).replace('\\', '/')
+                            cmd[3] = inventory_rel
                     
-                    # Prepend wsl if we are on Windows and likely using WSL ansible
-                    cmd.insert(0, 'wsl')
+                        # Prepend wsl if we are on Windows and likely using WSL ansible
+                        cmd.insert(0, 'wsl')
                 
-                # Update logs periodically or use a callback?
-                # For simplicity, we'll collect all logs and update at the end, 
-                # or update periodically if needed. 
-                # Updating DB for every line is too heavy.
+                    with _running_lock:
+                        if task_id in _cancel_requested:
+                            raise TaskCancelled()
+                        run = _running_tasks[task_id] = PlaybookProcess(cmd, timeout=timeout, **events.popen_kwargs())
+                    process = run.process
+                    events.start()
                 
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=False
-                )
-                
-                for line in iter(process.stdout.readline, b''):
-                    decoded_line = line.decode('utf-8').rstrip()
-                    logs.append(decoded_line)
-                    # Optional: Update logs in DB every N lines or seconds to show progress
-                    # For now, let's just append to memory.
+                    # Lines go to task_log_lines in batches; only the recap is kept
+                    # in memory, as the summary fallback when no event arrives
+                    # (channel disabled, callback failed to load, early crash).
+                    recap = []
+                    for line in iter(process.stdout.readline, b''):
+                        decoded_line = line.decode('utf-8', errors='replace').rstrip()
+                        log_buffer.append(decoded_line)
+                        if recap or decoded_line.startswith('PLAY RECAP'):
+                            recap.append(decoded_line)
                 
-                try:
-                    process.wait(timeout=timeout)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    logs.append("Execution timed out.")
+                    # The output loop ends as soon as a timeout or cancel kills the process group
+                    run.wait()
+                    if run.stop_reason == 'timeout':
+                        log_buffer.append("Execution timed out.")
+                    elif run.stop_reason == 'cancelled':
+                        log_buffer.append("Execution cancelled.")
+                    events.close()
                 
-                result = {
-                    'success': process.returncode == 0,
-                    'return_code': process.returncode,
-                    'summary': self._parse_playbook_result(logs)
-                }
+                    result = {
+                        'success': process.returncode == 0,
+                        'return_code': process.returncode,
+                        'summary': events.summary() or self._parse_playbook_result(recap),
+                        'hosts': events.hosts,
+                        'tasks': events.tasks
+                    }
                 
-                self.db.update_task(task_id, {
-                    'status': 'completed' if process.returncode == 0 else 'failed',
-                    'result': json.dumps(result),
-                    'logs': json.dumps(logs),
-                    'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
+                    if run.stop_reason == 'cancelled':
+                        status = 'cancelled'
+                    else:
+                        status = 'completed' if process.returncode == 0 else 'failed'
+                    log_buffer.close()
+                    self.db.update_task(task_id, {
+                        'status': status,
+                        'result': json.dumps(result),
+                        'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
                 
-                # Also log command history for each host if needed
-                # (Reusing logic from execute_custom_playbook)
-                if target_hosts:
-                    for host in target_hosts:
-                        host_status = 'success'
-                        if host['address'] in result['summary']['failed']:
-                            host_status = 'failed'
-                        elif host['address'] in result['summary']['unreachable']:
-                            host_status = 'unreachable'
-                        
-                        self.db.log_command(
-                            host['id'],
-                            'Batch Playbook Execution',
-                            json.dumps({'task_id': task_id}),
-                            host_status
-                        )
+                    # Also log command history for each host if needed
+                    # (Reusing logic from execute_custom_playbook)
+                    if target_hosts:
+                        failed = set(result['summary']['failed'])
+                        unreachable = set(result['summary']['unreachable'])
+                        # Without any per-host outcome (no events, no recap) only the return code is known
+                        unknown_status = 'success' if any(result['summary'].values()) or process.returncode == 0 else 'failed'
+                        entries = []
+                        for host in target_hosts:
+                            host_status = unknown_status
+                            if host['address'] in failed:
+                                host_status = 'failed'
+                            elif host['address'] in unreachable:
+                                host_status = 'unreachable'
+                            entries.append((
+                                host['id'],
+                                'Batch Playbook Execution',
+                                json.dumps({'task_id': task_id}),
+                                host_status
+                            ))
+                        self.db.log_commands(entries)
 
-            except Exception as e:
-                logger.error(f"Task {task_id} failed: {e}")
-                self.db.update_task(task_id, {
-                    'status': 'failed',
-                    'logs': json.dumps(logs + [f"Error: {str(e)}"]),
-                    'result': json.dumps({'success': False, 'return_code': -1})
-                })
+                except TaskCancelled:
+                    log_buffer.append("Execution cancelled.")
+                    log_buffer.close()
+                    self.db.update_task(task_id, {
+                        'status': 'cancelled',
+                        'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
+                except Exception as e:
+                    logger.error(f"Task {task_id} failed: {e}")
+                    log_buffer.append(f"Error: {str(e)}")
+                    log_buffer.close()
+                    self.db.update_task(task_id, {
+                        'status': 'failed',
+                        'result': json.dumps({'success': False, 'return_code': -1})
+                    })
+                finally:
+                    log_buffer.close()
+                    events.close()
+                    if os.path.exists(playbook_path):
+                        os.remove(playbook_path)
+                    if inventory_path:
+                        inventory_cache.release_file(inventory_path)
             finally:
-                if os.path.exists(playbook_path):
-                    os.remove(playbook_path)
-                if inventory_path and os.path.exists(inventory_path):
-                    os.remove(inventory_path)
+                # Every exit path, including the early failures, clears the registries
+                with _running_lock:
+                    _running_tasks.pop(task_id, None)
+                    _cancel_requested.discard(task_id)
+
+        scheduler.submit(run_task, kind='playbook', priority=priority, key=f"task:{task_id}")
 
-        thread = threading.Thread(target=run_task)
-        thread.start()
+    def cancel_task(self, task_id: int) -> Optional[str]:
+        """Cancel a queued or running playbook task.
+
+        A queued task leaves the scheduler queue and never starts. A running
+        task has its whole process group terminated; its worker then records
+        the 'cancelled' status and frees the scheduler slot. Returns the
+        resulting status, or None if the task had already finished.
+        """
+        status = self.db.get_task_status(task_id)
+        if status not in ('queued', 'pending', 'running'):
+            return None
+
+        if scheduler.cancel(f"task:{task_id}"):
+            self.db.update_task(task_id, {
+                'status': 'cancelled',
+                'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            return 'cancelled'
+
+        with _running_lock:
+            run = _running_tasks.get(task_id)
+            if run is None:
+                # Picked up by a worker but not started yet; it checks this set
+                _cancel_requested.add(task_id)
+        if run is None:
+            if self.db.get_task_status(task_id) not in ('queued', 'pending', 'running'):
+                # Finished in the meantime
+                with _running_lock:
+                    _cancel_requested.discard(task_id)
+                return None
+        elif not run.stop('cancelled'):
+            return None
+        return 'cancelling'
 
     def _parse_playbook_result(self, logs):
-        """Parse playbook execution logs"""
+        """Parse the PLAY RECAP of playbook logs; used when the json_events channel is unavailable"""
         summary = {
             'success': [],
             'failed': [],
@@ -1,5 +1,7 @@
 import jwt
 import time
+import hmac
+import hashlib
 import datetime
 from typing import Optional, Dict, Any
 from app.core.config import settings
@@ -25,6 +27,26 @@ class AuthService:
         except jwt.InvalidTokenError:
             return None
 
+    def create_run_token(self, run_id: str) -> str:
+        """Short-lived token for streaming one run, passed as ?token= by
+        clients that cannot set headers (EventSource)"""
+        timestamp = int(time.time())
+        return f"{timestamp}:{self._run_signature(run_id, timestamp)}"
+
+    def verify_run_token(self, token: str, run_id: str) -> bool:
+        try:
+            timestamp, signature = token.split(':')
+            timestamp = int(timestamp)
+        except ValueError:
+            return False
+        if time.time() - timestamp > settings.RUN_TOKEN_TTL_S:
+            return False
+        return hmac.compare_digest(signature, self._run_signature(run_id, timestamp))
+
+    def _run_signature(self, run_id: str, timestamp: int) -> str:
+        message = f"run:{run_id}:{timestamp}"
+        return hmac.new(settings.SECRET_KEY.encode(), message.encode(), hashlib.sha256).hexdigest()
+
     def authenticate_user(self, username, password) -> bool:
         if not settings.ADMIN_USERNAME or not settings.ADMIN_PASSWORD:
             logger.error("Admin credentials not set")
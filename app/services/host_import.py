@@ -0,0 +1,108 @@
+import base64
+import binascii
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Tuple
+from pydantic import ValidationError
+from app.core.config import settings
+from app.core.database import AsyncDatabase
+from app.models.schemas import HostCreate
+
+logger = logging.getLogger(__name__)
+
+# Error details kept for the final report; the counters cover the rest
+MAX_REPORTED_ERRORS = 100
+
+def _iter_records(upload: BinaryIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (line_number, record) pairs; a record is a dict or the exception that made it unreadable.
+
+    The file is read incrementally. CSV goes straight to csv.DictReader, so a
+    quoted field may span lines; its records report the line they end on.
+    """
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return
+        reader.fieldnames = header = [field.strip() for field in reader.fieldnames]
+        for row in reader:
+            # DictReader files surplus values under None and fills missing ones with None
+            values = [row[key] for key in header if row[key] is not None] + row.get(None, [])
+            if not any(value.strip() for value in values):
+                continue
+            if len(values) != len(header):
+                yield reader.line_num, ValueError(f"expected {len(header)} fields, got {len(values)}")
+                continue
+            yield reader.line_num, {key: row[key] for key in header if row[key] != ''}
+    else:
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+                continue
+            yield line_no, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+def _parse_host(record: Dict[str, Any], password_encoding: str) -> Dict[str, Any]:
+    host = HostCreate(**record)
+    if host.auth_method == 'password' and not host.password:
+        raise ValueError("password is required for password authentication")
+    if host.password and password_encoding == 'base64':
+        try:
+            host.password = base64.b64decode(host.password, validate=True).decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError("password is not valid base64")
+    return host.dict()
+
+async def import_hosts_stream(upload: BinaryIO, fmt: str, db: AsyncDatabase,
+                              password_encoding: str = 'plain',
+                              chunk_size: int = settings.HOST_IMPORT_CHUNK_SIZE) -> AsyncIterator[str]:
+    """Import hosts from a CSV or JSONL file, yielding NDJSON progress lines.
+
+    Records are validated as they arrive and inserted `chunk_size` at a time,
+    one executemany transaction per chunk. Hosts whose (address, port) already
+    exists are skipped by the unique index, not by a lookup, so memory stays
+    bounded by one chunk whatever the size of the upload.
+    """
+    stats = {'processed': 0, 'inserted': 0, 'skipped': 0, 'invalid': 0}
+    errors: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+
+    def record_error(line_no: int, error: Exception) -> None:
+        stats['invalid'] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_no, 'error': str(error)})
+
+    async def flush() -> str:
+        inserted = await db.add_hosts_batch(batch)
+        stats['inserted'] += inserted
+        stats['skipped'] += len(batch) - inserted
+        batch.clear()
+        return json.dumps(stats) + "\n"
+
+    try:
+        for line_no, record in _iter_records(upload, fmt):
+            stats['processed'] += 1
+            if isinstance(record, Exception):
+                record_error(line_no, record)
+                continue
+            try:
+                batch.append(_parse_host(record, password_encoding))
+            except (ValidationError, ValueError, TypeError) as e:
+                record_error(line_no, e)
+                continue
+            if len(batch) >= chunk_size:
+                yield await flush()
+        if batch:
+            yield await flush()
+    except Exception as e:
+        # Chunks already committed stay imported; report where we stopped
+        logger.error(f"Host import aborted after {stats['processed']} records: {e}")
+        yield json.dumps({**stats, 'done': False, 'error': str(e), 'errors': errors}) + "\n"
+        return
+
+    yield json.dumps({**stats, 'done': True, 'errors': errors}) + "\n"
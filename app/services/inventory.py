@@ -0,0 +1,242 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.core.database import Database, HostRecord
+from app.utils.crypto import CryptoUtils
+
+logger = logging.getLogger(__name__)
+
+try:
+    from ansible.inventory.manager import InventoryManager
+except ImportError:
+    InventoryManager = None
+
+DEFAULT_GROUP = 'managed_hosts'
+SSH_PRIVATE_KEY_FILE = '/root/.ssh/id_ed25519'
+SSH_COMMON_ARGS = '-o StrictHostKeyChecking=no -o ControlMaster=auto -o ControlPersist=60s'
+INVENTORY_FILE_PREFIX = 'ansible_inventory_'
+
+# group -> address -> host vars
+InventoryGroups = Dict[str, Dict[str, Dict[str, Any]]]
+
+def host_vars(host: Dict[str, Any]) -> Dict[str, Any]:
+    """Connection variables for one host row.
+
+    ansible_ssh_pass holds the password as stored (ciphertext for a
+    HostRecord); decrypt_groups turns it into plaintext.
+    """
+    variables = {
+        'ansible_user': host['username'],
+        'ansible_port': int(host['port']),
+    }
+    if host['auth_method'] == 'key':
+        variables['ansible_ssh_private_key_file'] = SSH_PRIVATE_KEY_FILE
+    elif host['auth_method'] == 'password':
+        if isinstance(host, HostRecord):
+            password = dict.get(host, 'encrypted_password')
+        else:
+            password = host.get('password')
+        if password:
+            variables['ansible_ssh_pass'] = password
+    variables['ansible_ssh_common_args'] = SSH_COMMON_ARGS
+    return variables
+
+def decrypt_groups(groups: InventoryGroups) -> InventoryGroups:
+    """Copy of groups with every ansible_ssh_pass decrypted, in one decrypt_many batch"""
+    decrypted = {group: {address: dict(variables) for address, variables in group_hosts.items()}
+                 for group, group_hosts in groups.items()}
+    with_password = [variables for group_hosts in decrypted.values() for variables in group_hosts.values()
+                     if 'ansible_ssh_pass' in variables]
+    passwords = CryptoUtils().decrypt_many([variables['ansible_ssh_pass'] for variables in with_password])
+    for variables, password in zip(with_password, passwords):
+        variables['ansible_ssh_pass'] = password
+    return decrypted
+
+def inventory_groups(hosts: Iterable[Dict[str, Any]]) -> InventoryGroups:
+    """Group host rows by group_name; a repeated address keeps the last row's vars, as the INI file did.
+
+    Passwords stay encrypted; see decrypt_groups.
+    """
+    groups: InventoryGroups = {}
+    for host in hosts:
+        # ':' separates nested group paths but is not a valid Ansible group name character
+        group = (host.get('group_name') or DEFAULT_GROUP).replace(':', '_')
+        groups.setdefault(group, {})[host['address']] = host_vars(host)
+    return groups
+
+def build_inventory(groups: InventoryGroups, loader) -> 'InventoryManager':
+    """Populate an InventoryManager directly, with no inventory source to parse"""
+    inventory = InventoryManager(loader=loader, sources=[], parse=False)
+    for group, group_hosts in groups.items():
+        inventory.add_group(group)
+        for address, variables in group_hosts.items():
+            inventory.add_host(address, group=group)
+            host = inventory.get_host(address)
+            for name, value in variables.items():
+                host.set_variable(name, value)
+    inventory.reconcile_inventory()
+    return inventory
+
+def write_json_inventory(groups: InventoryGroups, directory: str) -> str:
+    """Write groups as a YAML-plugin JSON inventory for ansible-playbook runs.
+
+    The file holds decrypted credentials; mkstemp creates it 0600 and
+    InventoryCache removes it as soon as no run holds it.
+    """
+    data = {'all': {'children': {
+        group: {'hosts': group_hosts} for group, group_hosts in groups.items()
+    }}}
+    fd, path = tempfile.mkstemp(prefix=INVENTORY_FILE_PREFIX, suffix='.json', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    return path
+
+def host_set_fingerprint(hosts: Iterable[Dict[str, Any]]) -> str:
+    """Digest of the target hosts' (id, revision) pairs; reads no credentials"""
+    pairs = sorted((host['id'], host.get('revision') or 0) for host in hosts)
+    return hashlib.blake2b(repr(pairs).encode(), digest_size=16).hexdigest()
+
+class _CacheEntry:
+    __slots__ = ('groups', 'path', 'leases')
+
+    def __init__(self, groups: InventoryGroups):
+        self.groups = groups
+        self.path: Optional[str] = None
+        self.leases = 0
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class InventoryCache:
+    """Inventories of recently used host sets, keyed by host_set_fingerprint.
+
+    Holds the grouped host vars with passwords still encrypted; each run
+    gets a copy decrypted in one batch, so no plaintext credential stays in
+    memory between runs. A host write anywhere in the process (Database.hosts_generation) drops
+    every entry; otherwise the least recently used set is evicted beyond
+    `max_entries`. Groups are built outside the lock, so a cold build does
+    not hold up lookups of other host sets.
+
+    ansible-playbook runs lease a JSON inventory file written from an
+    entry. Runs of the same host set share the file, and it is removed as
+    soon as the last lease is released: plaintext credentials are only on
+    disk while a run needs them.
+    """
+
+    def __init__(self, max_entries: int = settings.INVENTORY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, _CacheEntry]' = OrderedDict()
+        # path -> entry for every file currently on disk
+        self._leased: Dict[str, _CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._generation = Database.hosts_generation
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_generation(self) -> None:
+        """Drop every entry after a host write; call with the lock held"""
+        if self._generation != Database.hosts_generation:
+            self._generation = Database.hosts_generation
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+
+    def _entry(self, hosts: List[Dict[str, Any]]) -> _CacheEntry:
+        key = host_set_fingerprint(hosts)
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            self.misses += 1
+            generation = self._generation
+
+        # Grouping a large host set takes a while; other lookups go on meanwhile
+        entry = _CacheEntry(inventory_groups(hosts))
+
+        with self._lock:
+            self._check_generation()
+            if self._generation != generation:
+                # Hosts changed during the build: use it for this run, don't cache it
+                return entry
+            # Another thread may have built the same set meanwhile
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def groups(self, hosts: List[Dict[str, Any]]) -> InventoryGroups:
+        """Grouped host vars, passwords decrypted, for an in-process run"""
+        return decrypt_groups(self._entry(hosts).groups)
+
+    def acquire_file(self, hosts: List[Dict[str, Any]], directory: str) -> str:
+        """Path of the JSON inventory for `hosts`; it stays on disk until release_file(path)"""
+        entry = self._entry(hosts)
+        with self._lock:
+            if entry.path is None:
+                entry.path = write_json_inventory(decrypt_groups(entry.groups), directory)
+                self._leased[entry.path] = entry
+            entry.leases += 1
+            return entry.path
+
+    def release_file(self, path: str) -> None:
+        with self._lock:
+            entry = self._leased.get(path)
+            if entry is None:
+                # Already removed by clear() at shutdown
+                return
+            entry.leases -= 1
+            if not entry.leases:
+                del self._leased[path]
+                entry.path = None
+                _remove_file(path)
+
+    def remove_stale_files(self, directory: str) -> int:
+        """Delete inventory files left in `directory` by an earlier process (crash, kill -9)"""
+        removed = 0
+        with self._lock:
+            for path in glob.glob(os.path.join(directory, f"{INVENTORY_FILE_PREFIX}*.json")):
+                if path not in self._leased:
+                    _remove_file(path)
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} stale inventory files from {directory}")
+        return removed
+
+    def clear(self) -> None:
+        """Drop every entry and delete every inventory file, leased or not (shutdown)"""
+        with self._lock:
+            self._entries.clear()
+            for path, entry in self._leased.items():
+                entry.path = None
+                _remove_file(path)
+            self._leased.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'files': len(self._leased),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations
+            }
+
+inventory_cache = InventoryCache()
@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ansible.constants as C
+except ImportError:
+    C = None
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ansible_plugins', 'callback')
+CALLBACK_NAME = 'json_events'
+EVENT_FD_ENV = 'ANSIBLE_UI_EVENT_FD'
+
+# Runner statuses -> the ansible stats counter they feed
+_STAT_KEYS = {'ok': 'ok', 'failed': 'failures', 'unreachable': 'unreachable', 'skipped': 'skipped'}
+
+def _new_stats() -> Dict[str, int]:
+    return dict(ok=0, failures=0, unreachable=0, changed=0, skipped=0, rescued=0, ignored=0)
+
+class PlaybookEvents:
+    """Side channel of one ansible-playbook run, fed by the json_events callback.
+
+    The callback writes one JSON line per task result to a pipe whose write
+    end is passed to the child (pass_fds + EVENT_FD_ENV); a reader thread
+    folds them into per-host and per-task counters as they arrive, and the
+    final stats event replaces the host counters with Ansible's own. stdout
+    stays the human-readable log.
+
+    Not available on Windows, where ansible-playbook runs under WSL and
+    cannot inherit the descriptor; summary() then returns None and callers
+    parse the PLAY RECAP instead.
+    """
+
+    def __init__(self, on_event: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.enabled = sys.platform != 'win32' and C is not None
+        self.on_event = on_event
+        self.hosts: Dict[str, Dict[str, int]] = {}
+        self.tasks: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._read_fd: Optional[int] = None
+        self._write_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def popen_kwargs(self) -> Dict[str, Any]:
+        """Extra subprocess.Popen arguments that enable the callback and pass it the pipe"""
+        if not self.enabled:
+            return {}
+        self._read_fd, self._write_fd = os.pipe()
+        env = os.environ.copy()
+        # Added to the configured plugin paths and callbacks, not replacing them
+        env['ANSIBLE_CALLBACK_PLUGINS'] = os.pathsep.join(list(C.DEFAULT_CALLBACK_PLUGIN_PATH or []) + [PLUGIN_DIR])
+        env['ANSIBLE_CALLBACKS_ENABLED'] = ','.join(list(C.CALLBACKS_ENABLED or []) + [CALLBACK_NAME])
+        env[EVENT_FD_ENV] = str(self._write_fd)
+        return {'env': env, 'pass_fds': (self._write_fd,)}
+
+    def start(self) -> None:
+        """Begin reading; call right after Popen so only the child holds the write end"""
+        if self._write_fd is None:
+            return
+        os.close(self._write_fd)
+        self._write_fd = None
+        # The reader thread owns the read end from here on
+        read_fd, self._read_fd = self._read_fd, None
+        self._thread = threading.Thread(target=self._read, args=(read_fd,), name="playbook-events", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5) -> None:
+        """Wait for the channel to drain (EOF once the run and its workers exit)"""
+        # Both ends are still ours when Popen failed before start()
+        for fd in (self._read_fd, self._write_fd):
+            if fd is not None:
+                os.close(fd)
+        self._read_fd = self._write_fd = None
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Playbook event channel still open after the run ended")
+            self._thread = None
+
+    def _read(self, read_fd: int) -> None:
+        with os.fdopen(read_fd, 'rb') as channel:
+            for line in channel:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self._handle(event)
+
+    def _handle(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if event.get('event') == 'result':
+                status = event['status']
+                key = _STAT_KEYS[status]
+                if status == 'failed' and event.get('ignore_errors'):
+                    key = 'ignored'
+                for counters in (self.hosts.setdefault(event['host'], _new_stats()),
+                                 self.tasks.setdefault(event['task'], _new_stats())):
+                    counters[key] += 1
+                    if event.get('changed'):
+                        counters['changed'] += 1
+            elif event.get('event') == 'stats':
+                self.hosts = event['hosts']
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logger.error(f"Playbook event handler failed: {e}")
+
+    def summary(self) -> Optional[Dict[str, List[str]]]:
+        """success/failed/unreachable host lists, None when no event arrived.
+
+        Same rules as the PLAY RECAP parsing: a host is failed or unreachable
+        when that counter is non-zero (possibly both), otherwise successful.
+        """
+        with self._lock:
+            if not self.hosts:
+                return None
+            summary = {'success': [], 'failed': [], 'unreachable': []}
+            for host, counters in self.hosts.items():
+                if counters['failures']:
+                    summary['failed'].append(host)
+                if counters['unreachable']:
+                    summary['unreachable'].append(host)
+                if not counters['failures'] and not counters['unreachable']:
+                    summary['success'].append(host)
+            return summary
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+import uuid
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class RunChannel:
+    """Append-only event log of one background run.
+
+    Written from the run's worker thread, read by any number of async
+    subscribers; each subscriber keeps its own position, so a client that
+    connects late (or reconnects with Last-Event-ID) replays what it missed.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.closed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if self.done:
+                return
+            self.events.append(event)
+            self._wake()
+
+    def close(self, final_event: Dict[str, Any]) -> None:
+        """Publish the last event (the run's aggregate) and end every stream"""
+        with self._lock:
+            if self.done:
+                return
+            self.events.append(final_event)
+            self.done = True
+            self.closed_at = time.monotonic()
+            self._wake()
+
+    def _wake(self) -> None:
+        for loop, waiter in self._waiters:
+            loop.call_soon_threadsafe(waiter.set)
+        self._waiters.clear()
+
+    async def stream(self, after: int = 0, heartbeat: float = 15) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """Yield (seq, event) from seq `after`+1 on; (seq, None) is a keepalive"""
+        index = after
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = asyncio.Event()
+            with self._lock:
+                batch = self.events[index:]
+                done = self.done
+                if not batch and not done:
+                    self._waiters.add((loop, waiter))
+            for event in batch:
+                index += 1
+                yield index, event
+            if done:
+                return
+            if not batch:
+                timed_out = False
+                try:
+                    await asyncio.wait_for(waiter.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                finally:
+                    # Also reached when the client disconnects and the stream is cancelled
+                    with self._lock:
+                        self._waiters.discard((loop, waiter))
+                if timed_out:
+                    yield index, None
+
+class RunRegistry:
+    """Channels of recent runs by id; finished runs are kept for RUN_EVENTS_TTL_S"""
+
+    def __init__(self, ttl: float = settings.RUN_EVENTS_TTL_S):
+        self.ttl = ttl
+        self._runs: Dict[str, RunChannel] = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> RunChannel:
+        channel = RunChannel(uuid.uuid4().hex)
+        with self._lock:
+            self._expire()
+            self._runs[channel.run_id] = channel
+        return channel
+
+    def get(self, run_id: str) -> Optional[RunChannel]:
+        with self._lock:
+            self._expire()
+            return self._runs.get(run_id)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        expired = [run_id for run_id, channel in self._runs.items()
+                   if channel.closed_at is not None and channel.closed_at < cutoff]
+        for run_id in expired:
+            del self._runs[run_id]
+
+run_registry = RunRegistry()
@@ -0,0 +1,152 @@
+import itertools
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('high', 'normal', 'low')
+
+class Job:
+    __slots__ = ('id', 'key', 'kind', 'priority', 'fn', 'args', 'enqueued_at', 'started_at')
+
+    def __init__(self, job_id: int, key: Optional[str], kind: str, priority: str,
+                 fn: Callable[..., Any], args: tuple):
+        self.id = job_id
+        self.key = key
+        self.kind = kind
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+class JobScheduler:
+    """Runs background jobs on a bounded set of workers.
+
+    At most `max_concurrent` jobs run at once; the rest wait in one FIFO
+    queue per priority and a free worker always takes the oldest job of the
+    highest non-empty priority. A burst of submissions therefore queues up
+    instead of starting one ansible-playbook process per request.
+
+    `scheduler` runs playbooks and background ad-hoc commands; workflows,
+    which mostly sleep while polling cloud resources, get their own
+    `workflow_scheduler` so they never hold a playbook slot.
+    """
+
+    def __init__(self, max_concurrent: int = settings.SCHEDULER_MAX_CONCURRENT, name: str = 'scheduler'):
+        self.max_concurrent = max_concurrent
+        self.name = name
+        self._queues: Dict[str, Deque[Job]] = {priority: deque() for priority in PRIORITIES}
+        self._running: Dict[int, Job] = {}
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._workers: List[threading.Thread] = []
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        # Queue wait of recently started jobs, in seconds
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    def submit(self, fn: Callable[..., Any], *args, kind: str, priority: str = 'normal',
+               key: Optional[str] = None) -> int:
+        """Queue fn(*args); returns the job id. `key` names the job for callers (e.g. 'task:12')"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        with self._cond:
+            job = Job(next(self._ids), key, kind, priority, fn, args)
+            self._queues[priority].append(job)
+            self._submitted += 1
+            self._ensure_workers()
+            self._cond.notify()
+        return job.id
+
+    def call(self, fn: Callable[..., Any], *args, kind: str, priority: str = 'normal',
+             key: Optional[str] = None) -> Any:
+        """Run fn(*args) as a job of this scheduler and wait for it; returns its result or raises its error"""
+        future: Future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        self.submit(run, kind=kind, priority=priority, key=key)
+        return future.result()
+
+    def cancel(self, key: str) -> bool:
+        """Drop a queued job by key; False if no job with that key is waiting"""
+        with self._cond:
+            for queue in self._queues.values():
+                for job in queue:
+                    if job.key == key:
+                        queue.remove(job)
+                        self._cancelled += 1
+                        return True
+        return False
+
+    def _ensure_workers(self) -> None:
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(target=self._work, name=f"{self.name}-{len(self._workers) + 1}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_job(self) -> Job:
+        with self._cond:
+            while True:
+                for priority in PRIORITIES:
+                    if self._queues[priority]:
+                        job = self._queues[priority].popleft()
+                        job.started_at = time.monotonic()
+                        self._waits.append(job.started_at - job.enqueued_at)
+                        self._running[job.id] = job
+                        return job
+                self._cond.wait()
+
+    def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            failed = False
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                failed = True
+                logger.error(f"Job {job.id} ({job.key or job.kind}) failed: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    del self._running[job.id]
+                    self._completed += 1
+                    self._failed += failed
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            queued = [job for priority in PRIORITIES for job in self._queues[priority]]
+            waits = sorted(self._waits)
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': len(self._running),
+                'queued': {priority: len(self._queues[priority]) for priority in PRIORITIES},
+                'queue_depth': len(queued),
+                'oldest_queued_s': round(now - min(job.enqueued_at for job in queued), 3) if queued else None,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'cancelled': self._cancelled,
+                'wait_s': {
+                    'samples': len(waits),
+                    'avg': round(sum(waits) / len(waits), 3) if waits else None,
+                    'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else None,
+                    'max': round(waits[-1], 3) if waits else None
+                }
+            }
+
+scheduler = JobScheduler()
+workflow_scheduler = JobScheduler(settings.WORKFLOW_MAX_CONCURRENT, name='workflow')
@@ -23,8 +23,8 @@ class TencentCloudService:
     def _load_credentials(self):
         # Try DB
         try:
-            from app.core.database import Database
-            db = Database()
+            from app.core.database import get_db
+            db = get_db()
             creds = db.get_cloud_credentials(provider='tencent')
             # Find default
             default_cred = next((c for c in creds if c.get('is_default')), None)
@@ -1,13 +1,13 @@
 import json
 import logging
 import time
-import threading
 import paramiko
 from typing import Dict, Any, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from app.core.database import Database
 from app.services.tencent_cloud import TencentCloudService
 from app.services.ansible import AnsibleService
+from app.services.scheduler import scheduler, workflow_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -46,79 +46,54 @@ class WorkflowService:
         return self.db.create_workflow(workflow_data)
 
     def start_workflow(self, workflow_id: int):
-        """Start workflow execution in background"""
-        thread = threading.Thread(target=self._process_workflow, args=(workflow_id,))
-        thread.daemon = True
-        thread.start()
+        """Queue workflow execution on the workflow scheduler; it stays 'pending' until it starts"""
+        workflow_scheduler.submit(self._process_workflow, workflow_id, kind='workflow', key=f"workflow:{workflow_id}")
 
     def _process_workflow(self, workflow_id: int):
         """Main workflow execution loop"""
-        try:
-            workflow = self.db.get_workflow(workflow_id)
-            if not workflow:
-                logger.error(f"Workflow {workflow_id} not found")
-                return
-
-            self._update_status(workflow_id, "running", "validation")
-            
-            # Stage 1: Validation
-            if not self._stage_validation(workflow_id):
-                return
-
-            # Stage 2: Create Resources
-            self._update_status(workflow_id, "running", "resource_creation")
-            if not self._stage_resource_creation(workflow_id):
-                return
-
-            # Stage 3: Wait for Ready
-            self._update_status(workflow_id, "running", "wait_for_ready")
-            if not self._stage_wait_for_ready(workflow_id):
-                return
+        workflow = self.db.get_workflow(workflow_id)
+        if not workflow:
+            logger.error(f"Workflow {workflow_id} not found")
+            return
 
-            # Stage 4: Post-Create Configuration (Ansible)
-            self._update_status(workflow_id, "running", "ansible_deployment")
-            if not self._stage_ansible_deployment(workflow_id):
-                return
+        uow = WorkflowUnitOfWork(self.db, workflow)
+        try:
+            stages = [
+                ("validation", self._stage_validation),                 # Stage 1
+                ("resource_creation", self._stage_resource_creation),   # Stage 2
+                ("wait_for_ready", self._stage_wait_for_ready),         # Stage 3
+                ("ansible_deployment", self._stage_ansible_deployment), # Stage 4: Post-Create Configuration
+            ]
+            for stage, run_stage in stages:
+                uow.set_status("running", stage)
+                if not run_stage(uow):
+                    return
 
             # Stage 5: Completion
-            self._update_status(workflow_id, "completed", "completed")
-            self._log_stage(workflow_id, "completed", "success", "Workflow completed successfully")
+            uow.set_status("completed", "completed")
+            uow.log("completed", "success", "Workflow completed successfully")
 
         except Exception as e:
             logger.error(f"Workflow {workflow_id} failed: {e}", exc_info=True)
-            self._update_status(workflow_id, "failed", workflow['current_stage'])
-            self._log_stage(workflow_id, workflow['current_stage'], "failed", str(e))
-
-    def _update_status(self, workflow_id: int, status: str, stage: str):
-        self.db.update_workflow(workflow_id, {
-            "status": status,
-            "current_stage": stage
-        })
-
-    def _log_stage(self, workflow_id: int, stage: str, status: str, message: str, detail: Optional[str] = None):
-        self.db.add_workflow_log({
-            "workflow_id": workflow_id,
-            "stage": stage,
-            "status": status,
-            "message": message,
-            "detail": detail
-        })
-
-    def _get_context(self, workflow_id: int) -> Dict[str, Any]:
-        workflow = self.db.get_workflow(workflow_id)
-        return json.loads(workflow['context'])
+            uow.set_status("failed", uow.stage)
+            uow.log(uow.stage, "failed", str(e))
+        finally:
+            uow.commit()
 
-    def _save_context(self, workflow_id: int, context: Dict[str, Any]):
-        self.db.update_workflow(workflow_id, {
-            "context": json.dumps(context)
-        })
+    def _fail_stage(self, uow: 'WorkflowUnitOfWork', stage: str, error: Exception) -> bool:
+        uow.log(stage, "failed", str(error))
+        uow.set_status("failed", stage)
+        return False
 
     # --- Stages ---
+    # Each stage queues its logs and context changes on the unit of work and
+    # commits only before a slow external call, so the UI sees the stage start
+    # and the previous stage's result in a single transaction.
 
-    def _stage_validation(self, workflow_id: int) -> bool:
-        self._log_stage(workflow_id, "validation", "running", "Validating parameters...")
+    def _stage_validation(self, uow: 'WorkflowUnitOfWork') -> bool:
+        uow.log("validation", "running", "Validating parameters...")
         try:
-            context = self._get_context(workflow_id)
+            context = uow.context
             
             # Check mandatory fields
             required_fields = ["Region", "Zone", "ImageId", "InstanceType", "Password"]
@@ -128,17 +103,16 @@ class WorkflowService:
 
             # Check quota (optional, skipping for now as it requires complex SDK calls)
             
-            self._log_stage(workflow_id, "validation", "success", "Validation passed")
+            uow.log("validation", "success", "Validation passed")
             return True
         except Exception as e:
-            self._log_stage(workflow_id, "validation", "failed", str(e))
-            self._update_status(workflow_id, "failed", "validation")
-            return False
+            return self._fail_stage(uow, "validation", e)
 
-    def _stage_resource_creation(self, workflow_id: int) -> bool:
-        self._log_stage(workflow_id, "resource_creation", "running", "Creating instance...")
+    def _stage_resource_creation(self, uow: 'WorkflowUnitOfWork') -> bool:
+        uow.log("resource_creation", "running", "Creating instance...")
+        uow.commit()
         try:
-            context = self._get_context(workflow_id)
+            context = uow.context
             
             # Call Tencent Cloud API
             # Filter out context fields that are not for create_instance
@@ -159,20 +133,20 @@ class WorkflowService:
                 raise Exception("No instance ID returned from API")
             
             instance_id = instance_id_set[0]
-            context["InstanceId"] = instance_id
-            self._save_context(workflow_id, context)
+            uow.update_context({"InstanceId": instance_id})
             
-            self._log_stage(workflow_id, "resource_creation", "success", f"Instance created: {instance_id}")
+            uow.log("resource_creation", "success", f"Instance created: {instance_id}")
+            # A billable resource now exists; persist its id right away
+            uow.commit()
             return True
         except Exception as e:
-            self._log_stage(workflow_id, "resource_creation", "failed", str(e))
-            self._update_status(workflow_id, "failed", "resource_creation")
-            return False
+            return self._fail_stage(uow, "resource_creation", e)
 
-    def _stage_wait_for_ready(self, workflow_id: int) -> bool:
-        self._log_stage(workflow_id, "wait_for_ready", "running", "Waiting for instance to be RUNNING...")
+    def _stage_wait_for_ready(self, uow: 'WorkflowUnitOfWork') -> bool:
+        uow.log("wait_for_ready", "running", "Waiting for instance to be RUNNING...")
+        uow.commit()
         try:
-            context = self._get_context(workflow_id)
+            context = uow.context
             instance_id = context.get("InstanceId")
             region = context.get("Region")
             
@@ -188,11 +162,12 @@ class WorkflowService:
                     public_ips = details.PublicIpAddresses
                     private_ips = details.PrivateIpAddresses
                     
-                    context["PublicIp"] = public_ips[0] if public_ips else None
-                    context["PrivateIp"] = private_ips[0] if private_ips else None
-                    self._save_context(workflow_id, context)
+                    uow.update_context({
+                        "PublicIp": public_ips[0] if public_ips else None,
+                        "PrivateIp": private_ips[0] if private_ips else None
+                    })
                     
-                    self._log_stage(workflow_id, "wait_for_ready", "success", f"Instance is RUNNING. IP: {context.get('PublicIp') or context.get('PrivateIp')}")
+                    uow.log("wait_for_ready", "success", f"Instance is RUNNING. IP: {context.get('PublicIp') or context.get('PrivateIp')}")
                     return True
                 
                 if state in ["TERMINATED", "CREATION_FAILED"]:
@@ -203,37 +178,37 @@ class WorkflowService:
             raise Exception("Timeout waiting for instance to be ready")
             
         except Exception as e:
-            self._log_stage(workflow_id, "wait_for_ready", "failed", str(e))
-            self._update_status(workflow_id, "failed", "wait_for_ready")
-            return False
+            return self._fail_stage(uow, "wait_for_ready", e)
 
-    def _rollback_deployment(self, workflow_id: int, context: Dict[str, Any], host_id: Optional[int]):
+    def _rollback_deployment(self, uow: 'WorkflowUnitOfWork', host_id: Optional[int]):
         """Rollback resources on failure"""
         # Rollback: Release instance
+        context = uow.context
         instance_id = context.get("InstanceId")
         region = context.get("Region")
         if instance_id and region:
             try:
-                self._log_stage(workflow_id, "ansible_deployment", "warning", f"Rolling back: Terminating instance {instance_id}...")
+                uow.log("ansible_deployment", "warning", f"Rolling back: Terminating instance {instance_id}...")
+                uow.commit()
                 self.tencent_service.terminate_instances([instance_id], region)
-                self._log_stage(workflow_id, "ansible_deployment", "warning", f"Instance {instance_id} terminated.")
+                uow.log("ansible_deployment", "warning", f"Instance {instance_id} terminated.")
             except Exception as e:
-                self._log_stage(workflow_id, "ansible_deployment", "failed", f"Rollback failed: {str(e)}")
+                uow.log("ansible_deployment", "failed", f"Rollback failed: {str(e)}")
 
         # Rollback: Delete host
         if host_id:
             try:
                 self.db.delete_host(host_id)
-                self._log_stage(workflow_id, "ansible_deployment", "warning", f"Host {host_id} removed from inventory.")
+                uow.log("ansible_deployment", "warning", f"Host {host_id} removed from inventory.")
             except Exception as e:
                 logger.error(f"Failed to delete host {host_id}: {e}")
 
-    def _stage_ansible_deployment(self, workflow_id: int) -> bool:
-        self._log_stage(workflow_id, "ansible_deployment", "running", "Registering to Ansible Inventory...")
+    def _stage_ansible_deployment(self, uow: 'WorkflowUnitOfWork') -> bool:
+        workflow_id = uow.workflow_id
+        uow.log("ansible_deployment", "running", "Registering to Ansible Inventory...")
         host_id = None
-        context = {}
         try:
-            context = self._get_context(workflow_id)
+            context = uow.context
             
             ip_address = context.get("PublicIp") or context.get("PrivateIp")
             if not ip_address:
@@ -243,7 +218,8 @@ class WorkflowService:
             username = "root" # Default for Linux
             
             # Attempt to detect username via SSH with retry
-            self._log_stage(workflow_id, "ansible_deployment", "running", f"Checking SSH on {ip_address}...")
+            uow.log("ansible_deployment", "running", f"Checking SSH on {ip_address}...")
+            uow.commit()
             
             detected_username = None
             candidate_usernames = ['root', 'ubuntu', 'lighthouse']
@@ -256,7 +232,7 @@ class WorkflowService:
                 for user in candidate_usernames:
                     if self._check_ssh(ip_address, 22, user, password):
                         detected_username = user
-                        self._log_stage(workflow_id, "ansible_deployment", "running", f"SSH connection confirmed ({detected_username})")
+                        uow.log("ansible_deployment", "running", f"SSH connection confirmed ({detected_username})")
                         break
                 
                 if detected_username:
@@ -264,12 +240,13 @@ class WorkflowService:
                     break
                 
                 if i % 5 == 0: # Log every 25 seconds
-                    self._log_stage(workflow_id, "ansible_deployment", "running", f"Waiting for SSH service... ({i * ssh_retry_interval}s)")
+                    uow.log("ansible_deployment", "running", f"Waiting for SSH service... ({i * ssh_retry_interval}s)")
+                    uow.commit()
                 
                 time.sleep(ssh_retry_interval)
             
             if not detected_username:
-                 self._log_stage(workflow_id, "ansible_deployment", "warning", "SSH connection timeout, defaulting to 'root'")
+                 uow.log("ansible_deployment", "warning", "SSH connection timeout, defaulting to 'root'")
                  # Proceed with 'root' as fallback, similar to tencent sync task
 
             # Add to local DB hosts table
@@ -284,21 +261,21 @@ class WorkflowService:
             }
             
             # Check if host exists (by IP)
-            existing_hosts = self.db.get_hosts()
-            existing_host = next((h for h in existing_hosts if h['address'] == ip_address), None)
+            existing_host = self.db.get_host_by_address(ip_address)
             
             if existing_host:
                 self.db.update_host(existing_host['id'], host_data)
                 host_id = existing_host['id']
-                self._log_stage(workflow_id, "ansible_deployment", "success", f"Updated existing host {host_id} in inventory")
+                uow.log("ansible_deployment", "success", f"Updated existing host {host_id} in inventory")
             else:
                 host_id = self.db.add_host(host_data)
-                self._log_stage(workflow_id, "ansible_deployment", "success", f"Host added to inventory with ID {host_id}")
+                uow.log("ansible_deployment", "success", f"Host added to inventory with ID {host_id}")
             
             # Optional: Run a setup playbook if specified in template
             playbook_content = context.get("PlaybookContent")
             if playbook_content:
-                self._log_stage(workflow_id, "ansible_deployment", "running", "Executing post-creation playbook...")
+                uow.log("ansible_deployment", "running", "Executing post-creation playbook...")
+                uow.commit()
                 
                 # We need to run this synchronously here or spawn another task.
                 # Since we are already in a background thread, synchronous is fine.
@@ -321,26 +298,76 @@ class WorkflowService:
                         if ping_res.get(host_id) == 'success':
                             break
                 
-                result = self.ansible_service.execute_custom_playbook(playbook_content, target_hosts=target_hosts, timeout=300)
+                # Takes a playbook slot like any playbook task
+                result = scheduler.call(self.ansible_service.execute_custom_playbook, playbook_content, target_hosts,
+                                        300, kind='playbook', key=f"workflow:{workflow_id}:playbook")
                 
                 ansible_logs = result.get('logs', [])
                 log_output = "\n".join(ansible_logs) if ansible_logs else "No output"
                 
                 if result['success']:
-                    self._log_stage(workflow_id, "ansible_deployment", "success", "Playbook executed successfully", detail=log_output)
+                    uow.log("ansible_deployment", "success", "Playbook executed successfully", detail=log_output)
                 else:
-                    self._log_stage(workflow_id, "ansible_deployment", "failed", "Playbook execution failed", detail=log_output)
-                    self._update_status(workflow_id, "failed", "ansible_deployment")
-                    self._rollback_deployment(workflow_id, context, host_id)
+                    uow.log("ansible_deployment", "failed", "Playbook execution failed", detail=log_output)
+                    uow.set_status("failed", "ansible_deployment")
+                    self._rollback_deployment(uow, host_id)
                     return False
 
             return True
         except Exception as e:
-            self._log_stage(workflow_id, "ansible_deployment", "failed", str(e))
-            self._update_status(workflow_id, "failed", "ansible_deployment")
-            self._rollback_deployment(workflow_id, context, host_id)
+            self._fail_stage(uow, "ansible_deployment", e)
+            self._rollback_deployment(uow, host_id)
             return False
 
+class WorkflowUnitOfWork:
+    """In-memory state of one running workflow, written back in batches.
+
+    The context is parsed once and kept here; status changes, context updates
+    and stage logs are queued and written by commit() in a single transaction,
+    instead of one connection round trip (and a context re-read) per call.
+    """
+
+    def __init__(self, db: Database, workflow: Dict[str, Any]):
+        self.db = db
+        self.workflow_id = workflow['id']
+        self.context: Dict[str, Any] = json.loads(workflow['context'])
+        self.status = workflow['status']
+        self.stage = workflow['current_stage']
+        self._changes: Dict[str, Any] = {}
+        self._logs: List[Dict[str, Any]] = []
+
+    def set_status(self, status: str, stage: str) -> None:
+        self.status, self.stage = status, stage
+        self._changes.update(status=status, current_stage=stage)
+
+    def update_context(self, values: Dict[str, Any]) -> None:
+        self.context.update(values)
+        self._changes['context'] = None  # serialized at commit time
+
+    def log(self, stage: str, status: str, message: str, detail: Optional[str] = None) -> None:
+        self._logs.append({
+            "workflow_id": self.workflow_id,
+            "stage": stage,
+            "status": status,
+            "message": message,
+            "detail": detail,
+            # Queued logs keep the time they happened (same clock as the column default)
+            "timestamp": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    def commit(self) -> None:
+        if not self._changes and not self._logs:
+            return
+        changes = dict(self._changes)
+        if 'context' in changes:
+            changes['context'] = json.dumps(self.context)
+        with self.db.get_connection():
+            if changes:
+                self.db.update_workflow(self.workflow_id, changes)
+            self.db.add_workflow_logs(self._logs)
+        self._changes.clear()
+        self._logs = []
+
 from fastapi import Depends
 from app.core.database import get_db
 
@@ -1,5 +1,7 @@
 import os
 import base64
+import binascii
+from typing import List, Optional
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -26,6 +28,9 @@ class CryptoUtils:
         """Initialize encryption keys"""
         global CRYPTO_KEY, CRYPTO_SALT
         
+        # (key, AESGCM) pair; rebuilt when the key changes, cleared by set_crypto_keys
+        self._cipher = None
+
         if CRYPTO_KEY and CRYPTO_SALT:
             self.key = CRYPTO_KEY
             self.salt = CRYPTO_SALT
@@ -38,47 +43,73 @@ class CryptoUtils:
         CRYPTO_KEY = self.key
         CRYPTO_SALT = self.salt
         
+    def _get_cipher(self) -> AESGCM:
+        """Return the cached cipher for the current key"""
+        key = self.key
+        cached = self._cipher
+        if cached is None or cached[0] is not key:
+            cached = self._cipher = (key, AESGCM(key))
+        return cached[1]
+
     def encrypt(self, plain_text: str) -> str:
         """Encrypt plaintext"""
-        # Re-fetch key in case it was updated globally
-        global CRYPTO_KEY
-        if CRYPTO_KEY:
-             self.key = CRYPTO_KEY
-
         if not plain_text:
             return None
             
         nonce = os.urandom(12)
-        cipher = AESGCM(self.key)
-        encrypted = cipher.encrypt(nonce, plain_text.encode('utf-8'), None)
+        encrypted = self._get_cipher().encrypt(nonce, plain_text.encode('utf-8'), None)
         result = base64.b64encode(nonce + encrypted).decode('utf-8')
         return f"ENC:{result}"
     
     def decrypt(self, encrypted_text: str) -> str:
         """Decrypt ciphertext"""
-        # Re-fetch key in case it was updated globally
-        global CRYPTO_KEY
-        if CRYPTO_KEY:
-             self.key = CRYPTO_KEY
-
         if not encrypted_text:
             return None
             
         if not encrypted_text.startswith("ENC:"):
             return encrypted_text
             
-        encrypted_text = encrypted_text[4:]
-        
         try:
-            data = base64.b64decode(encrypted_text)
-            nonce = data[:12]
-            ciphertext = data[12:]
-            
-            cipher = AESGCM(self.key)
-            return cipher.decrypt(nonce, ciphertext, None).decode('utf-8')
+            data = base64.b64decode(encrypted_text[4:])
+            return self._get_cipher().decrypt(data[:12], data[12:], None).decode('utf-8')
         except Exception as e:
             logger.error(f"Decryption failed: {str(e)}")
             return encrypted_text
+
+    def encrypt_many(self, plain_texts: List[Optional[str]]) -> List[Optional[str]]:
+        """Encrypt a batch of values; same per-item semantics as encrypt()"""
+        cipher = self._get_cipher()
+        # One urandom call for every nonce in the batch
+        nonces = os.urandom(12 * len(plain_texts))
+        encode = binascii.b2a_base64
+        results = []
+        for i, plain_text in enumerate(plain_texts):
+            if not plain_text:
+                results.append(None)
+                continue
+            nonce = nonces[i * 12:(i + 1) * 12]
+            encrypted = cipher.encrypt(nonce, plain_text.encode('utf-8'), None)
+            results.append("ENC:" + encode(nonce + encrypted, newline=False).decode('ascii'))
+        return results
+
+    def decrypt_many(self, encrypted_texts: List[Optional[str]]) -> List[Optional[str]]:
+        """Decrypt a batch of values; same per-item semantics as decrypt()"""
+        cipher = self._get_cipher()
+        decode = binascii.a2b_base64
+        results = []
+        for encrypted_text in encrypted_texts:
+            if not encrypted_text:
+                results.append(None)
+            elif not encrypted_text.startswith("ENC:"):
+                results.append(encrypted_text)
+            else:
+                try:
+                    data = decode(encrypted_text[4:])
+                    results.append(cipher.decrypt(data[:12], data[12:], None).decode('utf-8'))
+                except Exception as e:
+                    logger.error(f"Decryption failed: {str(e)}")
+                    results.append(encrypted_text)
+        return results
     
     def is_encrypted(self, text: str) -> bool:
         """Check if text is encrypted"""
@@ -99,10 +130,11 @@ def set_crypto_keys(key, salt):
     CRYPTO_KEY = key
     CRYPTO_SALT = salt
     
-    # Update singleton instance if exists
+    # Update singleton instance if exists, invalidating its cached cipher
     if CryptoUtils._instance:
         CryptoUtils._instance.key = key
         CryptoUtils._instance.salt = salt
+        CryptoUtils._instance._cipher = None
 
 def derive_key_from_credentials(username, password):
     """Derive encryption key from username and password"""
@@ -0,0 +1,71 @@
+"""Microbenchmark of host password encryption: per-call cipher vs cached cipher vs batch API.
+
+    python benchmarks/bench_crypto.py [--count 100000] [--repeat 3]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.utils.crypto import CryptoUtils, set_crypto_keys
+
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def encrypt_uncached(crypto, secrets):
+    """The original encrypt(): a new AESGCM per call"""
+    results = []
+    for secret in secrets:
+        nonce = os.urandom(12)
+        encrypted = AESGCM(crypto.key).encrypt(nonce, secret.encode('utf-8'), None)
+        results.append("ENC:" + base64.b64encode(nonce + encrypted).decode('utf-8'))
+    return results
+
+
+def decrypt_uncached(crypto, encrypted):
+    results = []
+    for text in encrypted:
+        data = base64.b64decode(text[4:])
+        results.append(AESGCM(crypto.key).decrypt(data[:12], data[12:], None).decode('utf-8'))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    set_crypto_keys(os.urandom(32), os.urandom(16))
+    crypto = CryptoUtils()
+    secrets = [f"s3cret-password-{i}" for i in range(args.count)]
+    encrypted = crypto.encrypt_many(secrets)
+    assert crypto.decrypt_many(encrypted) == secrets
+
+    rows = [
+        ('encrypt, new AESGCM per call', best_of(args.repeat, encrypt_uncached, crypto, secrets)),
+        ('encrypt, cached cipher', best_of(args.repeat, lambda: [crypto.encrypt(s) for s in secrets])),
+        ('encrypt_many', best_of(args.repeat, crypto.encrypt_many, secrets)),
+        ('decrypt, new AESGCM per call', best_of(args.repeat, decrypt_uncached, crypto, encrypted)),
+        ('decrypt, cached cipher', best_of(args.repeat, lambda: [crypto.decrypt(e) for e in encrypted])),
+        ('decrypt_many', best_of(args.repeat, crypto.decrypt_many, encrypted)),
+    ]
+    print(f"{args.count} secrets, best of {args.repeat}")
+    for name, seconds in rows:
+        print(f"  {name:<32} {seconds:7.3f} s  {seconds / args.count * 1e6:6.2f} us/item")
+
+
+if __name__ == '__main__':
+    main()
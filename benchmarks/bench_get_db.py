@@ -0,0 +1,68 @@
+"""Per-request cost of obtaining a Database: fresh connection vs new Database vs shared get_db().
+
+    python benchmarks/bench_get_db.py [--requests 2000] [--repeat 3]
+
+Each "request" obtains a database the way a route dependency would and runs
+get_groups(), against a throwaway database in a temporary directory.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix='bench-get-db-')
+# Read by app.core.config at import
+os.environ['DB_PATH'] = os.path.join(_tmp, 'bench.db')
+os.environ.setdefault('LOG_DIR', _tmp)
+
+from app.core.config import settings
+from app.core.database import Database, get_db
+
+
+def best_of(repeat, fn, requests):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(requests):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def fresh_connection():
+    """Before the pool and the shared instance: a new connection and a schema check per request"""
+    conn = sqlite3.connect(settings.DB_PATH)
+    try:
+        conn.execute("PRAGMA user_version").fetchone()
+        conn.execute("SELECT DISTINCT group_name FROM hosts").fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db = get_db()
+    db.add_hosts_batch([{'comment': str(i), 'address': f'10.0.{i // 256}.{i % 256}', 'username': 'root',
+                         'port': 22, 'auth_method': 'key', 'group_name': f'group{i % 10}'} for i in range(500)])
+    assert get_db() is db
+
+    rows = [
+        ('fresh sqlite3 connection', best_of(args.repeat, fresh_connection, args.requests)),
+        ('new Database per request', best_of(args.repeat, lambda: Database().get_groups(), args.requests)),
+        ('shared get_db()', best_of(args.repeat, lambda: get_db().get_groups(), args.requests)),
+    ]
+    print(f"{args.requests} requests, best of {args.repeat}")
+    for name, seconds in rows:
+        print(f"  {name:<28} {seconds:7.3f} s  {seconds / args.requests * 1e6:7.1f} us/request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.main attaches a file handler under LOG_DIR at import; keep it out of the repository
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='ansible-ui-test-logs-'))
@@ -0,0 +1,88 @@
+"""The request path stays off the database: async routes hand queries to the DB
+executor, and access logging is a queue put flushed by the background writer."""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import app.core.database as database
+import app.main as main
+from app.core.config import settings
+from app.core.database import Database
+from app.services.access_log import AccessLogWriter
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'load.db'))
+    monkeypatch.setattr(database, '_db_instance', db)
+    monkeypatch.setattr(database, '_async_db_instance', None)
+    yield db
+    database.close_async_db()
+    db.pool.close_all()
+
+
+@pytest.fixture
+def writer(db, monkeypatch):
+    # Not started: rows stay buffered until the test flushes them
+    writer = AccessLogWriter(max_buffer=settings.ACCESS_LOG_BUFFER_SIZE)
+    monkeypatch.setattr(main, 'access_log_writer', writer)
+    yield writer
+
+
+def _get_workflows(requests: int):
+    async def load():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            responses = await asyncio.gather(*(client.get('/api/workflows') for _ in range(requests)))
+        assert all(response.status_code == 200 for response in responses)
+    asyncio.run(load())
+
+
+def test_async_routes_query_on_the_db_executor(db, writer, monkeypatch):
+    loop_thread = threading.current_thread()
+    query_threads = []
+    get_workflows = Database.get_workflows
+
+    def recording_get_workflows(self, *args, **kwargs):
+        query_threads.append(threading.current_thread())
+        return get_workflows(self, *args, **kwargs)
+
+    monkeypatch.setattr(Database, 'get_workflows', recording_get_workflows)
+    _get_workflows(settings.DB_EXECUTOR_WORKERS * 2)
+
+    assert len(query_threads) == settings.DB_EXECUTOR_WORKERS * 2
+    assert loop_thread not in query_threads
+
+
+def test_access_logging_only_queues_on_the_request_path(db, writer, monkeypatch):
+    requests = 200
+    add_access_logs = Database.add_access_logs
+
+    def no_db_on_request_path(self, *args, **kwargs):
+        raise AssertionError("access log written on the request path")
+
+    monkeypatch.setattr(Database, 'add_access_logs', no_db_on_request_path)
+    _get_workflows(requests)
+    assert writer.stats() == {'buffered': requests, 'written': 0, 'dropped': 0}
+
+    monkeypatch.setattr(Database, 'add_access_logs', add_access_logs)
+    writer.stop()
+    assert writer.stats() == {'buffered': 0, 'written': requests, 'dropped': 0}
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM access_logs").fetchone()[0] == requests
+
+
+def test_full_buffer_drops_instead_of_blocking(writer, monkeypatch):
+    flushed = []
+    monkeypatch.setattr(writer, '_flush', flushed.append)
+
+    for _ in range(settings.ACCESS_LOG_BUFFER_SIZE):
+        assert writer.submit('10.0.0.1', '/api/hosts', 'success', 200)
+    # The configured buffer takes a whole burst without dropping anything
+    assert writer.dropped == 0
+    assert not flushed
+
+    assert not writer.submit('10.0.0.1', '/api/hosts', 'success', 200)
+    assert writer.stats() == {'buffered': settings.ACCESS_LOG_BUFFER_SIZE, 'written': 0, 'dropped': 1}
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from app.core.database import Database
+from app.utils.crypto import CryptoUtils, set_crypto_keys
+
+
+@pytest.fixture
+def crypto():
+    set_crypto_keys(os.urandom(32), os.urandom(16))
+    return CryptoUtils()
+
+
+def test_batch_api_matches_per_item_semantics(crypto):
+    secrets = ['s3cret', '', None, 'pässwörd']
+    encrypted = crypto.encrypt_many(secrets)
+    assert encrypted[1] is None and encrypted[2] is None
+    assert [crypto.decrypt(text) for text in encrypted] == ['s3cret', None, None, 'pässwörd']
+
+    inputs = encrypted + ['plain-legacy', 'ENC:not-base64!', crypto.encrypt('single')]
+    assert crypto.decrypt_many(inputs) == [crypto.decrypt(text) for text in inputs]
+
+
+def test_set_crypto_keys_invalidates_the_cached_cipher(crypto):
+    encrypted = crypto.encrypt_many(['s3cret'])
+    set_crypto_keys(os.urandom(32), os.urandom(16))
+    # Decrypting with the new key fails and returns the ciphertext, as decrypt() does
+    assert crypto.decrypt_many(encrypted) == encrypted
+    assert crypto.decrypt_many(crypto.encrypt_many(['s3cret'])) == ['s3cret']
+
+
+def test_get_hosts_decrypts_in_one_batch(crypto, tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'crypto.db'))
+    db.add_hosts_batch([{'comment': str(i), 'address': f'10.0.0.{i}', 'username': 'root', 'port': 22,
+                         'password': f'pw{i}'} for i in range(5)])
+    batches = []
+    decrypt_many = CryptoUtils.decrypt_many
+
+    def recording_decrypt_many(self, texts):
+        batches.append(len(texts))
+        return decrypt_many(self, texts)
+
+    monkeypatch.setattr(CryptoUtils, 'decrypt_many', recording_decrypt_many)
+    monkeypatch.setattr(CryptoUtils, 'decrypt', lambda self, text: pytest.fail("per-item decrypt"))
+    hosts = db.get_hosts(decrypt=True)
+    assert batches == [5]
+    assert sorted(host['password'] for host in hosts) == [f'pw{i}' for i in range(5)]
+    db.pool.close_all()
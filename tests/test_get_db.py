@@ -0,0 +1,46 @@
+import threading
+
+import app.core.database as database
+from app.core.database import Database, get_pool
+
+
+def test_get_db_builds_one_shared_instance(tmp_path, monkeypatch):
+    created = []
+
+    class CountingDatabase(Database):
+        def __init__(self):
+            created.append(self)
+            super().__init__(str(tmp_path / 'shared.db'))
+
+    monkeypatch.setattr(database, 'Database', CountingDatabase)
+    monkeypatch.setattr(database, '_db_instance', None)
+    start = threading.Barrier(8)
+    instances = []
+
+    def request():
+        start.wait(5)
+        instances.append(database.get_db())
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(created) == 1
+    assert len(instances) == 8 and all(instance is created[0] for instance in instances)
+    created[0].pool.close_all()
+
+
+def test_up_to_date_database_only_reads_the_schema_version(tmp_path):
+    path = str(tmp_path / 'current.db')
+    Database(path)
+    statements = []
+    conn = get_pool(path).acquire()
+    conn.set_trace_callback(statements.append)
+    try:
+        db = Database(path)
+    finally:
+        conn.set_trace_callback(None)
+    assert statements == ['PRAGMA user_version']
+    db.pool.close_all()
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app.core.database as database
+import app.main as main
+from app.core.database import Database
+from app.services.auth import auth_service
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'import.db'))
+    monkeypatch.setattr(database, '_db_instance', db)
+    monkeypatch.setattr(database, '_async_db_instance', None)
+    yield db
+    database.close_async_db()
+    db.pool.close_all()
+
+
+def _import(body: bytes, fmt: str):
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post('/api/hosts/import', params={'format': fmt}, content=body,
+                                     headers={'Authorization': f"Bearer {auth_service.create_token('admin')}"})
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    return json.loads(response.text.splitlines()[-1])
+
+
+def test_csv_quoted_field_may_span_lines(db):
+    body = ('﻿address, username ,port,comment,password\r\n'
+            '10.0.0.1,root,22,"rack 4\r\nshelf 2, left",pw1\r\n'
+            '\r\n'
+            '10.0.0.2,root,22,plain,pw2\r\n'
+            '10.0.0.3,root\r\n').encode('utf-8')
+
+    summary = _import(body, 'csv')
+    assert summary['done'] and summary['inserted'] == 2 and summary['invalid'] == 1
+    assert summary['errors'] == [{'line': 6, 'error': 'expected 5 fields, got 2'}]
+    comments = {host['address']: host['comment'] for host in db.get_hosts()}
+    assert comments == {'10.0.0.1': 'rack 4\r\nshelf 2, left', '10.0.0.2': 'plain'}
+
+
+def test_jsonl_reports_bad_lines(db):
+    body = b'{"address": "10.0.0.1", "username": "root", "password": "pw"}\n\nnot json\n[1]\n'
+
+    summary = _import(body, 'jsonl')
+    assert summary['inserted'] == 1
+    assert [error['line'] for error in summary['errors']] == [3, 4]
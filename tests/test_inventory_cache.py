@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+
+import pytest
+
+import app.services.inventory as inventory
+from app.core.database import Database
+from app.services.inventory import InventoryCache
+from app.utils.crypto import set_crypto_keys
+
+
+def _hosts(*addresses, revision=0):
+    return [{'id': i, 'revision': revision, 'address': address, 'username': 'root', 'port': 22,
+             'auth_method': 'password', 'password': 's3cret', 'group_name': 'web'}
+            for i, address in enumerate(addresses, 1)]
+
+
+def test_inventory_file_lives_only_while_leased(tmp_path):
+    cache = InventoryCache()
+    hosts = _hosts('10.0.0.1', '10.0.0.2')
+
+    first = cache.acquire_file(hosts, str(tmp_path))
+    second = cache.acquire_file(hosts, str(tmp_path))
+    assert first == second
+    with open(first) as f:
+        assert set(json.load(f)['all']['children']['web']['hosts']) == {'10.0.0.1', '10.0.0.2'}
+    assert oct(os.stat(first).st_mode & 0o777) == '0o600'
+
+    cache.release_file(first)
+    assert os.path.exists(first)
+    cache.release_file(second)
+    assert not os.path.exists(first)
+    # The grouped vars stay cached for the next run
+    assert cache.stats()['entries'] == 1 and cache.stats()['files'] == 0
+
+
+def test_clear_removes_leased_files(tmp_path):
+    cache = InventoryCache()
+    path = cache.acquire_file(_hosts('10.0.0.1'), str(tmp_path))
+    cache.clear()
+    assert not os.path.exists(path)
+    # A run finishing after shutdown started releases cleanly
+    cache.release_file(path)
+
+
+def test_remove_stale_files_keeps_live_ones(tmp_path):
+    cache = InventoryCache()
+    stale = tmp_path / 'ansible_inventory_old.json'
+    stale.write_text('{}')
+    other = tmp_path / 'ansible_playbook_x.yml'
+    other.write_text('')
+    live = cache.acquire_file(_hosts('10.0.0.1'), str(tmp_path))
+
+    assert cache.remove_stale_files(str(tmp_path)) == 1
+    assert not stale.exists()
+    assert other.exists() and os.path.exists(live)
+
+
+def test_cold_build_does_not_block_other_lookups(monkeypatch):
+    cache = InventoryCache()
+    warm = _hosts('10.0.0.9')
+    cache.groups(warm)
+
+    building = threading.Event()
+    release = threading.Event()
+    inventory_groups = inventory.inventory_groups
+
+    def slow_inventory_groups(hosts):
+        building.set()
+        assert release.wait(5)
+        return inventory_groups(hosts)
+
+    monkeypatch.setattr(inventory, 'inventory_groups', slow_inventory_groups)
+    cold = threading.Thread(target=cache.groups, args=(_hosts('10.0.0.1', '10.0.0.2'),))
+    cold.start()
+    try:
+        assert building.wait(5)
+        # Served while the cold build is still running
+        assert '10.0.0.9' in cache.groups(warm)['web']
+    finally:
+        release.set()
+        cold.join(5)
+    assert cache.stats()['entries'] == 2
+
+
+@pytest.fixture
+def db(tmp_path):
+    set_crypto_keys(os.urandom(32), os.urandom(16))
+    db = Database(str(tmp_path / 'inventory.db'))
+    yield db
+    db.pool.close_all()
+
+
+def _host(address, username='root'):
+    return {'comment': address, 'address': address, 'username': username, 'port': 22,
+            'auth_method': 'password', 'password': 's3cret', 'group_name': 'web'}
+
+
+def test_host_writes_invalidate_cached_groups(db):
+    cache = InventoryCache()
+    host_id = db.add_host(_host('10.0.0.1'))
+    assert cache.groups(db.get_hosts())['web']['10.0.0.1']['ansible_user'] == 'root'
+    cache.groups(db.get_hosts())
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+    writes = [
+        lambda: db.update_host(host_id, _host('10.0.0.1', username='deploy')),
+        lambda: db.add_hosts_batch([_host('10.0.0.2')]),
+        lambda: db.add_host(_host('10.0.0.3')),
+        lambda: db.delete_host(host_id),
+    ]
+    for invalidations, write in enumerate(writes, 1):
+        generation = Database.hosts_generation
+        write()
+        assert Database.hosts_generation != generation
+        groups = cache.groups(db.get_hosts())
+        assert cache.stats()['invalidations'] == invalidations
+        assert cache.stats()['entries'] == 1
+
+    assert set(groups['web']) == {'10.0.0.2', '10.0.0.3'}
+    assert cache.stats()['misses'] == 1 + len(writes)
+
+
+def test_cache_holds_only_ciphertext(db, tmp_path):
+    cache = InventoryCache()
+    db.add_host(_host('10.0.0.1'))
+    hosts = db.get_hosts()
+
+    assert cache.groups(hosts)['web']['10.0.0.1']['ansible_ssh_pass'] == 's3cret'
+    path = cache.acquire_file(hosts, str(tmp_path))
+    with open(path) as f:
+        assert json.load(f)['all']['children']['web']['hosts']['10.0.0.1']['ansible_ssh_pass'] == 's3cret'
+    cache.release_file(path)
+
+    cached = [entry.groups for entry in cache._entries.values()]
+    assert 's3cret' not in json.dumps(cached)
+    assert cached[0]['web']['10.0.0.1']['ansible_ssh_pass'].startswith('ENC:')
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.routers.logs import search_logs
+from app.core.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'search.db'))
+    yield db
+    db.pool.close_all()
+
+
+def _search(db, q, raw=False):
+    return search_logs(q=q, raw=raw, host_id=None, since=None, until=None, limit=50, db=db, current_user={})
+
+
+def test_each_command_log_is_indexed_under_its_own_id(db):
+    # A gap in the ids, then a batch mixing inline and blob-stored outputs
+    db.log_command(None, 'true', 'first', 'success')
+    with db.get_connection() as conn:
+        conn.execute("UPDATE sqlite_sequence SET seq = seq + 10 WHERE name = 'command_logs'")
+    long_output = 'kernel: eth0 link down\n' * 20
+    db.log_commands([(None, f'cmd{i}', long_output if i % 2 else f'short output{i}', 'success') for i in range(6)])
+
+    logs = {log['command']: log['id'] for log in db.get_command_logs(limit=10)}
+    for i in range(0, 6, 2):
+        matches = _search(db, f'output{i}')['commands']
+        assert [(match['id'], match['command']) for match in matches] == [(logs[f'cmd{i}'], f'cmd{i}')]
+    matches = _search(db, 'eth0 down')['commands']
+    assert sorted(match['id'] for match in matches) == sorted(logs[f'cmd{i}'] for i in (1, 3, 5))
+
+
+@pytest.mark.parametrize('q', ['foo:bar', '"unterminated', 'AND'])
+def test_malformed_raw_query_is_a_bad_request(db, q):
+    db.log_command(None, 'uptime', 'up 3 days', 'success')
+    with pytest.raises(HTTPException) as exc_info:
+        _search(db, q, raw=True)
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,67 @@
+import logging
+import sqlite3
+
+import pytest
+
+import app.core.database as database
+from app.core.database import MIGRATIONS, Database
+
+
+def _legacy_db(path, hosts):
+    """A database from before the unique (address, port) index"""
+    conn = sqlite3.connect(path)
+    for migration in MIGRATIONS[:2]:
+        migration(conn)
+    conn.execute("PRAGMA user_version = 2")
+    for comment, address, port in hosts:
+        conn.execute("INSERT INTO hosts (comment, address, username, port, auth_method) VALUES (?, ?, 'root', ?, 'key')",
+                     (comment, address, port))
+    return conn
+
+
+def test_duplicate_hosts_are_merged_and_logged(tmp_path, caplog):
+    path = str(tmp_path / 'legacy.db')
+    hosts = [('a', '10.0.0.1', 22), ('b', '10.0.0.1', 22), ('c', '10.0.0.1', 22), ('d', '10.0.0.2', 22), ('e', '10.0.0.2', 2222)]
+    conn = _legacy_db(path, hosts)
+    conn.executemany("INSERT INTO command_logs (host_id, command, output, status) VALUES (?, 'uptime', 'up', 'success')",
+                     [(1,), (2,), (3,), (4,)])
+    conn.commit()
+    conn.close()
+
+    with caplog.at_level(logging.WARNING, logger='app.core.database'):
+        db = Database(path)
+    try:
+        with db.get_connection() as conn:
+            host_ids = [row[0] for row in conn.execute("SELECT id FROM hosts ORDER BY id")]
+            log_hosts = [row[0] for row in conn.execute("SELECT host_id FROM command_logs ORDER BY id")]
+    finally:
+        db.pool.close_all()
+
+    assert host_ids == [3, 4, 5]
+    # Logs of the removed duplicates now belong to the kept host
+    assert log_hosts == [3, 3, 3, 4]
+    assert "Merged duplicate hosts at 10.0.0.1:22 into id 3: removed ids [1, 2], re-pointed 2 referencing rows" in caplog.text
+
+
+def test_duplicate_merge_splits_long_id_lists(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, '_SQL_IN_CHUNK', 2)
+    path = str(tmp_path / 'legacy.db')
+    conn = _legacy_db(path, [(str(i), '10.0.0.1', 22) for i in range(7)])
+    conn.executemany("INSERT INTO command_logs (host_id, command, output, status) VALUES (?, 'uptime', 'up', 'success')",
+                     [(host_id,) for host_id in range(1, 8)])
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        with db.get_connection() as conn:
+            assert [row[0] for row in conn.execute("SELECT id FROM hosts")] == [7]
+            assert {row[0] for row in conn.execute("SELECT host_id FROM command_logs")} == {7}
+    finally:
+        db.pool.close_all()
+
+
+def test_old_sqlite_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 34, 1))
+    with pytest.raises(RuntimeError, match=r'3\.35\.0 or newer is required'):
+        Database(str(tmp_path / 'old.db'))
@@ -0,0 +1,29 @@
+from fastapi import Response
+
+from app.api.deps import PageParams
+from app.core.database import Database
+
+
+def _page(cursor=None, limit=3):
+    return PageParams(limit=limit, before_id=None, after_id=None, cursor=cursor)
+
+
+def test_cursor_survives_deletion_of_its_anchor_row(tmp_path):
+    db = Database(str(tmp_path / 'pages.db'))
+    db.add_access_logs([('10.0.0.1', f'/api/{i}', 'success', 200, f'2024-01-01 00:00:{i:02d}', None, None)
+                        for i in range(10)])
+
+    page = _page()
+    first = db.get_access_logs(limit=page.limit)
+    response = Response()
+    page.set_next_cursor(response, first, 'access_time')
+    assert [row['path'] for row in first] == ['/api/9', '/api/8', '/api/7']
+
+    # Retention (or anything else) removes the row the cursor points at
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM access_logs WHERE id = ?", (first[-1]['id'],))
+
+    page = _page(response.headers['X-Next-Cursor'])
+    second = db.get_access_logs(limit=page.limit, before_id=page.before_id, after_id=page.after_id)
+    assert [row['path'] for row in second] == ['/api/6', '/api/5', '/api/4']
+    db.pool.close_all()
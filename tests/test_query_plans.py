@@ -0,0 +1,141 @@
+"""The list/filter/delete paths of the log, task and workflow tables stay index-backed."""
+import json
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from app.core.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'plans.db'))
+    host_id = db.add_host({'comment': 'web', 'address': '10.0.0.1', 'username': 'root', 'port': 22,
+                           'auth_method': 'key', 'group_name': 'prod:web'})
+    db.log_commands([(host_id, 'uptime', 'up 3 days', 'success')] * 20)
+    # Long enough for the blob store
+    db.log_commands([(host_id, 'dmesg', 'kernel: eth0 link up\n' * 20, 'success')] * 5)
+    db.add_access_logs([('10.0.0.9', '/api/hosts', 'success', 200, '2024-01-01 00:00:00', 1.0, '/api/hosts')] * 20)
+    workflow_id = db.create_workflow({'name': 'wf', 'status': 'pending', 'context': '{}'})
+    db.add_workflow_logs([{'workflow_id': workflow_id, 'stage': 's', 'status': 'ok', 'message': 'm'}] * 20)
+    db.add_task({'type': 'playbook', 'name': 't', 'status': 'queued',
+                 'params': json.dumps({'playbook': '- hosts: all\n  tasks: []\n' * 20})})
+    yield db
+    db.pool.close_all()
+
+
+@contextmanager
+def traced(db):
+    """Collect the statements (with bound values inlined) the block runs"""
+    statements = []
+    conn = db.pool.acquire()
+    conn.set_trace_callback(statements.append)
+    try:
+        yield statements
+    finally:
+        conn.set_trace_callback(None)
+
+
+def query_plan(db, statement):
+    with db.get_connection() as conn:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+
+
+def assert_index_backed(db, statements, table):
+    """Each traced statement on `table` reads every table through an index and sorts without a temp b-tree.
+
+    Plans name tables by alias, so any SCAN step without USING fails.
+    """
+    relevant = [statement for statement in statements
+                if re.match(r'\s*(SELECT|DELETE|UPDATE)\b', statement, re.IGNORECASE)
+                and re.search(rf'\b{table}\b', statement)]
+    assert relevant, f"No statement on {table} was traced"
+    for statement in relevant:
+        plan = query_plan(db, statement)
+        full_scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+        assert not full_scans, (full_scans, statement)
+        assert not [step for step in plan if 'TEMP B-TREE' in step], (plan, statement)
+
+
+def test_command_logs_page_uses_time_index(db):
+    with traced(db) as statements:
+        newest = db.get_command_logs(limit=5)
+        db.get_command_logs(limit=5, before_id=newest[-1]['id'])
+    assert_index_backed(db, statements, 'command_logs')
+    assert any('idx_command_logs_executed_at' in step
+               for statement in statements if statement.lstrip().upper().startswith('SELECT')
+               for step in query_plan(db, statement))
+
+
+def test_access_logs_filtered_page_uses_index(db):
+    with traced(db) as statements:
+        newest = db.get_access_logs(limit=5, ip='10.0', path='hosts')
+        db.get_access_logs(limit=5, ip='10.0', path='hosts', before_id=(newest[-1]['access_time'], newest[-1]['id']))
+        db.get_access_logs(limit=5, after_id=newest[-1]['id'])
+    assert_index_backed(db, statements, 'access_logs')
+
+
+def test_workflow_logs_by_workflow_uses_index(db):
+    with traced(db) as statements:
+        db.get_workflow_logs(1)
+    assert_index_backed(db, statements, 'workflow_logs')
+    plans = [step for statement in statements if 'workflow_logs' in statement
+             for step in query_plan(db, statement)]
+    assert any(step.startswith('SEARCH') and 'idx_workflow_logs_workflow_time' in step for step in plans), plans
+
+
+def test_tasks_page_uses_index(db):
+    with traced(db) as statements:
+        db.get_tasks(limit=5)
+    assert_index_backed(db, statements, 'tasks')
+
+
+def test_delete_host_finds_command_logs_by_index(db):
+    host_id = db.list_hosts()[0]['id']
+    with traced(db) as statements:
+        db.delete_host(host_id)
+    deletes = [statement for statement in statements if re.match(r'\s*DELETE FROM command_logs', statement)]
+    assert deletes
+    for statement in deletes:
+        plan = query_plan(db, statement)
+        assert any(step.startswith('SEARCH command_logs USING') for step in plan), plan
+
+    # Only the blobs the deleted rows referenced are checked, each by index probes
+    assert_index_backed(db, statements, 'blobs')
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+
+
+def test_list_pages_do_not_load_blobs(db):
+    with traced(db) as statements:
+        logs = db.get_command_logs(limit=50)
+        tasks = db.get_tasks(limit=5)
+    assert not [statement for statement in statements if re.search(r'\bblobs\b', statement)]
+    truncated = [log for log in logs if log['output_truncated']]
+    assert len(truncated) == 5 and all(log['output'] is None for log in truncated)
+    assert 'params' not in tasks[0] and 'logs' not in tasks[0]
+
+    assert db.get_command_log(truncated[0]['id'])['output'] == 'kernel: eth0 link up\n' * 20
+    assert json.loads(db.get_task(tasks[0]['id'])['params'])['playbook'].startswith('- hosts: all')
+
+
+def test_host_address_port_is_unique(db):
+    with db.get_connection() as conn:
+        plan = [row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM hosts WHERE address = '10.0.0.1' AND port = 22")]
+    assert any('idx_hosts_address_port' in step for step in plan), plan
+
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.get_connection() as conn:
+            conn.execute("INSERT INTO hosts (comment, address, username, port) VALUES ('dup', '10.0.0.1', 'root', 22)")
+    # Same address on another port is a different host
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO hosts (comment, address, username, port) VALUES ('alt', '10.0.0.1', 'root', 2222)")
+
+
+def test_task_legacy_logs_probe_uses_index(db):
+    with traced(db) as statements:
+        db.get_task_legacy_logs(1)
+    assert_index_backed(db, statements, 'task_log_lines')
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+import pytest
+
+import app.services.ansible as ansible
+from app.core.database import Database
+from app.services.run_events import RunChannel, run_registry
+from app.services.scheduler import JobScheduler
+
+
+def test_disconnected_stream_drops_its_waiter():
+    channel = RunChannel('disconnect')
+
+    async def disconnect():
+        stream = channel.stream(heartbeat=60)
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        assert len(channel._waiters) == 1
+        # What Starlette does when the SSE client goes away
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        await stream.aclose()
+
+    asyncio.run(disconnect())
+    assert not channel._waiters
+
+
+def test_async_runs_queue_on_the_scheduler(tmp_path, monkeypatch):
+    pool = JobScheduler(1, name='command')
+    monkeypatch.setattr(ansible, 'scheduler', pool)
+    release = threading.Event()
+    running = threading.Event()
+
+    def execute_command(self, command, target_hosts, **kwargs):
+        running.set()
+        assert release.wait(5)
+        return {'success': {'web1': {}}}
+
+    monkeypatch.setattr(ansible.AnsibleService, 'execute_command', execute_command)
+    db = Database(str(tmp_path / 'runs.db'))
+    service = ansible.AnsibleService(db)
+    try:
+        run_ids = [service.execute_command_async('uptime', []) for _ in range(3)]
+        assert running.wait(5)
+        # One slot: the other two runs wait in the queue instead of starting threads
+        stats = pool.stats()
+        assert stats['running'] == 1 and stats['queue_depth'] == 2
+    finally:
+        release.set()
+    for run_id in run_ids:
+        channel = run_registry.get(run_id)
+        asyncio.run(asyncio.wait_for(_drain(channel), 5))
+        assert channel.events[-1]['status'] == 'completed'
+    db.pool.close_all()
+
+
+async def _drain(channel):
+    async for _ in channel.stream():
+        pass
@@ -0,0 +1,50 @@
+"""Authentication of the SSE run stream, which browsers open with EventSource (no custom headers)."""
+import asyncio
+
+import httpx
+import pytest
+
+import app.main as main
+from app.core.config import settings
+from app.services.auth import auth_service
+from app.services.run_events import run_registry
+
+
+@pytest.fixture
+def run_id(monkeypatch):
+    monkeypatch.setattr(type(settings), 'is_login_enabled', lambda self, *args, **kwargs: True)
+    channel = run_registry.create()
+    channel.close({'event': 'done', 'total': 0})
+    return channel.run_id
+
+
+def _get(url, **kwargs):
+    async def get():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.get(url, **kwargs)
+    return asyncio.run(get())
+
+
+def test_stream_accepts_run_token_in_query(run_id):
+    token = auth_service.create_run_token(run_id)
+
+    response = _get(f'/api/runs/{run_id}/events', params={'token': token})
+    assert response.status_code == 200
+    assert 'event: done' in response.text
+
+
+def test_stream_accepts_login_cookie(run_id):
+    response = _get(f'/api/runs/{run_id}/events', cookies={'token': auth_service.create_token('admin')})
+    assert response.status_code == 200
+
+
+def test_stream_rejects_foreign_or_expired_tokens(run_id, monkeypatch):
+    other = run_registry.create()
+    assert _get(f'/api/runs/{run_id}/events').status_code == 401
+    assert _get(f'/api/runs/{run_id}/events',
+                params={'token': auth_service.create_run_token(other.run_id)}).status_code == 401
+
+    token = auth_service.create_run_token(run_id)
+    monkeypatch.setattr(settings, 'RUN_TOKEN_TTL_S', -1)
+    assert _get(f'/api/runs/{run_id}/events', params={'token': token}).status_code == 401
@@ -0,0 +1,71 @@
+import json
+import threading
+
+import pytest
+
+from app.core.database import Database
+from app.services.scheduler import JobScheduler
+
+
+def test_workflow_pool_does_not_take_playbook_slots():
+    playbooks = JobScheduler(1, name='playbook')
+    workflows = JobScheduler(2, name='workflow')
+    polling = threading.Event()
+    release = threading.Event()
+    ran = threading.Event()
+
+    def workflow():
+        polling.set()
+        assert release.wait(5)
+
+    try:
+        workflows.submit(workflow, kind='workflow')
+        workflows.submit(workflow, kind='workflow')
+        assert polling.wait(5)
+        # Both workflows are sleeping, yet a playbook still starts at once
+        playbooks.submit(ran.set, kind='playbook')
+        assert ran.wait(5)
+    finally:
+        release.set()
+
+
+def test_call_waits_for_a_slot_and_returns_the_result():
+    playbooks = JobScheduler(1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def busy():
+        started.set()
+        assert release.wait(5)
+
+    playbooks.submit(busy, kind='playbook')
+    assert started.wait(5)
+    result = []
+    caller = threading.Thread(target=lambda: result.append(playbooks.call(lambda x: x * 2, 21, kind='playbook')))
+    caller.start()
+    caller.join(0.2)
+    # The only slot is busy: the call queues behind it
+    assert caller.is_alive() and playbooks.stats()['queue_depth'] == 1
+    release.set()
+    caller.join(5)
+    assert result == [42]
+
+    with pytest.raises(ZeroDivisionError):
+        playbooks.call(lambda: 1 / 0, kind='playbook')
+
+
+def test_interrupted_jobs_are_failed_at_startup(tmp_path):
+    db = Database(str(tmp_path / 'restart.db'))
+    statuses = ('queued', 'running', 'completed')
+    task_ids = [db.add_task({'type': 'playbook', 'name': status, 'status': status}) for status in statuses]
+    workflow_ids = [db.create_workflow({'name': status, 'status': status, 'current_stage': 'init'})
+                    for status in ('pending', 'running', 'completed')]
+
+    assert db.fail_interrupted_tasks() == 2
+    assert [db.get_task_status(task_id) for task_id in task_ids] == ['failed', 'failed', 'completed']
+    assert json.loads(db.get_task(task_ids[0])['result'])['error'] == 'Interrupted by server restart'
+
+    assert db.fail_interrupted_workflows() == 2
+    assert [db.get_workflow(workflow_id)['status'] for workflow_id in workflow_ids] == ['failed', 'failed', 'completed']
+    assert [log['message'] for log in db.get_workflow_logs(workflow_ids[1])] == ['Interrupted by server restart']
+    db.pool.close_all()